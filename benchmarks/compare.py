@@ -0,0 +1,49 @@
+# benchmarks/compare.py
+# Compares two run_benchmarks.py JSON reports and prints the relative change per metric.
+# Run: python benchmarks/compare.py before.json after.json
+
+import json
+import sys
+
+THROUGHPUT_METRICS = ("throughput_rps", "items_per_second", "p50_ms", "p95_ms", "p99_ms")
+
+def change(before, after):
+    if before in (None, 0) or after is None:
+        return "n/a"
+    return f"{(after - before) / before * 100:+.1f}%"
+
+def row(label, before, after):
+    print(f"{label:<40} {before!s:>12} {after!s:>12} {change(before, after):>9}")
+
+def main(before_path, after_path):
+    with open(before_path) as f:
+        before = json.load(f)
+    with open(after_path) as f:
+        after = json.load(f)
+    print(f"{'metric':<40} {before['meta'].get('git_revision')!s:>12} {after['meta'].get('git_revision')!s:>12} {'change':>9}")
+
+    old_runs = {(r["scenario"], r.get("mode")): r for r in before.get("throughput", [])}
+    for run in after.get("throughput", []):
+        old = old_runs.get((run["scenario"], run.get("mode")))
+        if old is None or "error" in run or "error" in old:
+            continue
+        for metric in THROUGHPUT_METRICS:
+            if metric not in run:
+                continue
+            row(f"{run['scenario']}/{run['mode']} {metric}", old.get(metric), run.get(metric))
+
+    old_setup = {r["tools"]: r for r in before.get("setup", [])}
+    for run in after.get("setup", []):
+        if run["tools"] in old_setup:
+            row(f"setup {run['tools']} tools seconds", old_setup[run["tools"]]["seconds"], run["seconds"])
+
+    if before.get("memory") and after.get("memory"):
+        row("memory per_tool_kb", before["memory"].get("per_tool_kb"), after["memory"].get("per_tool_kb"))
+    if before.get("health_overhead") and after.get("health_overhead"):
+        row("health throughput_overhead_pct", before["health_overhead"].get("throughput_overhead_pct"),
+            after["health_overhead"].get("throughput_overhead_pct"))
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        sys.exit("usage: python benchmarks/compare.py BEFORE.json AFTER.json")
+    main(sys.argv[1], sys.argv[2])
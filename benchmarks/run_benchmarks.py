@@ -0,0 +1,315 @@
+# benchmarks/run_benchmarks.py
+# Offline benchmark and load-test suite for ToolFabric.
+# Drives ToolFabric tools backed by the local stand-in servers in this directory and reports
+# throughput, latency percentiles, setup time vs tool count, memory per tool and health-check
+# overhead as JSON, so results can be compared between versions (see compare.py).
+# Run from the repo root: python benchmarks/run_benchmarks.py --output bench.json
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import yaml  # noqa: E402
+from src.tool_fabric import ToolFabric  # noqa: E402
+
+HERE = os.path.join(ROOT, "benchmarks")
+STDIO_SERVER = os.path.join(HERE, "stdio_echo_server.py")
+SSE_SERVER = os.path.join(HERE, "standin_server.py")
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def server_flags(args):
+    return ["--latency", str(args.latency), "--jitter", str(args.jitter), "--error-rate", str(args.error_rate)]
+
+def stdio_tool(name, args, clients=1, health_interval=3600):
+    return {
+        "name": name,
+        "command": [sys.executable, STDIO_SERVER] + server_flags(args),
+        "batch": True,  # The stand-in servers accept batch arrays
+        "health_check": {"type": "ping", "interval": health_interval},
+        "mcp_clients": [
+            {"name": f"{name}-{i}", "host": "localhost", "port": 0, "protocol": "stdio", "timeout": args.timeout}
+            for i in range(clients)
+        ],
+    }
+
+def sse_tool(name, args):
+    port = free_port()
+    return {
+        "name": name,
+        "command": [sys.executable, SSE_SERVER, "--port", str(port)] + server_flags(args),
+        "batch": True,
+        "health_check": {"type": "ping", "interval": 3600},
+        "mcp_clients": [{"name": f"{name}-client", "host": "127.0.0.1", "port": port, "protocol": "sse",
+                         "pool_size": args.concurrency, "timeout": args.timeout, "connect_timeout": 1}],
+    }
+
+def internal_tool(name):
+    return {"name": name, "module": "enterprise_tools.user", "function": "get_userInfo"}
+
+class Fabric:
+    """ToolFabric built from an in-memory config via a temporary YAML file."""
+    def __init__(self, tools, **extra):
+        config = dict(extra, tools=tools)
+        fd, self.path = tempfile.mkstemp(suffix=".yml")
+        with os.fdopen(fd, "w") as f:
+            yaml.safe_dump(config, f)
+        self.fabric = ToolFabric(self.path)
+
+    def __enter__(self):
+        return self.fabric
+
+    def __exit__(self, *exc):
+        self.fabric.stop_all()
+        os.unlink(self.path)
+
+def is_error(result):
+    if result is None:
+        return True
+    if isinstance(result, list):
+        return any(is_error(r) for r in result)
+    if isinstance(result, dict):
+        return "error" in result
+    return isinstance(result, str) and "Error" in result
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, int(round(p / 100.0 * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+def summarize(name, mode, concurrency, latencies, errors, elapsed):
+    latencies.sort()
+    ms = lambda v: None if v is None else round(v * 1000, 3)
+    return {
+        "scenario": name,
+        "mode": mode,
+        "concurrency": concurrency,
+        "requests": len(latencies),
+        "errors": errors,
+        "seconds": round(elapsed, 4),
+        "throughput_rps": round(len(latencies) / elapsed, 1) if elapsed else None,
+        "p50_ms": ms(percentile(latencies, 50)),
+        "p95_ms": ms(percentile(latencies, 95)),
+        "p99_ms": ms(percentile(latencies, 99)),
+        "max_ms": ms(latencies[-1] if latencies else None),
+    }
+
+def load_sync(name, func, call_args, concurrency, requests, duration=None):
+    """Runs `requests` calls (or as many as fit in `duration` seconds) from `concurrency` threads."""
+    latencies, errors = [], [0]
+    remaining = [requests]
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration if duration else None
+
+    def worker():
+        while True:
+            with lock:
+                if deadline is None and remaining[0] <= 0:
+                    return
+                if deadline is not None and time.perf_counter() >= deadline:
+                    return
+                remaining[0] -= 1
+            started = time.perf_counter()
+            result = func(*call_args)
+            elapsed = time.perf_counter() - started
+            with lock:
+                latencies.append(elapsed)
+                errors[0] += is_error(result)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for _ in range(concurrency):
+            pool.submit(worker)
+    return summarize(name, "sync", concurrency, latencies, errors[0], time.perf_counter() - started)
+
+def load_async(name, func, call_args, concurrency, requests):
+    async def run():
+        latencies, errors = [], 0
+        queue = iter(range(requests))
+
+        async def worker():
+            nonlocal errors
+            for _ in queue:
+                started = time.perf_counter()
+                result = await func(*call_args)
+                latencies.append(time.perf_counter() - started)
+                errors += is_error(result)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        return summarize(name, "async", concurrency, latencies, errors, time.perf_counter() - started)
+    return asyncio.run(run())
+
+def bench_throughput(args):
+    results = []
+    scenarios = [
+        ("internal", internal_tool("internal"), (456,)),
+        ("stdio", stdio_tool("stdio", args), ("echo", {"text": "x" * args.payload_bytes})),
+        ("sse", sse_tool("sse", args), ("echo", {"text": "x" * args.payload_bytes})),
+    ]
+    for name, cfg, call_args in scenarios:
+        with Fabric([cfg]) as fabric:
+            fabric.setup()
+            if fabric.start_report[name]["status"] != "ready":
+                results.append({"scenario": name, "error": fabric.start_report[name]})
+                continue
+            # Warm up connections and latency windows
+            load_sync(name, fabric.tools[name], call_args, args.concurrency, args.concurrency * 2)
+            results.append(load_sync(name, fabric.tools[name], call_args, args.concurrency, args.requests))
+            results.append(load_async(name, fabric.async_tools[name], call_args, args.concurrency, args.requests))
+            if args.batch_size > 1:
+                results.append(load_batch(name, fabric, call_args, args))
+    return results
+
+def load_batch(name, fabric, call_args, args):
+    """Same number of calls as the other modes, sent as call_many batches of --batch-size."""
+    batches = max(1, args.requests // args.batch_size)
+    items = [list(call_args)] * args.batch_size
+    run = load_sync(name, lambda: fabric.call_many(name, items), (), args.concurrency, batches)
+    per_item = round(run["throughput_rps"] * args.batch_size, 1) if run["throughput_rps"] else None
+    run.update(mode="batch", batch_size=args.batch_size, items_per_second=per_item)
+    return run
+
+def rss_kb(pid="self"):
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1])
+    except OSError:
+        return None
+    return None
+
+def bench_setup_and_memory(args):
+    setup, memory = [], None
+    for count in args.tool_counts:
+        tools = [stdio_tool(f"stdio{i}", args) for i in range(count)]
+        with Fabric(tools, setup={"max_workers": args.setup_workers}) as fabric:
+            parent_before = rss_kb()
+            started = time.perf_counter()
+            fabric.setup()
+            elapsed = time.perf_counter() - started
+            durations = [r["duration"] for r in fabric.start_report.values()]
+            setup.append({
+                "tools": count,
+                "seconds": round(elapsed, 4),
+                "started": sum(1 for r in fabric.start_report.values() if r["status"] == "ready"),
+                "slowest_tool_seconds": round(max(durations), 4) if durations else None,
+                "sum_tool_seconds": round(sum(durations), 4),
+            })
+            if count == max(args.tool_counts):
+                parent_after = rss_kb()
+                children = [rss_kb(process.pid) for inst in fabric.tool_instances.values()
+                            for process in getattr(inst, "processes", [])]
+                children = [c for c in children if c is not None]
+                memory = {
+                    "tools": count,
+                    "parent_rss_delta_kb": None if parent_before is None else parent_after - parent_before,
+                    "subprocess_rss_total_kb": sum(children) if children else None,
+                    "per_tool_kb": round((sum(children) + (parent_after - parent_before)) / count, 1)
+                    if children and parent_before is not None else None,
+                    "threads": threading.active_count(),
+                }
+    return setup, memory
+
+def probe_count(fabric):
+    samples = fabric.metrics().get("toolfabric_health_probes_total", {}).get("samples", [])
+    return sum(s["value"] for s in samples)
+
+def bench_health_overhead(args):
+    results = {}
+    call_args = ("echo", {"text": "x"})
+    for label, interval in (("baseline", 3600), ("with_health", args.health_interval)):
+        cfg = stdio_tool("health", args, clients=args.health_clients, health_interval=interval)
+        # Measure pings, not the skip-if-active shortcut
+        cfg["health_check"]["skip_if_active"] = False
+        with Fabric([cfg]) as fabric:
+            fabric.setup()
+            probes_before = probe_count(fabric)
+            run = load_sync("health", fabric.tools["health"], call_args, args.concurrency, 0,
+                            duration=args.health_duration)
+            results[label] = {
+                "health_interval": interval,
+                "throughput_rps": run["throughput_rps"],
+                "p99_ms": run["p99_ms"],
+                "probes": probe_count(fabric) - probes_before,
+                "threads": threading.active_count(),
+            }
+    base, health = results["baseline"]["throughput_rps"], results["with_health"]["throughput_rps"]
+    results["clients"] = args.health_clients
+    results["throughput_overhead_pct"] = round((base - health) / base * 100, 2) if base else None
+    return results
+
+def git_revision():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="ToolFabric offline benchmark suite")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=2000, help="requests per throughput run")
+    parser.add_argument("--latency", type=float, default=0.002, help="stand-in server latency (s)")
+    parser.add_argument("--jitter", type=float, default=0.001, help="stand-in server jitter (s)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="stand-in server error rate")
+    parser.add_argument("--payload-bytes", type=int, default=256)
+    parser.add_argument("--batch-size", type=int, default=50, help="items per call_many batch (1 disables)")
+    parser.add_argument("--timeout", type=float, default=10, help="client request timeout (s)")
+    parser.add_argument("--tool-counts", type=lambda v: [int(x) for x in v.split(",")], default=[1, 4, 8, 16],
+                        help="comma-separated tool counts for the setup benchmark")
+    parser.add_argument("--setup-workers", type=int, default=8)
+    parser.add_argument("--health-clients", type=int, default=50)
+    parser.add_argument("--health-interval", type=float, default=0.05)
+    parser.add_argument("--health-duration", type=float, default=3.0, help="seconds of load per health run")
+    parser.add_argument("--only", choices=("throughput", "setup", "health"), action="append",
+                        help="run only the named benchmark(s)")
+    parser.add_argument("--output", help="write JSON here instead of stdout")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    selected = set(args.only or ("throughput", "setup", "health"))
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "git_revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "args": {k: v for k, v in vars(args).items() if k != "output"},
+        },
+    }
+    if "throughput" in selected:
+        report["throughput"] = bench_throughput(args)
+    if "setup" in selected:
+        report["setup"], report["memory"] = bench_setup_and_memory(args)
+    if "health" in selected:
+        report["health_overhead"] = bench_health_overhead(args)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+if __name__ == "__main__":
+    main()
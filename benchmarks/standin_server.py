@@ -0,0 +1,205 @@
+# benchmarks/standin_server.py
+# Offline stand-in for examples/local_server.py, built on the standard library only so the
+# benchmark suite needs no FastAPI/uvicorn. Same contract: POST /mcp/action with
+# {action, payload, client_id, id}; responses are delivered on GET /mcp/sse/{client_id}
+# (and/or inline in the POST reply) with configurable latency, jitter and error rate.
+# A request with `stream: {window}` is answered by `chunk` events within the client's credit
+# window (POST {type: credit|cancel, id}), then the response event.
+# Run: python benchmarks/standin_server.py --port 9090 --latency 0.005 --error-rate 0.01
+
+import argparse
+import json
+import queue
+import random
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+class Credits:
+    """Chunks the client is ready to receive for one streamed request."""
+    def __init__(self, window):
+        self.available = window
+        self.cancelled = False
+        self.cond = threading.Condition()
+
+    def take(self, timeout=30):
+        with self.cond:
+            if not self.cond.wait_for(lambda: self.available > 0 or self.cancelled, timeout):
+                return False
+            if self.cancelled:
+                return False
+            self.available -= 1
+            return True
+
+    def grant(self, n):
+        with self.cond:
+            self.available += n
+            self.cond.notify_all()
+
+    def cancel(self):
+        with self.cond:
+            self.cancelled = True
+            self.cond.notify_all()
+
+class StandinState:
+    def __init__(self, args):
+        self.args = args
+        self.clients = {}
+        self.streams = {}  # correlation id -> Credits
+        self.lock = threading.Lock()
+
+    def queue_for(self, client_id):
+        with self.lock:
+            return self.clients.setdefault(client_id, queue.Queue(maxsize=self.args.queue_size))
+
+    def simulate_latency(self):
+        args = self.args
+        time.sleep(max(0.0, args.latency + random.uniform(-args.jitter, args.jitter)))
+
+    def control(self, body):
+        """Credit and cancel messages for streamed requests. Returns True when `body` was one."""
+        if body.get("type") not in ("credit", "cancel"):
+            return False
+        credits = self.streams.get(body.get("id"))
+        if credits is not None:
+            if body["type"] == "credit":
+                credits.grant(body.get("credit", 0))
+            else:
+                credits.cancel()
+        return True
+
+    def stream(self, body):
+        """Deliver the echoed payload as chunk events, then the response, honoring credits."""
+        corr_id, events = body.get("id"), self.queue_for(body.get("client_id", "unknown"))
+        credits = self.streams[corr_id] = Credits(body["stream"].get("window", 16))
+        payload = body.get("payload", {})
+        try:
+            if payload.get("chunks"):
+                pieces = ("x" * payload.get("chunk_bytes", 1024) for _ in range(payload["chunks"]))
+            else:
+                text = json.dumps(payload)
+                size = self.args.chunk_bytes
+                pieces = (text[i:i + size] for i in range(0, len(text), size))
+            sent = 0
+            for piece in pieces:
+                if not credits.take():
+                    return
+                events.put({"type": "chunk", "id": corr_id, "seq": sent, "data": piece})
+                sent += 1
+            events.put({"type": "response", "id": corr_id, "action": body.get("action"), "status": "success",
+                        "result": {"chunks": sent}})
+        finally:
+            self.streams.pop(corr_id, None)
+
+    def respond(self, body):
+        args = self.args
+        response = {"type": "response", "id": body.get("id"), "action": body.get("action"), "to": body.get("client_id")}
+        if random.random() < args.error_rate:
+            response.update(status="error", message="injected error")
+        else:
+            response.update(status="success", result=body.get("payload", {}))
+        return response
+
+class StandinHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # Keep-alive, like uvicorn
+    state = None
+
+    def setup(self):
+        super().setup()
+        # Headers and body go out in separate writes; avoid Nagle/delayed-ACK stalls like uvicorn does
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        if self.path != "/mcp/action":
+            self.send_error(404)
+            return
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        if isinstance(body, dict) and (self.state.control(body) or body.get("stream")):
+            if body.get("stream"):
+                threading.Thread(target=self.state.stream, args=(body,), daemon=True).start()
+            self.send_reply({"status": "processed", "response": None})
+            return
+        items = body if isinstance(body, list) else [body]
+        self.state.simulate_latency()  # Once per POST: a batch costs one round trip
+        responses = [self.state.respond(item) for item in items]
+        delivery = self.state.args.delivery
+        if delivery in ("stream", "both"):
+            for item, response in zip(items, responses):
+                if item.get("id") is not None:
+                    try:
+                        self.state.queue_for(item.get("client_id", "unknown")).put_nowait(response)
+                    except queue.Full:
+                        pass  # Slow consumer: drop, the caller will time out
+        inline = delivery in ("inline", "both")
+        if isinstance(body, list):
+            self.send_reply({"status": "processed", "responses": responses if inline else []})
+        else:
+            self.send_reply({"status": "processed", "response": responses[0] if inline else None})
+
+    def send_reply(self, reply):
+        data = json.dumps(reply).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if not self.path.startswith("/mcp/sse/"):
+            self.send_error(404)
+            return
+        client_id = self.path[len("/mcp/sse/"):]
+        events = self.state.queue_for(client_id)
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+        try:
+            while True:
+                try:
+                    event = events.get(timeout=10)
+                except queue.Empty:
+                    event = {"type": "ping", "from": "server", "client": client_id}
+                self.wfile.write(f"data: {json.dumps(event)}\n\n".encode("utf-8"))
+                self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+class StandinHTTPServer(ThreadingHTTPServer):
+    # The default backlog of 5 overflows when a client pool opens many connections at once,
+    # costing a 1s SYN retransmit; uvicorn listens with 2048
+    request_queue_size = 1024
+
+def make_server(host, port, args):
+    handler = type("Handler", (StandinHandler,), {"state": StandinState(args)})
+    server = StandinHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Stand-in MCP SSE server for ToolFabric benchmarks")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9090)
+    parser.add_argument("--latency", type=float, default=0.0, help="base latency per call in seconds")
+    parser.add_argument("--jitter", type=float, default=0.0, help="+/- uniform jitter in seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of calls answered with an error")
+    parser.add_argument("--delivery", choices=("stream", "inline", "both"), default="stream",
+                        help="where responses are delivered")
+    parser.add_argument("--queue-size", type=int, default=10000, help="per-client SSE queue bound")
+    parser.add_argument("--chunk-bytes", type=int, default=65536, help="chunk size of streamed echoes")
+    return parser.parse_args(argv)
+
+if __name__ == "__main__":
+    args = parse_args()
+    server = make_server(args.host, args.port, args)
+    print(f"Stand-in MCP server on http://{args.host}:{server.server_address[1]}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,148 @@
+# benchmarks/stdio_echo_server.py
+# Minimal MCP stand-in speaking newline-delimited JSON-RPC on stdin/stdout.
+# Answers initialize, ping and tools/call (echoing the arguments) with configurable
+# artificial latency, jitter and error rate. Requests are served concurrently.
+# A tools/call carrying `_meta["toolfabric/stream"]` is answered in chunk notifications,
+# within the client's credit window: the echoed text in --chunk-bytes pieces, or
+# `chunks` pieces of `chunk_bytes` bytes when the arguments ask for them.
+# Run: python benchmarks/stdio_echo_server.py --latency 0.005 --jitter 0.002 --error-rate 0.01
+
+import argparse
+import json
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+write_lock = threading.Lock()
+streams = {}  # progress token -> Credits
+streams_lock = threading.Lock()
+
+class Credits:
+    """Chunks the client is ready to receive for one streamed request."""
+    def __init__(self, window):
+        self.available = window
+        self.cancelled = False
+        self.cond = threading.Condition()
+
+    def take(self, timeout=30):
+        with self.cond:
+            if not self.cond.wait_for(lambda: self.available > 0 or self.cancelled, timeout):
+                return False
+            if self.cancelled:
+                return False
+            self.available -= 1
+            return True
+
+    def grant(self, n):
+        with self.cond:
+            self.available += n
+            self.cond.notify_all()
+
+    def cancel(self):
+        with self.cond:
+            self.cancelled = True
+            self.cond.notify_all()
+
+def reply(message):
+    data = json.dumps(message, separators=(",", ":")) + "\n"
+    with write_lock:
+        sys.stdout.write(data)
+        sys.stdout.flush()
+
+def handle(request, args, delay=True):
+    if "id" not in request:
+        notification(request)
+        return None
+    method = request.get("method")
+    if method == "initialize":
+        return {"jsonrpc": "2.0", "id": request["id"], "result": {
+            "protocolVersion": request.get("params", {}).get("protocolVersion"),
+            "capabilities": {"tools": {}},
+            "serverInfo": {"name": "stdio-echo", "version": "1.0"},
+        }}
+    if method == "ping":
+        return {"jsonrpc": "2.0", "id": request["id"], "result": {}}
+    if delay:
+        simulate_latency(args)
+    if random.random() < args.error_rate:
+        return {"jsonrpc": "2.0", "id": request["id"], "error": {"code": -32000, "message": "injected error"}}
+    params = request.get("params") or {}
+    meta = params.get("_meta") or {}
+    if "toolfabric/stream" in meta:
+        return stream(request["id"], meta, params.get("arguments", {}), args)
+    return {"jsonrpc": "2.0", "id": request["id"], "result": {
+        "content": [{"type": "text", "text": json.dumps(params.get("arguments", params))}],
+    }}
+
+def notification(message):
+    params = message.get("params") or {}
+    if message.get("method") == "notifications/toolfabric/credit":
+        credits = streams.get(params.get("progressToken"))
+        if credits is not None:
+            credits.grant(params.get("credit", 0))
+    elif message.get("method") == "notifications/cancelled":
+        credits = streams.get(params.get("requestId"))
+        if credits is not None:
+            credits.cancel()
+
+def stream(req_id, meta, arguments, args):
+    token = meta.get("progressToken", req_id)
+    credits = Credits(meta["toolfabric/stream"].get("window", 16))
+    with streams_lock:
+        streams[token] = credits
+    try:
+        if arguments.get("chunks"):
+            pieces = ("x" * arguments.get("chunk_bytes", 1024) for _ in range(arguments["chunks"]))
+        else:
+            text = json.dumps(arguments)
+            pieces = (text[i:i + args.chunk_bytes] for i in range(0, len(text), args.chunk_bytes))
+        sent = 0
+        for piece in pieces:
+            if not credits.take():
+                return {"jsonrpc": "2.0", "id": req_id, "error": {"code": -32800, "message": "stream cancelled"}}
+            reply({"jsonrpc": "2.0", "method": "notifications/toolfabric/chunk",
+                   "params": {"progressToken": token, "seq": sent, "data": piece}})
+            sent += 1
+        return {"jsonrpc": "2.0", "id": req_id, "result": {"content": [], "chunks": sent}}
+    finally:
+        with streams_lock:
+            streams.pop(token, None)
+
+def simulate_latency(args):
+    time.sleep(max(0.0, args.latency + random.uniform(-args.jitter, args.jitter)))
+
+def serve(line, args):
+    message = json.loads(line)
+    if isinstance(message, list):
+        # A batch costs one round trip of latency, not one per item
+        simulate_latency(args)
+        replies = [r for r in (handle(m, args, delay=False) for m in message) if r is not None]
+        if replies:
+            reply(replies)
+    else:
+        response = handle(message, args)
+        if response is not None:
+            reply(response)
+
+def main():
+    parser = argparse.ArgumentParser(description="Stdio JSON-RPC echo server for ToolFabric benchmarks")
+    parser.add_argument("--latency", type=float, default=0.0, help="base latency per call in seconds")
+    parser.add_argument("--jitter", type=float, default=0.0, help="+/- uniform jitter in seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of calls answered with an error")
+    parser.add_argument("--workers", type=int, default=64, help="concurrent requests served")
+    parser.add_argument("--chunk-bytes", type=int, default=65536, help="chunk size of streamed echoes")
+    args = parser.parse_args()
+
+    with ThreadPoolExecutor(max_workers=args.workers) as pool:
+        for line in sys.stdin:
+            if not line.strip():
+                continue
+            if '"notifications/' in line[:80]:
+                serve(line, args)  # Credits and cancellations must not queue behind blocked streams
+            else:
+                pool.submit(serve, line, args)
+
+if __name__ == "__main__":
+    main()
@@ -16,6 +16,17 @@ def get_userInfo(user_id):
         "last_login": "2025-10-24T10:00:00Z"
     }
 
+def get_userInfo_batch(items):
+    """
+    Vectorized get_userInfo for ToolFabric call_many (config: batch_function).
+    Receives the call items in order (user ids, [user_id] lists or {"user_id": ...} dicts) and must
+    return one result per item; an Exception instance marks a failed item.
+    In production, fetch all ids in one query (e.g., WHERE user_id IN (...)).
+    """
+    user_ids = [item["user_id"] if isinstance(item, dict) else item[0] if isinstance(item, (list, tuple)) else item
+                for item in items]
+    return [get_userInfo(user_id) for user_id in user_ids]
+
 def get_userProfile(user_id):
     """
     Stub function for user profile.
@@ -14,10 +14,11 @@ class UserQueryInput(BaseModel):
 async def main():
     # Step 1: Load tools using ToolFabric
     fabric = ToolFabric("examples/config.yml")
-    fabric.setup()  # Starts tools, health checks, etc.
+    await fabric.setup_async()  # Starts tools, health checks, etc.
     
-    # Collect ToolFabric's tools as a list (ADK expects list of callables)
-    tool_list = list(fabric.tools.values())  # e.g., [user_info_func, playwright_func, ...]
+    # Collect ToolFabric's async tools as a list (ADK accepts coroutine functions and
+    # awaits them, so tool calls never block the event loop)
+    tool_list = list(fabric.async_tools.values())  # e.g., [user_info_func, playwright_func, ...]
     
     # Step 2: Define agent instructions (guides LLM on tool usage)
     agent_instructions = """
@@ -70,7 +71,7 @@ async def main():
             break  # Or process streaming events
     
     # Teardown
-    fabric.stop_all()
+    await fabric.stop_all_async()
 
 if __name__ == "__main__":
     asyncio.run(main())
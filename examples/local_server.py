@@ -1,15 +1,19 @@
 # examples/local_server.py
 # A lightweight, fast MCP server using FastAPI for SSE (Server-Sent Events) support.
-# This implements a basic MCP endpoint that echoes actions/payloads and sends periodic pings.
+# This implements a basic MCP endpoint that echoes actions/payloads to the caller's SSE stream and sends periodic pings.
 # Requirements: pip install fastapi uvicorn[standard]
 # Run: uvicorn local_server:app --host 0.0.0.0 --port 9090 --reload (but for subprocess, just python local_server.py)
+# Tuning (env): MCP_SSE_QUEUE_SIZE (events buffered per stream, default 1024),
+#   MCP_SSE_SLOW_CONSUMER (drop_oldest | drop_newest | disconnect, default drop_oldest),
+#   MCP_SSE_MAX_CLIENTS (concurrent streams, default 10000)
 
 from fastapi import FastAPI, Request
-from fastapi.responses import StreamingResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 import asyncio
 import json
+import os
 import uvicorn
-from typing import AsyncGenerator
+from typing import AsyncGenerator, Dict, Optional, Set
 import logging
 
 # Configure logging
@@ -18,47 +22,195 @@ logger = logging.getLogger(__name__)
 
 app = FastAPI(title="Fast MCP Server")
 
-# In-memory store for simplicity (use Redis in prod for multi-client)
-clients = set()
+QUEUE_SIZE = int(os.environ.get("MCP_SSE_QUEUE_SIZE", 1024))
+SLOW_CONSUMER = os.environ.get("MCP_SSE_SLOW_CONSUMER", "drop_oldest")
+MAX_CLIENTS = int(os.environ.get("MCP_SSE_MAX_CLIENTS", 10000))
+PING_INTERVAL = 10  # seconds of silence before a keep-alive ping
+MAX_BATCH = 256  # events coalesced into one write when a stream is behind
 
-async def sse_generator(client_id: str) -> AsyncGenerator[str, None]:
-    """SSE event generator: handles incoming messages via POST, sends responses/events."""
-    while True:
+_CLOSE = None  # Queue sentinel: end the stream
+
+class Subscriber:
+    """One open SSE stream with its own bounded queue of pre-encoded events."""
+    __slots__ = ("client_id", "queue", "dropped", "closed")
+
+    def __init__(self, client_id: str, queue_size: int):
+        self.client_id = client_id
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.dropped = 0
+        self.closed = False
+
+class Broker:
+    """Routes events to SSE subscribers by client_id.
+
+    Events are encoded once per publish and queued per stream; a full queue is handled by
+    the slow-consumer policy so one stalled reader never blocks the others or grows memory.
+    """
+    POLICIES = ("drop_oldest", "drop_newest", "disconnect")
+
+    def __init__(self, queue_size: int = QUEUE_SIZE, policy: str = SLOW_CONSUMER, max_clients: int = MAX_CLIENTS):
+        if policy not in self.POLICIES:
+            raise ValueError(f"slow consumer policy must be one of {self.POLICIES}, got {policy!r}")
+        self.queue_size = queue_size
+        self.policy = policy
+        self.max_clients = max_clients
+        self.subscribers: Dict[str, Set[Subscriber]] = {}
+        self.count = 0
+        self.delivered = 0
+        self.dropped = 0
+        self.disconnected = 0
+
+    def subscribe(self, client_id: str) -> Optional[Subscriber]:
+        if self.count >= self.max_clients:
+            return None
+        sub = Subscriber(client_id, self.queue_size)
+        self.subscribers.setdefault(client_id, set()).add(sub)
+        self.count += 1
+        return sub
+
+    def unsubscribe(self, sub: Subscriber) -> None:
+        subs = self.subscribers.get(sub.client_id)
+        if subs is None or sub not in subs:
+            return
+        subs.discard(sub)
+        if not subs:
+            del self.subscribers[sub.client_id]
+        self.count -= 1
+
+    def publish(self, client_id: str, event: dict) -> int:
+        """Queue `event` on every stream of `client_id`. Returns the number of streams reached."""
+        subs = self.subscribers.get(client_id)
+        if not subs:
+            return 0
+        data = encode(event)
+        return sum(self._offer(sub, data) for sub in list(subs))
+
+    def broadcast(self, event: dict) -> int:
+        data = encode(event)
+        return sum(self._offer(sub, data) for subs in list(self.subscribers.values()) for sub in list(subs))
+
+    def _offer(self, sub: Subscriber, data: str) -> bool:
+        if sub.closed:
+            return False
         try:
-            # Simulate periodic health ping every 10s
-            yield f"data: {json.dumps({'type': 'ping', 'from': 'server', 'client': client_id})}\n\n"
-            await asyncio.sleep(10)
-        except asyncio.CancelledError:
-            logger.info(f"SSE client {client_id} disconnected")
-            break
+            sub.queue.put_nowait(data)
+            self.delivered += 1
+            return True
+        except asyncio.QueueFull:
+            pass
+        if self.policy == "drop_newest":
+            sub.dropped += 1
+            self.dropped += 1
+            return False
+        if self.policy == "drop_oldest":
+            sub.queue.get_nowait()
+            sub.queue.put_nowait(data)
+            sub.dropped += 1
+            self.dropped += 1
+            self.delivered += 1
+            return True
+        logger.warning(f"SSE client {sub.client_id} is too slow ({self.queue_size} events queued), disconnecting")
+        self.close(sub)
+        self.disconnected += 1
+        return False
+
+    def close(self, sub: Subscriber) -> None:
+        """End a stream: drop what is queued and wake the reader with the close sentinel."""
+        sub.closed = True
+        while not sub.queue.empty():
+            sub.queue.get_nowait()
+        sub.queue.put_nowait(_CLOSE)
+        self.unsubscribe(sub)
+
+    def close_all(self) -> None:
+        for subs in list(self.subscribers.values()):
+            for sub in list(subs):
+                self.close(sub)
+
+    def stats(self) -> dict:
+        return {
+            "clients": len(self.subscribers),
+            "streams": self.count,
+            "queued": sum(sub.queue.qsize() for subs in self.subscribers.values() for sub in subs),
+            "delivered": self.delivered,
+            "dropped": self.dropped,
+            "disconnected": self.disconnected,
+        }
+
+def encode(event: dict) -> str:
+    return f"data: {json.dumps(event, separators=(',', ':'))}\n\n"
+
+broker = Broker()
+
+async def sse_generator(client_id: str) -> AsyncGenerator[str, None]:
+    """SSE event generator: drains the subscriber's queue, coalescing backlogged events into one write."""
+    # Subscribe inside the generator so the finally below always pairs with it
+    sub = broker.subscribe(client_id)
+    if sub is None:
+        return
+    logger.info(f"SSE connection established for {client_id}")
+    queue = sub.queue
+    ping = encode({"type": "ping", "from": "server", "client": client_id})
+    try:
+        while True:
+            if queue.empty():
+                try:
+                    data = await asyncio.wait_for(queue.get(), timeout=PING_INTERVAL)
+                except asyncio.TimeoutError:
+                    yield ping
+                    continue
+            else:
+                data = queue.get_nowait()
+            if data is _CLOSE:
+                break
+            chunks = [data]
+            while len(chunks) < MAX_BATCH and not queue.empty():
+                data = queue.get_nowait()
+                if data is _CLOSE:
+                    break
+                chunks.append(data)
+            yield "".join(chunks)
+            if data is _CLOSE:
+                break
+    finally:
+        # Runs on client disconnect (generator cancelled/closed) as well as on server-side close
+        broker.unsubscribe(sub)
+        logger.info(f"SSE client {sub.client_id} disconnected")
+
+def process_action(body: dict) -> dict:
+    """Run one action and deliver its response to the caller's SSE streams."""
+    action = body.get("action")
+    payload = body.get("payload", {})
+    client_id = body.get("client_id", "unknown")
+
+    logger.debug(f"Received MCP action: {action} from {client_id}, payload: {payload}")
+
+    # Echo response (in real: process action, e.g., run command)
+    response = {
+        "type": "response",
+        "id": body.get("id"),  # Correlation id: lets the client match this to its request
+        "action": action,
+        "status": "success",
+        "result": f"Echo: {action} with {payload}",
+        "to": client_id
+    }
+
+    # Deliver to the caller's streams, or to everyone on request
+    if body.get("broadcast"):
+        delivered = broker.broadcast(response)
+    else:
+        delivered = broker.publish(client_id, response)
+    logger.debug(f"Sent response to {delivered} stream(s): {response}")
+    return response
 
 @app.post("/mcp/action")
 async def handle_mcp_action(request: Request):
-    """MCP action endpoint: receives {action, payload}, echoes back via SSE."""
+    """MCP action endpoint: receives {action, payload} (or a JSON array of them as a batch), echoes back via SSE."""
     try:
         body = await request.json()
-        action = body.get("action")
-        payload = body.get("payload", {})
-        client_id = body.get("client_id", "unknown")
-        
-        logger.info(f"Received MCP action: {action} from {client_id}, payload: {payload}")
-        
-        # Echo response (in real: process action, e.g., run command)
-        response = {
-            "type": "response",
-            "action": action,
-            "status": "success",
-            "result": f"Echo: {action} with {payload}",
-            "to": client_id
-        }
-        
-        # Broadcast to all SSE clients (or target specific)
-        for client in clients:
-            # In real: send via client-specific channel
-            pass  # Placeholder: log instead
-        logger.info(f"Sent response: {response}")
-        
-        return {"status": "processed", "response": response}
+        if isinstance(body, list):
+            return {"status": "processed", "responses": [process_action(item) for item in body]}
+        return {"status": "processed", "response": process_action(body)}
     except Exception as e:
         logger.error(f"MCP action error: {e}")
         return {"status": "error", "message": str(e)}
@@ -66,20 +218,24 @@ async def handle_mcp_action(request: Request):
 @app.get("/mcp/sse/{client_id}")
 async def sse_stream(client_id: str):
     """SSE endpoint for MCP events."""
-    clients.add(client_id)
-    logger.info(f"SSE connection established for {client_id}")
-    
-    async def event_generator() -> AsyncGenerator[str, None]:
-        async for data in sse_generator(client_id):
-            yield data
-    
-    return StreamingResponse(event_generator(), media_type="text/event-stream")
+    if broker.count >= broker.max_clients:
+        return JSONResponse({"status": "error", "message": "too many SSE clients"}, status_code=503)
+    return StreamingResponse(
+        sse_generator(client_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.get("/mcp/stats")
+async def stats():
+    return broker.stats()
 
 @app.on_event("shutdown")
 async def shutdown_event():
-    clients.clear()
+    broker.close_all()
     logger.info("MCP server shutdown")
 
 if __name__ == "__main__":
     # Run with uvicorn for ASGI
-    uvicorn.run(app, host="localhost", port=9090, log_level="info")
+    # MCP_PORT is set per replica when the tool runs several copies of this server
+    uvicorn.run(app, host="localhost", port=int(os.environ.get("MCP_PORT") or 9090), log_level="info")
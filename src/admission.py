@@ -0,0 +1,241 @@
+import asyncio
+import contextvars
+import heapq
+import itertools
+import time
+import logging
+from contextlib import contextmanager
+from threading import Event, Lock
+from .metrics import TOOL_ADMISSIONS, TOOL_QUEUED
+
+logger = logging.getLogger(__name__)
+
+RATE_LIMITED = "rate_limited"
+QUEUE_FULL = "queue_full"
+QUEUE_TIMEOUT = "queue_timeout"
+
+_caller = contextvars.ContextVar("toolfabric_caller", default=(None, None))
+
+@contextmanager
+def caller(name=None, priority=None):
+    """Attribute tool calls made inside the block to `name` (a user, session or agent).
+
+    Queued calls are admitted highest priority first: an explicit `priority` wins, otherwise
+    the tool's `limits.priorities` entry for `name`, otherwise `limits.default_priority`.
+    """
+    token = _caller.set((name, priority))
+    try:
+        yield
+    finally:
+        _caller.reset(token)
+
+def current_caller():
+    """(name, priority) set by the innermost caller() block, or (None, None)."""
+    return _caller.get()
+
+class AdmissionRejected(Exception):
+    """A call was refused by a tool's limits. `result()` is what the tool returns instead."""
+    def __init__(self, tool, reason, message, retry_after=None):
+        super().__init__(message)
+        self.tool = tool
+        self.reason = reason
+        self.retry_after = retry_after
+
+    def result(self):
+        result = {"error": f"Tool {self.tool} is overloaded: {self}", "reason": self.reason, "tool": self.tool}
+        if self.retry_after is not None:
+            result["retry_after"] = round(self.retry_after, 3)
+        return result
+
+class TokenBucket:
+    """`rate` tokens per second, holding at most `burst`."""
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.burst = burst if burst is not None else max(1, rate)
+        self._tokens = self.burst
+        self._refilled = time.monotonic()
+
+    def take(self, n=1):
+        """Take `n` tokens. Returns 0 on success, else the seconds until they would be available."""
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._refilled) * self.rate)
+        self._refilled = now
+        # A batch larger than the burst would never fit: it goes through on a full bucket and
+        # leaves it in debt, so later calls wait until the whole batch has been paid for
+        needed = min(n, self.burst)
+        if self._tokens >= needed:
+            self._tokens -= n
+            return 0
+        return (needed - self._tokens) / self.rate
+
+class _Waiter:
+    __slots__ = ("event", "loop", "future", "granted", "cancelled")
+
+    def __init__(self, loop=None):
+        self.loop = loop
+        self.event = Event() if loop is None else None
+        self.future = loop.create_future() if loop is not None else None
+        self.granted = False
+        self.cancelled = False
+
+    def wake(self):
+        if self.loop is None:
+            self.event.set()
+        else:
+            self.loop.call_soon_threadsafe(_resolve, self.future)
+
+def _resolve(future):
+    if not future.done():
+        future.set_result(True)
+
+class AdmissionController:
+    """Per-tool admission: a token-bucket rate limit, a concurrency limit and a bounded wait queue.
+
+    Over the rate the call is rejected at once with a `retry_after`. With all `max_concurrency`
+    slots busy it waits in a priority queue of at most `max_queue` calls for up to
+    `queue_timeout` seconds; a full queue or an expired wait rejects it. A finished call hands
+    its slot straight to the highest-priority waiter (FIFO within a priority).
+    """
+    def __init__(self, tool, max_concurrency=None, rate=None, burst=None, max_queue=0, queue_timeout=5.0,
+                 priorities=None, default_priority=0):
+        if max_concurrency is not None and max_concurrency < 1:
+            raise ValueError(f"limits: max_concurrency must be at least 1, got {max_concurrency}")
+        if rate is not None and rate <= 0:
+            raise ValueError(f"limits: rate must be positive, got {rate}")
+        if max_queue < 0:
+            raise ValueError(f"limits: max_queue must not be negative, got {max_queue}")
+        self.tool = tool
+        self.max_concurrency = max_concurrency
+        self.bucket = TokenBucket(rate, burst) if rate else None
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.priorities = dict(priorities or {})
+        self.default_priority = default_priority
+        self.active = 0
+        self.queued = 0
+        self.rejected = {RATE_LIMITED: 0, QUEUE_FULL: 0, QUEUE_TIMEOUT: 0}
+        self._waiters = []  # Heap of (-priority, seq, waiter)
+        self._seq = itertools.count()
+        self._lock = Lock()
+        self._outcomes = {outcome: TOOL_ADMISSIONS.labels(tool, outcome)
+                          for outcome in ("admitted", "queued", RATE_LIMITED, QUEUE_FULL, QUEUE_TIMEOUT)}
+        self._queued_gauge = TOOL_QUEUED.labels(tool)
+
+    @classmethod
+    def from_config(cls, tool, cfg):
+        if not cfg:
+            return None
+        return cls(
+            tool,
+            max_concurrency=cfg.get("max_concurrency"),
+            rate=cfg.get("rate"),
+            burst=cfg.get("burst"),
+            max_queue=cfg.get("max_queue", 0),
+            queue_timeout=cfg.get("queue_timeout", 5.0),
+            priorities=cfg.get("priorities"),
+            default_priority=cfg.get("default_priority", 0),
+        )
+
+    def priority(self):
+        name, priority = _caller.get()
+        if priority is not None:
+            return priority
+        return self.priorities.get(name, self.default_priority)
+
+    def acquire(self, cost=1):
+        """Take a slot for one call (or a batch of `cost` items), waiting if allowed.
+
+        Raises AdmissionRejected when the call is not admitted; otherwise release() must follow.
+        """
+        waiter = self._enter(cost, None)
+        if waiter is None:
+            return
+        waiter.event.wait(self.queue_timeout)
+        self._leave(waiter)
+
+    async def acquire_async(self, cost=1):
+        waiter = self._enter(cost, asyncio.get_running_loop())
+        if waiter is None:
+            return
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter.future), self.queue_timeout)
+        except asyncio.TimeoutError:
+            pass
+        except asyncio.CancelledError:
+            with self._lock:
+                granted = waiter.granted
+                if not granted:
+                    self._cancel(waiter)
+            if granted:
+                self.release()
+            raise
+        self._leave(waiter)
+
+    def _enter(self, cost, loop):
+        """Admit now (returns None), queue (returns the waiter) or raise AdmissionRejected."""
+        with self._lock:
+            if self.bucket is not None:
+                wait = self.bucket.take(cost)
+                if wait:
+                    self._reject(RATE_LIMITED)
+                    raise AdmissionRejected(self.tool, RATE_LIMITED, f"over {self.bucket.rate:g} calls/s",
+                                            retry_after=wait)
+            if self.max_concurrency is None or self.active < self.max_concurrency:
+                self.active += 1
+                self._outcomes["admitted"].inc()
+                return None
+            if self.queued >= self.max_queue:
+                self._reject(QUEUE_FULL)
+                raise AdmissionRejected(self.tool, QUEUE_FULL,
+                                        f"{self.active} call(s) running and {self.queued} queued",
+                                        retry_after=self.queue_timeout if self.max_queue else None)
+            waiter = _Waiter(loop)
+            heapq.heappush(self._waiters, (-self.priority(), next(self._seq), waiter))
+            self.queued += 1
+            self._queued_gauge.set(self.queued)
+            self._outcomes["queued"].inc()
+            return waiter
+
+    def _leave(self, waiter):
+        with self._lock:
+            if waiter.granted:  # Also when the slot arrived just as the wait timed out
+                self._outcomes["admitted"].inc()
+                return
+            self._cancel(waiter)
+            self._reject(QUEUE_TIMEOUT)
+        raise AdmissionRejected(self.tool, QUEUE_TIMEOUT, f"no slot free within {self.queue_timeout:g}s",
+                                retry_after=self.queue_timeout)
+
+    def _cancel(self, waiter):
+        # Left in the heap and skipped by release(); called with the lock held
+        waiter.cancelled = True
+        self.queued -= 1
+        self._queued_gauge.set(self.queued)
+
+    def _reject(self, reason):
+        self.rejected[reason] += 1
+        self._outcomes[reason].inc()
+
+    def release(self):
+        with self._lock:
+            while self._waiters:
+                _, _, waiter = heapq.heappop(self._waiters)
+                if waiter.cancelled:
+                    continue
+                # The slot passes straight to the waiter; `active` stays the same
+                waiter.granted = True
+                self.queued -= 1
+                self._queued_gauge.set(self.queued)
+                waiter.wake()
+                return
+            self.active -= 1
+
+    def stats(self):
+        return {
+            "active": self.active,
+            "queued": self.queued,
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+            "rate": self.bucket.rate if self.bucket else None,
+            "rejected": dict(self.rejected),
+        }
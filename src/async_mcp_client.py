@@ -0,0 +1,314 @@
+import asyncio
+import time
+import logging
+from abc import ABC, abstractmethod
+from .codec import PayloadTooLarge, check_size
+from .mcp_client import MCPError, StdioHandler, SSEHandler, error_result, server_answered
+from .streaming import ChunkStream
+from .metrics import MCP_REQUESTS
+from .resilience import CircuitOpenError
+from . import tracing
+
+logger = logging.getLogger(__name__)
+
+class AsyncProtocolHandler(ABC):
+    """Asyncio view of a ProtocolHandler.
+
+    Async handlers share the transport of the synchronous handler they wrap (the stdio
+    reader thread, the SSE stream), so awaiting a response costs no thread per call.
+    """
+    def __init__(self, handler):
+        self.handler = handler
+
+    @abstractmethod
+    async def send(self, payload, timeout=None):
+        pass
+
+    async def open_stream(self, payload, stream):
+        # Stdio writes are short and buffered; chunks arrive on the shared reader thread
+        return self.handler.open_stream(payload, stream)
+
+    async def notify(self, payload):
+        await self.send(payload)
+
+    async def ping(self):
+        await self.send({"type": "ping"}, timeout=self.handler.options.get("ping_timeout", 5))
+        return True
+
+    async def close(self):
+        pass
+
+class AsyncStdioHandler(AsyncProtocolHandler):
+    async def send(self, payload, timeout=None):
+        # Writing to the pipe is a short, buffered write; the response is awaited without a thread
+        future = self.handler.submit(payload)
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), timeout)
+        except asyncio.TimeoutError:
+            raise TimeoutError(f"MCP request timed out after {timeout}s")
+
+    async def notify(self, payload):
+        self.handler.notify(payload)
+
+class AsyncHTTPConnectionPool:
+    """Keep-alive HTTP/1.1 connection pool on asyncio streams."""
+    def __init__(self, host, port, size=4, max_idle=60, timeout=30, max_response=None):
+        self.host = host
+        self.port = port
+        self.max_idle = max_idle
+        self.timeout = timeout
+        self.max_response = max_response
+        self._idle = []  # (reader, writer, released_at)
+        self._slots = asyncio.Semaphore(size)
+
+    async def request(self, method, path, body=b"", headers=None):
+        """Send a request; returns (status, body bytes)."""
+        if tracing.active() and self._slots.locked():
+            # All connections busy: show the wait for a slot as its own span
+            started, t0 = time.time(), time.perf_counter()
+            await self._slots.acquire()
+            tracing.record("http.pool_wait", started, time.perf_counter() - t0, host=f"{self.host}:{self.port}")
+        else:
+            await self._slots.acquire()
+        try:
+            for attempt in range(2):
+                reader, writer, reused = await self._acquire()
+                try:
+                    status, data, will_close = await asyncio.wait_for(
+                        self._roundtrip(reader, writer, method, path, body, headers or {}), self.timeout)
+                except PayloadTooLarge:
+                    writer.close()  # The rest of the body is still unread
+                    raise
+                except (ConnectionError, asyncio.IncompleteReadError):
+                    writer.close()
+                    if reused and attempt == 0:
+                        continue  # Stale keep-alive connection; retry on a fresh one
+                    raise
+                except BaseException:
+                    writer.close()
+                    raise
+                if will_close:
+                    writer.close()
+                else:
+                    self._idle.append((reader, writer, time.monotonic()))
+                return status, data
+        finally:
+            self._slots.release()
+
+    async def close(self):
+        idle, self._idle = self._idle, []
+        for _, writer, _ in idle:
+            writer.close()
+
+    async def _acquire(self):
+        now = time.monotonic()
+        while self._idle:
+            reader, writer, released_at = self._idle.pop()
+            if now - released_at <= self.max_idle and not writer.is_closing():
+                return reader, writer, True
+            writer.close()
+        reader, writer = await asyncio.wait_for(asyncio.open_connection(self.host, self.port), self.timeout)
+        return reader, writer, False
+
+    async def _roundtrip(self, reader, writer, method, path, body, headers):
+        lines = [f"{method} {path} HTTP/1.1", f"Host: {self.host}:{self.port}", f"Content-Length: {len(body)}"]
+        lines.extend(f"{k}: {v}" for k, v in headers.items())
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + body)
+        await writer.drain()
+
+        status_line = await reader.readline()
+        if not status_line:
+            raise ConnectionError("Connection closed before response")
+        status = int(status_line.split()[1])
+        response_headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            key, _, value = line.decode("latin-1").partition(":")
+            response_headers[key.strip().lower()] = value.strip()
+
+        will_close = response_headers.get("connection", "").lower() == "close"
+        limit = self.max_response
+        if response_headers.get("transfer-encoding", "").lower() == "chunked":
+            chunks, total = [], 0
+            while True:
+                size = int((await reader.readline()).split(b";")[0], 16)
+                if size == 0:
+                    await reader.readline()
+                    break
+                total += size
+                check_size("response", total, limit)
+                chunks.append(await reader.readexactly(size))
+                await reader.readline()
+            data = b"".join(chunks)
+        elif "content-length" in response_headers:
+            length = int(response_headers["content-length"])
+            check_size("response", length, limit)
+            data = await reader.readexactly(length)
+        else:
+            data = await reader.read(limit + 1 if limit else -1)
+            check_size("response", len(data), limit)
+            will_close = True
+        return status, data, will_close
+
+class AsyncSSEHandler(AsyncProtocolHandler):
+    """POSTs over an asyncio connection pool; responses still arrive on the shared SSE stream."""
+    def __init__(self, handler):
+        super().__init__(handler)
+        self._pool = None
+
+    def _get_pool(self):
+        if self._pool is None:
+            opts = self.handler.options
+            self._pool = AsyncHTTPConnectionPool(
+                self.handler.pool.host, self.handler.pool.port,
+                size=opts.get("pool_size", 4),
+                max_idle=opts.get("max_idle", 60),
+                timeout=opts.get("timeout", 30),
+                max_response=self.handler.max_payload,
+            )
+        return self._pool
+
+    async def _post(self, body):
+        with tracing.span("sse.post", client=self.handler.client_id):
+            status, data = await self._get_pool().request(
+                "POST", self.handler.action_path, self.handler.encode(body), self.handler.headers())
+            return self.handler.decode_reply(status, data)
+
+    async def open_stream(self, payload, stream):
+        future, body = self.handler.open_stream_request(payload, stream)
+        try:
+            reply = await self._post(body)
+        except Exception as e:
+            self.handler._resolve(future.request_id, error=e)
+            return future
+        self.handler.handle_reply(reply)
+        return future
+
+    async def send(self, payload, timeout=None):
+        future, body = self.handler.open_request(payload)
+        try:
+            reply = await self._post(body)
+        except BaseException:
+            future.cancel()
+            raise
+        self.handler.handle_reply(reply)
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), timeout)
+        except asyncio.TimeoutError:
+            raise TimeoutError(f"MCP request timed out after {timeout}s")
+
+    async def notify(self, payload):
+        await self._post(dict(payload, client_id=self.handler.client_id))
+
+    async def close(self):
+        if self._pool is not None:
+            await self._pool.close()
+            self._pool = None
+
+class AsyncMCPClient:
+    """Asyncio counterpart of MCPClient, sharing the wrapped client's connection and transport."""
+    def __init__(self, client):
+        self.client = client
+        self.name = client.name
+        self.protocol = client.protocol
+        self.handler = self._get_handler(client.handler)
+
+    def _get_handler(self, handler):
+        if isinstance(handler, StdioHandler):
+            return AsyncStdioHandler(handler)
+        elif isinstance(handler, SSEHandler):
+            return AsyncSSEHandler(handler)
+        else:
+            raise ValueError(f"No async handler for {type(handler).__name__}")
+
+    @property
+    def connected(self):
+        return self.client.connected
+
+    @property
+    def healthy(self):
+        return self.client.healthy
+
+    async def connect(self):
+        # Connecting is rare and may handshake; reuse the blocking path off the event loop
+        await asyncio.get_running_loop().run_in_executor(None, self.client.connect)
+
+    async def send(self, payload, timeout=None):
+        if not self.connected:
+            MCP_REQUESTS.labels(self.name, "not_connected").inc()
+            logger.warning(f"[AsyncMCPClient:{self.name}] WARNING: not connected")
+            return None
+        if not self.client.breaker.allow():
+            MCP_REQUESTS.labels(self.name, "rejected").inc()
+            logger.warning(f"[AsyncMCPClient:{self.name}] Circuit breaker for {self.name} is open")
+            return None
+        with tracing.span("mcp.send", client=self.name, protocol=self.protocol) as span:
+            started = time.monotonic()
+            try:
+                result = await self.handler.send(tracing.inject(payload), timeout=timeout or self.client.request_timeout())
+                self.client.record_success(time.monotonic() - started)
+                logger.debug(f"[AsyncMCPClient:{self.name}:{self.protocol}] SEND → {payload}")
+                return result
+            except asyncio.CancelledError:
+                self.client.breaker.release()  # Abandoned by a hedge or the caller
+                raise
+            except TimeoutError as e:
+                self.client.record_failure(e)
+                span.fail(e)
+                logger.warning(f"[AsyncMCPClient:{self.name}] Send timed out: {e}")
+                return None
+            except (MCPError, PayloadTooLarge) as e:
+                span.fail(e)
+                if not server_answered(e):
+                    self.client.breaker.release()  # Never sent
+                    MCP_REQUESTS.labels(self.name, "too_large").inc()
+                    logger.error(f"[AsyncMCPClient:{self.name}] Not sent: {e}")
+                    return None
+                self.client.record_success(time.monotonic() - started, "error")
+                logger.error(f"[AsyncMCPClient:{self.name}] Server returned error: {e}")
+                return error_result(e)  # Not None: the server answered, so callers must not retry
+            except Exception as e:
+                self.client.record_failure(e)
+                span.fail(e)
+                logger.error(f"[AsyncMCPClient:{self.name}] Send error: {e}")
+                return None
+
+    async def stream(self, payload, window=None):
+        """Start a streamed request; `async for` over the returned ChunkStream (see MCPClient.stream)."""
+        client = self.client
+        if not self.connected:
+            raise ConnectionError(f"MCP client {self.name} is not connected")
+        if not client.breaker.allow():
+            raise CircuitOpenError(f"Circuit breaker for {self.name} is open")
+        stream = ChunkStream(self.name, window or client.stream_window, client.request_timeout())
+        started = time.monotonic()
+        stream.add_done_callback(lambda error: client._on_stream_done(error, started))
+        try:
+            await self.handler.open_stream(tracing.inject(payload), stream)
+        except BaseException as e:
+            stream.fail(e)
+            raise
+        return stream
+
+    async def notify(self, payload):
+        if not self.connected:
+            logger.warning(f"[AsyncMCPClient:{self.name}] WARNING: not connected")
+            return
+        try:
+            await self.handler.notify(payload)
+        except Exception as e:
+            logger.error(f"[AsyncMCPClient:{self.name}] Notify error: {e}")
+            self.client.connected = False
+
+    async def ping(self):
+        try:
+            return await self.handler.ping()
+        except Exception as e:
+            logger.warning(f"[AsyncMCPClient:{self.name}] Ping failed: {e}")
+            return False
+
+    async def disconnect(self):
+        await self.handler.close()
+        await asyncio.get_running_loop().run_in_executor(None, self.client.disconnect)
@@ -1,19 +1,87 @@
 from abc import ABC, abstractmethod
+from contextlib import nullcontext
+from .admission import AdmissionController, AdmissionRejected
+from .codec import kb_limit
+from .config import ToolConfig
 from .mcp_client import MCPClient
-import threading
+from .async_mcp_client import AsyncMCPClient
+from .health import CallableJob, IdleJob, get_default_scheduler
+from .metrics import ToolMetrics, TOOL_RUNNING, TOOL_STARTS
+from . import tracing
+import asyncio
 import time
 import logging
-from threading import Event
+from threading import Event, Lock
 
 logger = logging.getLogger(__name__)
 
+def split_call(item):
+    """A call_many item as (args, kwargs): a dict is keyword arguments, a list or tuple
+    positional arguments, anything else the single positional argument."""
+    if isinstance(item, dict):
+        return (), item
+    if isinstance(item, (list, tuple)):
+        return tuple(item), {}
+    return (item,), {}
+
 class BaseTool(ABC):
     def __init__(self, name, config):
         self.name = name
-        self.config = config
+        self.config = ToolConfig.from_dict(config)
         self.mcp_clients = []
-        self._health_threads = []
+        self.metrics = ToolMetrics(name)
+        self._async_clients = None
+        self.scheduler = None  # Shared HealthScheduler, set by ToolFabric
+        self.timeline = None  # StartupTimeline, set by ToolFabric
+        self._health_jobs = []
         self._stop_event = Event()
+        # Lifecycle for lazy start / idle shutdown
+        self.start_mode = config.get("start", "eager")
+        if self.start_mode not in ("eager", "lazy"):
+            raise ValueError(f"Tool {name}: start must be 'eager' or 'lazy', got {self.start_mode!r}")
+        self.idle_timeout = config.get("idle_timeout")
+        self.running = False
+        self.closed = False  # Shut down by the fabric for good; never restarted
+        self._lifecycle_lock = Lock()
+        self._active_calls = 0
+        self._last_used = time.monotonic()
+        self._idle_job = None
+        self._tool_funcs = None
+        self.admission = AdmissionController.from_config(name, self.config.get("limits"))
+        self.max_result = kb_limit(self.config, "max_result_kb")  # Bytes, for results assembled from chunks
+        self.tool_type = None  # Registered type name, set by create_tool
+        self._declaration = None
+
+    def _span(self, phase, detail=None):
+        """Record `phase` of this tool's startup on the fabric's timeline, if there is one."""
+        if self.timeline is None:
+            return nullcontext({})
+        return self.timeline.span(phase, tool=self.name, detail=detail)
+
+    @property
+    def managed(self):
+        """True when calls go through the lifecycle wrapper (lazy start and/or idle shutdown)."""
+        return self.start_mode == "lazy" or bool(self.idle_timeout)
+
+    def declaration(self):
+        """Function declaration for agents: {name, description, parameters (JSON schema)}.
+
+        Built once per tool instance. `description` and `parameters` from the config win over
+        what the tool infers.
+        """
+        if self._declaration is None:
+            self._declaration = {
+                "name": self.name,
+                "description": self.config.get("description") or self._describe(),
+                "parameters": self.config.get("parameters") or self._parameters(),
+            }
+        return self._declaration
+
+    def _describe(self):
+        return f"Tool {self.name}"
+
+    def _parameters(self):
+        return {"type": "object"}
 
     def _validate_config(self):
         if "name" not in self.config:
@@ -24,58 +92,391 @@ class BaseTool(ABC):
 
     @abstractmethod
     def start(self):
+        self._stop_event.clear()
         self._validate_config()
         self._attach_mcp_clients()
         self._start_health_checks()
 
     def stop(self):
         self._stop_event.set()
+        for job in self._health_jobs:
+            job.cancelled = True
+        self._health_jobs = []
+        if self._idle_job is not None:
+            self._idle_job.cancelled = True
+            self._idle_job = None
         for client in self.mcp_clients:
             client.disconnect()
-        for t in self._health_threads:
-            if t and t.is_alive():
-                t.join(timeout=2)
+        self.mcp_clients = []
+        self._async_clients = None
+        if self.running:
+            self.running = False
+            TOOL_RUNNING.labels(self.name).set(0)
         logger.info(f"[BaseTool:{self.name}] Stopped")
 
+    def close(self):
+        """Stop the tool for good. Unlike an idle stop, tool functions kept from it no longer
+        restart it; calls return the start-failed error instead."""
+        self.closed = True
+        self._stop_event.set()  # Cut short a lazy start waiting for readiness
+        with self._lifecycle_lock:
+            self.stop()
+
+    def ensure_started(self):
+        """Start the tool unless it is running; concurrent callers share one startup.
+
+        Returns the readiness result (True when already running). On failure the partially
+        started tool is stopped again and the error is raised.
+        """
+        if self.running:
+            return True
+        with self._lifecycle_lock:
+            return self._start_locked()
+
+    def _start_locked(self):
+        if self.running:
+            return True
+        if self.closed:
+            raise RuntimeError("tool has been shut down")
+        try:
+            with self._span("start", detail=self.start_mode):
+                self.start()
+                with self._span("ready"):
+                    ready = self.wait_ready()
+        except Exception:
+            try:
+                self.stop()
+            except Exception as stop_error:
+                logger.error(f"[BaseTool:{self.name}] Error stopping after failed start: {stop_error}")
+            raise
+        self._last_used = time.monotonic()
+        self.running = True
+        TOOL_RUNNING.labels(self.name).set(1)
+        TOOL_STARTS.labels(self.name, "start").inc()
+        if self.idle_timeout:
+            self._idle_job = IdleJob(self, self.idle_timeout)
+            (self.scheduler or get_default_scheduler()).schedule(self._idle_job, delay=self.idle_timeout)
+        return ready
+
+    def _stop_if_idle(self):
+        """Idle check run by the scheduler. Returns the delay to the next check, or None once stopped."""
+        with self._lifecycle_lock:
+            if not self.running:
+                return None
+            idle = time.monotonic() - self._last_used
+            if self._active_calls or idle < self.idle_timeout:
+                return self.idle_timeout - idle if not self._active_calls else self.idle_timeout
+            logger.info(f"[BaseTool:{self.name}] Idle for {idle:.0f}s, stopping")
+            TOOL_STARTS.labels(self.name, "idle_stop").inc()
+            self.stop()
+            return None
+
+    def _acquire(self):
+        with self._lifecycle_lock:
+            if not self.running:
+                self._start_locked()
+            self._active_calls += 1
+            if self._tool_funcs is None:
+                self._tool_funcs = (self.to_tool(), self.to_async_tool())
+            return self._tool_funcs
+
+    def _release(self):
+        with self._lifecycle_lock:
+            self._active_calls -= 1
+            self._last_used = time.monotonic()
+
+    async def _acquire_async(self):
+        if self.running:
+            return self._acquire()
+        # Startup blocks on process spawn and readiness; keep it off the event loop
+        return await asyncio.get_running_loop().run_in_executor(None, self._acquire)
+
+    def _start_failed_result(self, error):
+        return {"error": f"Tool {self.name} failed to start: {error}"}
+
+    def to_lazy_tool(self):
+        """Tool function that starts the tool on first use and keeps it alive while calls are in flight."""
+        def tool(*args, **kwargs):
+            try:
+                func, _ = self._acquire()
+            except Exception as e:
+                logger.error(f"[BaseTool:{self.name}] Start on first call failed: {e}")
+                return self._start_failed_result(e)
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self._release()
+        return tool
+
+    def to_lazy_async_tool(self):
+        async def tool(*args, **kwargs):
+            try:
+                _, func = await self._acquire_async()
+            except Exception as e:
+                logger.error(f"[BaseTool:{self.name}] Start on first call failed: {e}")
+                return self._start_failed_result(e)
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                self._release()
+        return tool
+
+    def to_admitted_tool(self, func):
+        """Wrap a tool function with the tool's `limits`; refused calls return AdmissionRejected.result()."""
+        admission = self.admission
+        def tool(*args, **kwargs):
+            try:
+                admission.acquire()
+            except AdmissionRejected as e:
+                logger.warning(f"[BaseTool:{self.name}] Call refused ({e.reason}): {e}")
+                return e.result()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                admission.release()
+        return tool
+
+    def to_admitted_async_tool(self, func):
+        admission = self.admission
+        async def tool(*args, **kwargs):
+            try:
+                await admission.acquire_async()
+            except AdmissionRejected as e:
+                logger.warning(f"[BaseTool:{self.name}] Call refused ({e.reason}): {e}")
+                return e.result()
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                admission.release()
+        return tool
+
+    def wait_ready(self, timeout=None):
+        """Block until the readiness probe passes or `timeout` expires. Returns True when ready."""
+        ready_cfg = self.config.get("readiness", {})
+        if timeout is None:
+            timeout = ready_cfg.get("timeout", 30)
+        interval = ready_cfg.get("interval", 0.2)
+        deadline = time.monotonic() + timeout
+        while True:
+            if self._probe_ready():
+                return True
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or self._stop_event.is_set():
+                return False
+            self._stop_event.wait(timeout=min(interval, remaining))
+
+    def _probe_ready(self):
+        # Ready once every client the tool's calls depend on is connected; retry the ones that are not.
+        ready = True
+        for client in self._readiness_clients():
+            if not client.connected:
+                client.connect()
+            ready = ready and client.connected
+        return ready
+
+    def _readiness_clients(self):
+        """Clients that must be connected before the tool counts as ready."""
+        return self.mcp_clients
+
     @abstractmethod
     def to_tool(self):
         pass
 
-    def _attach_mcp_clients(self):
+    def to_async_tool(self):
+        """Coroutine-function variant of to_tool(). The default runs the sync tool in the loop's executor."""
+        func = self.to_tool()
+        async def tool(*args, **kwargs):
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(None, tracing.in_context(func, *args, **kwargs))
+        return tool
+
+    def stream(self, *args, **kwargs):
+        """Iterate over the tool's result in chunks, as the tool produces them.
+
+        Internal tools stream generator results; MCP tools stream the chunks their server
+        sends. A result that is not streamed arrives as the only chunk. Limits and lazy start
+        apply as for a call; a refused call or failed start yields its error as the only chunk.
+        Closing the iterator early abandons the rest of the result.
+        """
+        if self.admission is not None:
+            try:
+                self.admission.acquire()
+            except AdmissionRejected as e:
+                logger.warning(f"[BaseTool:{self.name}] Stream refused ({e.reason}): {e}")
+                yield e.result()
+                return
+        try:
+            if self.managed:
+                try:
+                    self._acquire()
+                except Exception as e:
+                    logger.error(f"[BaseTool:{self.name}] Start on first call failed: {e}")
+                    yield self._start_failed_result(e)
+                    return
+            try:
+                yield from self._stream(*args, **kwargs)
+            finally:
+                if self.managed:
+                    self._release()
+        finally:
+            if self.admission is not None:
+                self.admission.release()
+
+    async def astream(self, *args, **kwargs):
+        """Async-iterator counterpart of stream()."""
+        if self.admission is not None:
+            try:
+                await self.admission.acquire_async()
+            except AdmissionRejected as e:
+                logger.warning(f"[BaseTool:{self.name}] Stream refused ({e.reason}): {e}")
+                yield e.result()
+                return
+        try:
+            if self.managed:
+                try:
+                    await self._acquire_async()
+                except Exception as e:
+                    logger.error(f"[BaseTool:{self.name}] Start on first call failed: {e}")
+                    yield self._start_failed_result(e)
+                    return
+            try:
+                async for chunk in self._astream(*args, **kwargs):
+                    yield chunk
+            finally:
+                if self.managed:
+                    self._release()
+        finally:
+            if self.admission is not None:
+                self.admission.release()
+
+    def _stream(self, *args, **kwargs):
+        # Tools without incremental results: the whole result is one chunk
+        yield self.to_tool()(*args, **kwargs)
+
+    async def _astream(self, *args, **kwargs):
+        yield await self.to_async_tool()(*args, **kwargs)
+
+    def call_many(self, items):
+        """Call the tool once per item (see split_call) and return the results in order.
+
+        Errors are reported per item, in the same shape a single call returns them.
+        """
+        items = list(items)
+        if self.admission is None:
+            return self._call_many_managed(items)
+        # A batch takes one concurrency slot and one rate token per item
+        try:
+            self.admission.acquire(cost=len(items))
+        except AdmissionRejected as e:
+            logger.warning(f"[BaseTool:{self.name}] Batch of {len(items)} refused ({e.reason}): {e}")
+            return [e.result()] * len(items)
+        try:
+            return self._call_many_managed(items)
+        finally:
+            self.admission.release()
+
+    def _call_many_managed(self, items):
+        if not self.managed:
+            return self._call_many(items)
+        try:
+            self._acquire()
+        except Exception as e:
+            logger.error(f"[BaseTool:{self.name}] Start on first call failed: {e}")
+            return [self._start_failed_result(e)] * len(items)
+        try:
+            return self._call_many(items)
+        finally:
+            self._release()
+
+    async def call_many_async(self, items):
+        items = list(items)
+        if self.admission is None:
+            return await self._call_many_managed_async(items)
+        try:
+            await self.admission.acquire_async(cost=len(items))
+        except AdmissionRejected as e:
+            logger.warning(f"[BaseTool:{self.name}] Batch of {len(items)} refused ({e.reason}): {e}")
+            return [e.result()] * len(items)
+        try:
+            return await self._call_many_managed_async(items)
+        finally:
+            self.admission.release()
+
+    async def _call_many_managed_async(self, items):
+        if not self.managed:
+            return await self._call_many_async(items)
+        try:
+            await self._acquire_async()
+        except Exception as e:
+            logger.error(f"[BaseTool:{self.name}] Start on first call failed: {e}")
+            return [self._start_failed_result(e)] * len(items)
+        try:
+            return await self._call_many_async(items)
+        finally:
+            self._release()
+
+    def _call_many(self, items):
+        tool = self.to_tool()
+        return [tool(*args, **kwargs) for args, kwargs in map(split_call, items)]
+
+    async def _call_many_async(self, items):
+        tool = self.to_async_tool()
+        return list(await asyncio.gather(*(tool(*args, **kwargs) for args, kwargs in map(split_call, items))))
+
+    @property
+    def async_clients(self):
+        if self._async_clients is None:
+            self._async_clients = [AsyncMCPClient(client) for client in self.mcp_clients]
+        return self._async_clients
+
+    def _attach_mcp_clients(self, connect=True):
         for cfg in self.config.get("mcp_clients", []):
             if not cfg.get("enabled", True):
                 continue
-            client = MCPClient(
-                name=cfg["name"],
-                host=cfg["host"],
-                port=cfg["port"],
-                protocol=cfg.get("protocol", "stdio"),
-                token=cfg.get("auth_token")
-            )
+            self.mcp_clients.append(self._create_client(cfg, channel=self._client_channel(cfg), connect=connect))
+
+    def _create_client(self, cfg, channel=None, name=None, port=None, connect=True):
+        client = MCPClient(
+            name=name or cfg["name"],
+            host=cfg["host"],
+            port=cfg["port"] if port is None else port,
+            protocol=cfg.get("protocol", "stdio"),
+            token=cfg.get("auth_token"),
+            channel=channel,
+            options=cfg
+        )
+        if not connect:
+            return client
+        with self._span("connect", detail=client.name) as span:
             client.connect()
-            self.mcp_clients.append(client)
+            span["connected"] = client.connected
+        return client
+
+    def _client_channel(self, client_cfg):
+        # Tools that own a subprocess hand its stdio channel to stdio clients
+        return None
 
     def _start_health_checks(self):
         health_cfg = self.config.get("health_check", {})
         interval = health_cfg.get("interval", 10)
         check_type = health_cfg.get("type", "ping")
+        scheduler = self.scheduler or get_default_scheduler()
 
         # Client-level checks
         for client in self.mcp_clients:
-            client.start_health_check(interval, check_type)
+            self._start_client_health_check(client)
 
         # Tool-level health for internal (no clients)
         if not self.mcp_clients and check_type == "internal":
-            def internal_health_loop():
-                while not self._stop_event.is_set():
-                    try:
-                        self._health_check_internal()
-                    except Exception as e:
-                        logger.error(f"[BaseTool:{self.name}] Internal health failed: {e}")
-                    self._stop_event.wait(timeout=interval)
-            t = threading.Thread(target=internal_health_loop, daemon=True)
-            t.start()
-            self._health_threads.append(t)
+            job = CallableJob(self.name, interval, self._health_check_internal)
+            scheduler.schedule(job)
+            self._health_jobs.append(job)
+
+    def _start_client_health_check(self, client):
+        health_cfg = self.config.get("health_check", {})
+        options = {k: health_cfg[k] for k in ("backoff_base", "backoff_max", "skip_if_active") if k in health_cfg}
+        client.start_health_check(health_cfg.get("interval", 10), health_cfg.get("type", "ping"),
+                                  scheduler=self.scheduler or get_default_scheduler(), **options)
 
     @abstractmethod
     def _health_check_internal(self):
@@ -0,0 +1,146 @@
+import logging
+from collections import OrderedDict
+from threading import Lock
+from types import MappingProxyType
+
+logger = logging.getLogger(__name__)
+
+MAX_CACHED_VIEWS = 256
+
+class CatalogEntry:
+    """One published tool: its sync and async functions, declaration, tags and capabilities.
+
+    `declare()` builds the declaration on first use; it may import or introspect the tool,
+    which most agents never need.
+    """
+    __slots__ = ("name", "tool", "async_tool", "tags", "capabilities", "_declare", "_declaration")
+
+    def __init__(self, name, tool, async_tool, declare, tags=(), capabilities=()):
+        self.name = name
+        self.tool = tool
+        self.async_tool = async_tool
+        self.tags = frozenset(tags)
+        self.capabilities = frozenset(capabilities)
+        self._declare = declare
+        self._declaration = None
+
+    @property
+    def declaration(self):
+        if self._declaration is None:
+            try:
+                self._declaration = self._declare()
+            except Exception as e:
+                # A function that cannot be introspected is still callable
+                logger.warning(f"[ToolCatalog] Could not build the declaration of {self.name}: {e}")
+                self._declaration = {"name": self.name, "description": f"Tool {self.name}",
+                                     "parameters": {"type": "object"}}
+        return self._declaration
+
+    def matches(self, names=None, tags=None, capabilities=None):
+        return ((names is None or self.name in names)
+                and (tags is None or not self.tags.isdisjoint(tags))
+                and (capabilities is None or self.capabilities >= capabilities))
+
+class CatalogView:
+    """The tools one selection covers, in catalog order. Built once per catalog snapshot and filter."""
+    __slots__ = ("names", "tools", "async_tools", "_entries", "_declarations")
+
+    def __init__(self, entries):
+        self.names = tuple(e.name for e in entries)
+        self.tools = MappingProxyType({e.name: e.tool for e in entries})
+        self.async_tools = MappingProxyType({e.name: e.async_tool for e in entries})
+        self._entries = entries
+        self._declarations = None
+
+    @property
+    def declarations(self):
+        if self._declarations is None:
+            self._declarations = tuple(e.declaration for e in self._entries)
+        return self._declarations
+
+    def __len__(self):
+        return len(self.names)
+
+class ToolCatalog:
+    """Immutable snapshot of the published tools, indexed by name, tag and capability.
+
+    The fabric publishes a new catalog on every setup()/reload(), so readers never lock and
+    views taken from one snapshot stay consistent. Selections are cached per snapshot, so
+    building many agents over the same filter costs one dict lookup each.
+    """
+    def __init__(self, entries=()):
+        self._entries = OrderedDict((e.name, e) for e in entries)
+        self._order = {name: i for i, name in enumerate(self._entries)}
+        self._by_tag = {}
+        self._by_capability = {}
+        for entry in self._entries.values():
+            for tag in entry.tags:
+                self._by_tag.setdefault(tag, set()).add(entry.name)
+            for capability in entry.capabilities:
+                self._by_capability.setdefault(capability, set()).add(entry.name)
+        self._views = OrderedDict()
+        self._lock = Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, name):
+        return name in self._entries
+
+    def __iter__(self):
+        return iter(self._entries)
+
+    def get(self, name):
+        return self._entries.get(name)
+
+    def entries(self):
+        return list(self._entries.values())
+
+    def tags(self):
+        return {tag: len(names) for tag, names in self._by_tag.items()}
+
+    def capabilities(self):
+        return {capability: len(names) for capability, names in self._by_capability.items()}
+
+    def select(self, names=None, tags=None, capabilities=None):
+        """View of the tools listed in `names`, carrying any of `tags` and all of `capabilities`.
+
+        Each argument narrows the selection; None means no restriction on that axis.
+        """
+        key = selection_key(names, tags, capabilities)
+        with self._lock:
+            view = self._views.get(key)
+            if view is not None:
+                self._views.move_to_end(key)
+                return view
+        view = CatalogView([self._entries[n] for n in self._matching(*key)])
+        with self._lock:
+            self._views[key] = view
+            if len(self._views) > MAX_CACHED_VIEWS:
+                self._views.popitem(last=False)
+        return view
+
+    def _matching(self, names, tags, capabilities):
+        candidates = None
+        if names is not None:
+            candidates = names & self._entries.keys()
+        if tags is not None:
+            tagged = set().union(*(self._by_tag.get(t, ()) for t in tags))
+            candidates = tagged if candidates is None else candidates & tagged
+        for capability in capabilities or ():
+            capable = self._by_capability.get(capability, set())
+            candidates = capable if candidates is None else candidates & capable
+        if candidates is None:
+            return list(self._entries)
+        return sorted(candidates, key=self._order.__getitem__)
+
+def selection_key(names=None, tags=None, capabilities=None):
+    """Hashable (names, tags, capabilities) of frozensets; a single string counts as a one-item list."""
+    return _frozen(names), _frozen(tags), _frozen(capabilities)
+
+def _frozen(values):
+    if values is None:
+        return None
+    if isinstance(values, str):
+        return frozenset((values,))
+    return frozenset(values)
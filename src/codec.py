@@ -0,0 +1,72 @@
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_PAYLOAD_KB = 32 * 1024  # Per message; a streamed result may be larger in total
+
+class PayloadTooLarge(ValueError):
+    """A message or result is bigger than the configured limit."""
+    def __init__(self, what, size, limit):
+        super().__init__(f"{what} is {size} bytes, over the {limit} byte limit")
+        self.what = what
+        self.size = size
+        self.limit = limit
+
+def check_size(what, size, limit):
+    if limit and size > limit:
+        raise PayloadTooLarge(what, size, limit)
+
+def kb_limit(cfg, key, default_kb=None):
+    """`cfg[key]` (kilobytes) in bytes, or None for no limit."""
+    kb = cfg.get(key, default_kb)
+    return int(kb * 1024) if kb else None
+
+class JsonCodec:
+    """The standard library's json, compact. Decodes bytes directly (no intermediate str)."""
+    name = "json"
+
+    def dumps(self, obj):
+        return json.dumps(obj, separators=(",", ":"), ensure_ascii=False, default=str).encode("utf-8")
+
+    def loads(self, data):
+        return json.loads(data)
+
+class OrjsonCodec:
+    """orjson: several times faster than json and encodes straight to bytes."""
+    name = "orjson"
+
+    def __init__(self):
+        import orjson
+        self._orjson = orjson
+        self._option = orjson.OPT_NON_STR_KEYS
+
+    def dumps(self, obj):
+        return self._orjson.dumps(obj, option=self._option, default=str)
+
+    def loads(self, data):
+        return self._orjson.loads(data)
+
+_CODECS = {"json": JsonCodec, "orjson": OrjsonCodec}
+_instances = {}
+
+def register_codec(name, factory):
+    """Make `factory()` (an object with dumps(obj) -> bytes and loads(bytes) -> obj) available as `codec: name`."""
+    _CODECS[name] = factory
+    _instances.pop(name, None)
+
+def get_codec(name="auto"):
+    """The codec called `name`; "auto" is orjson when it is installed, else json."""
+    name = name or "auto"
+    if name == "auto":
+        try:
+            return get_codec("orjson")
+        except ImportError:
+            return get_codec("json")
+    codec = _instances.get(name)
+    if codec is None:
+        factory = _CODECS.get(name)
+        if factory is None:
+            raise ValueError(f"Unknown codec {name!r}; known: auto, {', '.join(_CODECS)}")
+        codec = _instances[name] = factory()
+    return codec
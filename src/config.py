@@ -0,0 +1,375 @@
+import hashlib
+import json
+import os
+import stat
+import sys
+import tempfile
+import yaml
+import logging
+from .admission import AdmissionController
+from .codec import get_codec
+from .executors import EXECUTOR_KINDS
+from .replicas import ReplicaPolicy
+
+logger = logging.getLogger(__name__)
+
+COMPILED_VERSION = 6  # Bump when the cached form changes; code changes are covered by _code_version()
+CACHE_MAX_FILES = 64
+PROTOCOLS = ("stdio", "sse")
+
+# libyaml's loader is several times faster when PyYAML was built with it
+_YAML_LOADER = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
+class ConfigRecord:
+    """A validated config section with typed, slotted fields.
+
+    Read access mirrors the dict it was compiled from (`get`, `[]`, `in`), so tools keep
+    using `config.get("key", default)`. Keys without a field are kept in `extra`, and a field
+    left unset (None) falls back to the caller's default like a missing key.
+    """
+    __slots__ = ()
+    FIELDS = ()
+
+    def __init__(self, **values):
+        extra = {}
+        for key, value in values.items():
+            if key in self.FIELDS:
+                setattr(self, key, value)
+            else:
+                extra[key] = value
+        for field in self.FIELDS:
+            if field not in values:
+                setattr(self, field, None)
+        self.extra = extra
+
+    @classmethod
+    def from_dict(cls, raw):
+        if isinstance(raw, cls):
+            return raw
+        if not isinstance(raw, dict):
+            raise ValueError(f"{cls.__name__}: expected a mapping, got {type(raw).__name__}")
+        return cls(**raw)
+
+    def get(self, key, default=None):
+        if key in self.FIELDS:
+            value = getattr(self, key)
+            return default if value is None else value
+        return self.extra.get(key, default)
+
+    def __getitem__(self, key):
+        value = self.get(key)
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key, value):
+        if key in self.FIELDS:
+            setattr(self, key, value)
+        else:
+            self.extra[key] = value
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def keys(self):
+        return [f for f in self.FIELDS if getattr(self, f) is not None] + list(self.extra)
+
+    def to_dict(self):
+        data = {f: getattr(self, f) for f in self.FIELDS if getattr(self, f) is not None}
+        data.update(self.extra)
+        for key, value in data.items():
+            if isinstance(value, list):
+                data[key] = [v.to_dict() if isinstance(v, ConfigRecord) else v for v in value]
+        return data
+
+    def __eq__(self, other):
+        if isinstance(other, ConfigRecord):
+            return type(self) is type(other) and self.to_dict() == other.to_dict()
+        if isinstance(other, dict):
+            return self.to_dict() == other
+        return NotImplemented
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.to_dict()!r})"
+
+class ClientConfig(ConfigRecord):
+    FIELDS = ("name", "host", "port", "protocol", "enabled", "auth_token", "timeout", "connect_timeout",
+              "ping_timeout", "initialize", "pool_size", "max_idle", "circuit_breaker", "adaptive_timeout",
+              "codec", "max_payload_kb", "stream_window")
+    __slots__ = FIELDS + ("extra",)
+
+    @classmethod
+    def from_dict(cls, raw):
+        cfg = super().from_dict(raw)
+        if cfg.protocol is None:
+            cfg.protocol = "stdio"
+        if cfg.enabled is None:
+            cfg.enabled = True
+        return cfg
+
+class ToolConfig(ConfigRecord):
+    FIELDS = ("name", "command", "module", "function", "batch_function", "start", "idle_timeout",
+              "depends_on", "readiness", "health_check", "mcp_clients", "cache", "publish", "executor",
+              "hedge", "replicas", "output", "limits", "max_result_kb", "type", "description", "parameters",
+              "tags", "capabilities", "batch")
+    __slots__ = FIELDS + ("extra",)
+
+    @classmethod
+    def from_dict(cls, raw):
+        cfg = super().from_dict(raw)
+        if cfg.start is None:
+            cfg.start = "eager"
+        if isinstance(cfg.depends_on, str):
+            cfg.depends_on = [cfg.depends_on]
+        cfg.depends_on = list(cfg.depends_on or [])
+        cfg.mcp_clients = [ClientConfig.from_dict(c) for c in cfg.mcp_clients or []]
+        return cfg
+
+class FabricConfig(ConfigRecord):
+    FIELDS = ("tools", "health", "setup", "metrics", "reload", "tracing", "sidecar")
+    __slots__ = FIELDS + ("extra",)
+
+    @classmethod
+    def from_dict(cls, raw):
+        cfg = super().from_dict(raw or {})
+        cfg.tools = [ToolConfig.from_dict(t) for t in cfg.tools or []]
+        return cfg
+
+def compile_config(raw):
+    """Validate a parsed config.yml and return its FabricConfig. Raises ValueError on the first problem."""
+    config = FabricConfig.from_dict(raw)
+    names = set()
+    for tool in config.tools:
+        if not tool.name:
+            raise ValueError("Tool config missing 'name'")
+        if tool.name in names:
+            raise ValueError(f"Duplicate tool name '{tool.name}'")
+        names.add(tool.name)
+        _validate_tool(tool)
+    resolve_dependencies({tool.name: tool for tool in config.tools})
+    if config.sidecar is not None:
+        _validate_sidecar(config.sidecar)
+    return config
+
+SIDECAR_OPTIONS = ("socket", "workers", "max_payload_kb", "codec", "mode", "stream_timeout")
+
+def _validate_sidecar(sidecar):
+    if not isinstance(sidecar, dict):
+        raise ValueError("sidecar must be a mapping")
+    unknown = [key for key in sidecar if key not in SIDECAR_OPTIONS]
+    if unknown:
+        raise ValueError(f"sidecar: unknown options {', '.join(unknown)}; known: {', '.join(SIDECAR_OPTIONS)}")
+    for key in ("workers", "max_payload_kb", "stream_timeout"):
+        value = sidecar.get(key)
+        if value is not None and not (isinstance(value, (int, float)) and value > 0):
+            raise ValueError(f"sidecar: {key} must be a positive number")
+    if sidecar.get("mode") is not None and not isinstance(sidecar["mode"], int):
+        raise ValueError("sidecar: mode must be an octal number such as 0600")
+    if sidecar.get("codec") is not None:
+        try:
+            get_codec(sidecar["codec"])
+        except (ImportError, ValueError) as e:
+            raise ValueError(f"sidecar: codec {sidecar['codec']!r} is not available: {e}")
+
+def _validate_tool(tool):
+    from .tool_factory import tool_type_for  # tool_factory imports the tools, which import this module
+    where = f"Tool '{tool.name}'"
+    if tool.command is not None:
+        if not isinstance(tool.command, list) or not all(isinstance(arg, str) for arg in tool.command):
+            raise ValueError(f"{where}: command must be a list of strings")
+    tool_type_for(tool)
+    for key in ("tags", "capabilities"):
+        value = tool.get(key)
+        if value is not None and not (isinstance(value, list) and all(isinstance(v, str) for v in value)):
+            raise ValueError(f"{where}: {key} must be a list of strings")
+    if tool.batch is not None and not isinstance(tool.batch, bool):
+        raise ValueError(f"{where}: batch must be true or false")
+    if tool.parameters is not None and not isinstance(tool.parameters, dict):
+        raise ValueError(f"{where}: parameters must be a JSON schema mapping")
+    if tool.start not in ("eager", "lazy"):
+        raise ValueError(f"{where}: start must be 'eager' or 'lazy', got {tool.start!r}")
+    if tool.idle_timeout is not None and not (isinstance(tool.idle_timeout, (int, float)) and tool.idle_timeout > 0):
+        raise ValueError(f"{where}: idle_timeout must be a positive number of seconds")
+    executor = tool.executor
+    kind = executor if isinstance(executor, str) else (executor or {}).get("type", "inline")
+    if kind not in EXECUTOR_KINDS:
+        raise ValueError(f"{where}: executor type must be one of {', '.join(EXECUTOR_KINDS)}, got {kind!r}")
+    if tool.replicas is not None:
+        if tool.command is None:
+            raise ValueError(f"{where}: replicas needs a 'command'")
+        ReplicaPolicy.from_config(tool.replicas)
+    if tool.max_result_kb is not None and not (isinstance(tool.max_result_kb, (int, float)) and tool.max_result_kb > 0):
+        raise ValueError(f"{where}: max_result_kb must be a positive number")
+    if tool.limits is not None:
+        if not isinstance(tool.limits, dict):
+            raise ValueError(f"{where}: limits must be a mapping")
+        AdmissionController.from_config(tool.name, tool.limits)
+    for client in tool.mcp_clients:
+        missing = [key for key in ("name", "host", "port") if client.get(key) is None]
+        if missing:
+            raise ValueError(f"{where}: MCP client is missing {', '.join(missing)}")
+        if client.protocol not in PROTOCOLS:
+            raise ValueError(f"{where}: client '{client.name}' protocol must be one of {', '.join(PROTOCOLS)}")
+        if client.codec is not None:
+            try:
+                get_codec(client.codec)
+            except (ImportError, ValueError) as e:
+                raise ValueError(f"{where}: client '{client.name}' codec {client.codec!r} is not available: {e}")
+        for key in ("max_payload_kb", "stream_window"):
+            value = client.get(key)
+            if value is not None and not (isinstance(value, (int, float)) and value > 0):
+                raise ValueError(f"{where}: client '{client.name}' {key} must be a positive number")
+
+def resolve_dependencies(cfgs):
+    """{name: set(depends_on)} for `cfgs` ({name: tool config}); rejects unknown names and cycles."""
+    deps = {}
+    for name, cfg in cfgs.items():
+        depends_on = cfg.get("depends_on", [])
+        if isinstance(depends_on, str):
+            depends_on = [depends_on]
+        unknown = [d for d in depends_on if d not in cfgs]
+        if unknown:
+            raise ValueError(f"Tool '{name}' depends on unknown tools: {', '.join(unknown)}")
+        deps[name] = set(depends_on)
+
+    # Kahn's algorithm, only to reject cycles up front
+    remaining = {n: set(d) for n, d in deps.items()}
+    while remaining:
+        free = [n for n, d in remaining.items() if not d]
+        if not free:
+            raise ValueError(f"Dependency cycle between tools: {', '.join(sorted(remaining))}")
+        for n in free:
+            del remaining[n]
+        for d in remaining.values():
+            d.difference_update(free)
+    return deps
+
+def default_cache_dir():
+    return os.environ.get("TOOLFABRIC_CONFIG_CACHE") or os.path.join(
+        os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache"), "toolfabric")
+
+def load_config(path, cache_dir=None, timeline=None):
+    """Read, validate and compile a config file, reusing the parsed form cached for identical contents.
+
+    The cache holds the parsed file as JSON, which is validated again on every load, so it
+    only saves YAML parsing. `cache_dir=None` uses default_cache_dir(); False disables the
+    cache. Returns a FabricConfig.
+    """
+    span = timeline.span if timeline is not None else _no_span
+    with span("read", detail=path):
+        with open(path, "rb") as f:
+            data = f.read()
+    if cache_dir is None:
+        cache_dir = default_cache_dir()
+    cache_path = None
+    if cache_dir:
+        digest = hashlib.sha256(data + _code_version().encode()).hexdigest()
+        cache_path = os.path.join(cache_dir, f"config-v{COMPILED_VERSION}-{digest}.json")
+        with span("cache_load", detail=cache_path) as s:
+            raw = _read_cache(cache_path)
+            s["hit"] = raw is not None
+    else:
+        raw = None
+    cached = raw is not None
+    if not cached:
+        with span("parse"):
+            raw = yaml.load(data, Loader=_YAML_LOADER) or {}
+    with span("compile"):
+        config = compile_config(raw)
+    if cache_path and not cached:
+        with span("cache_store", detail=cache_path):
+            _write_cache(cache_path, raw)
+    return config
+
+_CODE_VERSION = None
+
+def _code_version():
+    """Digest of this package's sources and the Python version, so cache files written by other code are not reused."""
+    global _CODE_VERSION
+    if _CODE_VERSION is None:
+        h = hashlib.sha256(f"{sys.version_info[0]}.{sys.version_info[1]}".encode())
+        root = os.path.dirname(os.path.abspath(__file__))
+        for directory, dirs, files in sorted(os.walk(root)):
+            dirs[:] = sorted(d for d in dirs if d != "__pycache__")
+            for name in sorted(f for f in files if f.endswith(".py")):
+                with open(os.path.join(directory, name), "rb") as f:
+                    h.update(name.encode() + f.read())
+        _CODE_VERSION = h.hexdigest()
+    return _CODE_VERSION
+
+def _safe_cache_dir(directory):
+    """True when `directory` is ours alone: owned by this user and not writable by group or others."""
+    try:
+        st = os.stat(directory)
+    except FileNotFoundError:
+        return True  # Created below with mode 0700
+    except OSError:
+        return False
+    if not stat.S_ISDIR(st.st_mode):
+        return False
+    if hasattr(os, "getuid") and st.st_uid != os.getuid():
+        logger.warning(f"Not using config cache {directory}: owned by another user")
+        return False
+    if st.st_mode & (stat.S_IWGRP | stat.S_IWOTH):
+        logger.warning(f"Not using config cache {directory}: writable by group or others")
+        return False
+    return True
+
+def _read_cache(cache_path):
+    if not _safe_cache_dir(os.path.dirname(cache_path)):
+        return None
+    try:
+        with open(cache_path, "rb") as f:
+            return json.loads(f.read())
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        logger.warning(f"Ignoring unreadable cached config {cache_path}: {e}")
+        return None
+
+def _write_cache(cache_path, raw):
+    directory = os.path.dirname(cache_path)
+    try:
+        data = json.dumps(raw, separators=(",", ":"))
+    except (TypeError, ValueError):
+        return  # YAML values JSON cannot hold (dates, ...): parse the file each time
+    if json.loads(data) != raw:
+        return  # e.g. non-string mapping keys would come back different
+    try:
+        os.makedirs(directory, mode=0o700, exist_ok=True)
+        if not _safe_cache_dir(directory):
+            return
+        # Write-then-rename so concurrent worker startups never read a partial file
+        fd, tmp = tempfile.mkstemp(dir=directory, prefix=".config-", suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            f.write(data)
+        os.replace(tmp, cache_path)
+        _prune_cache(directory)
+    except OSError as e:
+        logger.warning(f"Could not cache parsed config in {directory}: {e}")
+
+def _prune_cache(directory):
+    entries = []
+    for name in os.listdir(directory):
+        if name.startswith("config-") and name.endswith((".json", ".pickle")):
+            path = os.path.join(directory, name)
+            try:
+                entries.append((os.stat(path).st_mtime, path))
+            except OSError:
+                pass
+    entries.sort()
+    for _, path in entries[:-CACHE_MAX_FILES]:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+class _no_span:
+    def __init__(self, *args, **kwargs):
+        self.fields = {}
+
+    def __enter__(self):
+        return self.fields
+
+    def __exit__(self, *exc):
+        return False
@@ -0,0 +1,160 @@
+import importlib
+import multiprocessing
+import os
+import logging
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from threading import Lock
+
+logger = logging.getLogger(__name__)
+
+EXECUTOR_KINDS = ("inline", "thread", "process")
+
+class ExecutorBusyError(RuntimeError):
+    """Raised when a tool already has max_workers + max_queue calls outstanding."""
+
+class ToolExecutor:
+    """Runs an internal tool's calls off the caller's thread with a bounded backlog.
+
+    submit() returns a concurrent.futures.Future. Once `max_workers` calls are running and
+    `max_queue` more are waiting, further submits are rejected with ExecutorBusyError.
+    """
+    kind = None
+
+    def __init__(self, name, max_workers, max_queue=None):
+        self.name = name
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self._pool = None
+        self._outstanding = 0
+        self._futures = set()
+        self._lock = Lock()
+        self.submitted = 0
+        self.rejected = 0
+
+    def start(self):
+        raise NotImplementedError
+
+    def _submit(self, batch, args, kwargs):
+        raise NotImplementedError
+
+    def submit(self, *args, **kwargs):
+        return self._dispatch(False, args, kwargs)
+
+    def submit_batch(self, items):
+        """Run the tool's batch function on `items` as one call."""
+        return self._dispatch(True, (items,), {})
+
+    def _dispatch(self, batch, args, kwargs):
+        with self._lock:
+            if self.max_queue is not None and self._outstanding >= self.max_workers + self.max_queue:
+                self.rejected += 1
+                raise ExecutorBusyError(f"{self.name}: {self._outstanding} calls outstanding, queue full")
+            self._outstanding += 1
+            self.submitted += 1
+        try:
+            future = self._submit(batch, args, kwargs)
+        except Exception:
+            self._done(None)
+            raise
+        with self._lock:
+            self._futures.add(future)
+        future.add_done_callback(self._done)
+        return future
+
+    def _done(self, future):
+        with self._lock:
+            self._outstanding -= 1
+            self._futures.discard(future)
+
+    def shutdown(self, wait=True):
+        pool, self._pool = self._pool, None
+        if pool is None:
+            return
+        with self._lock:
+            futures = list(self._futures)
+        for future in futures:
+            future.cancel()  # Drops queued calls; running ones cannot be cancelled and finish
+        pool.shutdown(wait=wait)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "kind": self.kind,
+                "max_workers": self.max_workers,
+                "max_queue": self.max_queue,
+                "outstanding": self._outstanding,
+                "submitted": self.submitted,
+                "rejected": self.rejected,
+            }
+
+class ThreadExecutor(ToolExecutor):
+    kind = "thread"
+
+    def __init__(self, name, function, max_workers=None, max_queue=None, batch_function=None):
+        super().__init__(name, max_workers or min(32, (os.cpu_count() or 1) + 4), max_queue)
+        self.function = function
+        self.batch_function = batch_function
+
+    def start(self):
+        self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix=f"tool-{self.name}")
+
+    def _submit(self, batch, args, kwargs):
+        return self._pool.submit(self.batch_function if batch else self.function, *args, **kwargs)
+
+class ProcessExecutor(ToolExecutor):
+    """Process pool whose workers import `module.function` (and `batch_function`) once at startup.
+
+    Arguments and results must be picklable. Workers are started with `start_method`
+    (default "spawn": the parent runs health/IO threads, which fork does not copy safely).
+    """
+    kind = "process"
+
+    def __init__(self, name, module, function, max_workers=None, max_queue=None, start_method="spawn",
+                 batch_function=None):
+        super().__init__(name, max_workers or os.cpu_count() or 1, max_queue)
+        self.module = module
+        self.function = function
+        self.batch_function = batch_function
+        self.start_method = start_method
+
+    def start(self):
+        self._pool = ProcessPoolExecutor(
+            max_workers=self.max_workers,
+            mp_context=multiprocessing.get_context(self.start_method),
+            initializer=_init_worker,
+            initargs=(self.module, self.function, self.batch_function),
+        )
+        # Run a trivial task per worker so start() waits for the pool to come up and a broken
+        # import fails here; the pool may still spawn fewer processes than max_workers
+        pids = {f.result() for f in [self._pool.submit(os.getpid) for _ in range(self.max_workers)]}
+        logger.info(f"[ProcessExecutor:{self.name}] Started {len(pids)} worker process(es)")
+
+    def _submit(self, batch, args, kwargs):
+        return self._pool.submit(_call_worker, batch, args, kwargs)
+
+# Worker-process side: the tool functions, imported once by the pool initializer
+_worker_functions = (None, None)
+
+def _init_worker(module, function, batch_function=None):
+    global _worker_functions
+    mod = importlib.import_module(module)
+    _worker_functions = (getattr(mod, function), getattr(mod, batch_function) if batch_function else None)
+
+def _call_worker(batch, args, kwargs):
+    function, batch_function = _worker_functions
+    return (batch_function if batch else function)(*args, **kwargs)
+
+def create_executor(name, config, function, batch_function=None):
+    """Build the executor for an internal tool's `executor:` setting; None means inline."""
+    cfg = config.get("executor", "inline")
+    if isinstance(cfg, str):
+        cfg = {"type": cfg}
+    kind = cfg.get("type", "inline")
+    if kind not in EXECUTOR_KINDS:
+        raise ValueError(f"Tool {name}: executor type must be one of {', '.join(EXECUTOR_KINDS)}, got {kind!r}")
+    if kind == "inline":
+        return None
+    if kind == "thread":
+        return ThreadExecutor(name, function, cfg.get("max_workers"), cfg.get("max_queue"), batch_function)
+    return ProcessExecutor(name, config["module"], config["function"], cfg.get("max_workers"),
+                           cfg.get("max_queue"), cfg.get("start_method", "spawn"), config.get("batch_function"))
@@ -0,0 +1,204 @@
+import heapq
+import itertools
+import random
+import threading
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from .metrics import HEALTH_PROBES, HEALTH_PROBE_LATENCY
+from . import tracing
+
+logger = logging.getLogger(__name__)
+
+class HealthJob:
+    """A periodic probe. run() returns the delay until the next run, or None to stop."""
+    def __init__(self, name, interval):
+        self.name = name
+        self.interval = interval
+        self.cancelled = False
+
+    def run(self):
+        raise NotImplementedError
+
+class CallableJob(HealthJob):
+    def __init__(self, name, interval, func):
+        super().__init__(name, interval)
+        self.func = func
+
+    def run(self):
+        started = time.monotonic()
+        try:
+            self.func()
+            HEALTH_PROBES.labels(self.name, "ok").inc()
+        except Exception as e:
+            HEALTH_PROBES.labels(self.name, "failed").inc()
+            logger.error(f"[HealthScheduler:{self.name}] Internal health failed: {e}")
+        HEALTH_PROBE_LATENCY.labels(self.name).observe(time.monotonic() - started)
+        return self.interval
+
+class IdleJob(HealthJob):
+    """Stops a tool that has had no calls for its `idle_timeout`."""
+    def __init__(self, tool, idle_timeout):
+        super().__init__(f"{tool.name}:idle", idle_timeout)
+        self.tool = tool
+
+    def run(self):
+        if self.cancelled:
+            return None
+        return self.tool._stop_if_idle()
+
+class ClientHealthJob(HealthJob):
+    """Pings an MCP client, reconnecting with capped exponential backoff when it is down.
+
+    Clients that completed a request within the last interval are considered healthy
+    and are not pinged.
+    """
+    def __init__(self, client, interval, check_type="ping", backoff_base=1, backoff_max=60, skip_if_active=True):
+        super().__init__(client.name, interval)
+        self.client = client
+        self.check_type = check_type
+        self.backoff_base = min(backoff_base, interval)
+        self.backoff_max = backoff_max
+        self.skip_if_active = skip_if_active
+        self.failures = 0
+
+    def run(self):
+        client = self.client
+        if self.cancelled:
+            return None  # Client was disconnected on purpose; do not revive it
+        if not client.connected:
+            logger.warning(f"[MCPClient:{client.name}] Health check failed, reconnecting...")
+            with tracing.span("health.reconnect", client=client.name, attempt=self.failures + 1):
+                client.connect()
+            if not client.connected:
+                HEALTH_PROBES.labels(client.name, "reconnect_failed").inc()
+                self.failures += 1
+                return min(self.backoff_max, self.backoff_base * 2 ** (self.failures - 1))
+            HEALTH_PROBES.labels(client.name, "reconnected").inc()
+            self.failures = 0
+            return self.interval
+
+        if self.check_type != "ping":
+            return self.interval
+        if self.skip_if_active and time.monotonic() - client.last_activity < self.interval:
+            HEALTH_PROBES.labels(client.name, "skipped").inc()
+            return self.interval  # Real traffic already proved the connection
+        started = time.monotonic()
+        try:
+            pong = client.handler.ping()
+        except Exception as e:
+            logger.warning(f"[MCPClient:{client.name}] Ping error: {e}")
+            pong = False
+        HEALTH_PROBE_LATENCY.labels(client.name).observe(time.monotonic() - started)
+        HEALTH_PROBES.labels(client.name, "ok" if pong else "failed").inc()
+        if pong:
+            client.last_activity = time.monotonic()
+            return self.interval
+        logger.warning(f"[MCPClient:{client.name}] Ping failed, reconnecting...")
+        client.connected = False
+        return 0
+
+class HealthScheduler:
+    """Runs every health probe of a fabric from one timer heap on a small worker pool.
+
+    A job is never run concurrently with itself: it is pushed back on the heap only after
+    its run completes. Delays get +/- `jitter` (a fraction) so probes spread out.
+    """
+    def __init__(self, workers=4, jitter=0.1):
+        self.workers = workers
+        self.jitter = jitter
+        self._heap = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._thread = None
+        self._pool = None
+        self._stopped = False
+
+    def schedule(self, job, delay=None):
+        """Add a job; by default its first run lands at a random point within one interval."""
+        job.cancelled = False
+        if delay is None:
+            delay = random.uniform(0, job.interval)
+        with self._cond:
+            self._ensure_started()
+            self._push(job, delay)
+
+    def cancel(self, job):
+        # Lazy deletion: the timer thread drops cancelled jobs when they come due
+        job.cancelled = True
+
+    def pending(self):
+        with self._cond:
+            return sum(1 for _, _, job in self._heap if not job.cancelled)
+
+    def shutdown(self):
+        with self._cond:
+            self._stopped = True
+            self._heap.clear()
+            self._cond.notify_all()
+            thread, pool = self._thread, self._pool
+            self._thread = self._pool = None
+        if thread is not None:
+            thread.join(timeout=2)
+        if pool is not None:
+            pool.shutdown(wait=False)
+
+    def _ensure_started(self):
+        if self._thread is None:
+            self._stopped = False
+            self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="health-probe")
+            self._thread = threading.Thread(target=self._loop, name="health-scheduler", daemon=True)
+            self._thread.start()
+
+    def _push(self, job, delay):
+        heapq.heappush(self._heap, (time.monotonic() + delay, next(self._seq), job))
+        self._cond.notify()
+
+    def _jittered(self, delay):
+        if delay <= 0 or not self.jitter:
+            return max(delay, 0)
+        return delay * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+    def _loop(self):
+        while True:
+            with self._cond:
+                while not self._stopped:
+                    if self._heap:
+                        wait = self._heap[0][0] - time.monotonic()
+                        if wait <= 0:
+                            break
+                    else:
+                        wait = None
+                    self._cond.wait(wait)
+                if self._stopped:
+                    return
+                _, _, job = heapq.heappop(self._heap)
+                pool = self._pool
+            if not job.cancelled:
+                try:
+                    pool.submit(self._run_job, job)
+                except RuntimeError:
+                    return  # Pool shut down underneath us
+
+    def _run_job(self, job):
+        try:
+            delay = job.run()
+        except Exception as e:
+            logger.error(f"[HealthScheduler:{job.name}] Health error: {e}")
+            delay = job.interval
+        if delay is None or job.cancelled:
+            return
+        with self._cond:
+            if not self._stopped:
+                self._push(job, self._jittered(delay))
+
+_default_scheduler = None
+_default_lock = threading.Lock()
+
+def get_default_scheduler():
+    """Process-wide scheduler for tools created outside a ToolFabric."""
+    global _default_scheduler
+    with _default_lock:
+        if _default_scheduler is None:
+            _default_scheduler = HealthScheduler()
+        return _default_scheduler
@@ -1,83 +1,836 @@
+import re
 import time
 import threading
-import json
+import itertools
 import logging
+import socket
+import uuid
+import http.client
 from abc import ABC, abstractmethod
-from threading import Event, Lock
+from concurrent.futures import Future, InvalidStateError, TimeoutError as FutureTimeoutError
+from threading import Event, Lock, RLock
+from .codec import DEFAULT_MAX_PAYLOAD_KB, PayloadTooLarge, check_size, get_codec, kb_limit
+from .health import ClientHealthJob, get_default_scheduler
+from .metrics import MCP_CONNECTED, MCP_CONNECT_LATENCY, MCP_CONNECTS, MCP_LATENCY, MCP_REQUESTS, MCP_STATE_CHANGES
+from .resilience import AdaptiveTimeout, CircuitBreaker, CircuitOpenError, LatencyTracker, OPEN
+from .streaming import CHUNK_METHOD, CREDIT_METHOD, STREAM_META, ChunkStream, StreamCancelled
+from . import tracing
 
 logger = logging.getLogger(__name__)
 
+MCP_PROTOCOL_VERSION = "2024-11-05"
+
+# Where to look for the request a too-large message belongs to: its start, before the payload
+_HEAD_BYTES = 256
+_JSONRPC_ID = re.compile(rb'"(id|progressToken)"\s*:\s*(\d+)')
+_CORRELATION_ID = re.compile(rb'"id"\s*:\s*"([0-9a-f]+)"')
+
+class MCPError(Exception):
+    """JSON-RPC error response returned by an MCP server. `response` is the reply as received."""
+    def __init__(self, code, message, data=None, response=None):
+        super().__init__(f"MCP error {code}: {message}")
+        self.code = code
+        self.data = data
+        self.response = response
+
+def server_answered(error):
+    """True when the server got the request and replied with an error; it may have acted on it,
+    so the request must not be sent again to another client."""
+    return isinstance(error, MCPError) or (isinstance(error, PayloadTooLarge) and error.what != "request")
+
+def error_result(error):
+    """What a call returns for a server error: the server's reply as received where there is one."""
+    if isinstance(error, MCPError) and error.response is not None:
+        return error.response
+    return {"error": {"code": getattr(error, "code", None), "message": str(error)}}
+
+def to_jsonrpc(payload):
+    """Map a ToolFabric payload onto a JSON-RPC (method, params) pair.
+
+    A `_meta` entry (trace context) is carried over as `params._meta`, as MCP allows.
+    """
+    meta = payload.get("_meta")
+    if "method" in payload:
+        method, params = payload["method"], payload.get("params")
+    elif payload.get("type") == "ping":
+        return "ping", None
+    elif "action" in payload:
+        method, params = "tools/call", {"name": payload["action"], "arguments": payload.get("payload") or {}}
+    else:
+        return "toolfabric/message", payload
+    if meta:
+        params = dict(params or {}, _meta=meta)
+    return method, params
+
+def wait_result(future, timeout=None):
+    """Wait on a transport future; on timeout the request is cancelled and TimeoutError raised."""
+    try:
+        return future.result(timeout=timeout)
+    except FutureTimeoutError:
+        expire(future)
+        raise TimeoutError(f"MCP request timed out after {timeout}s")
+
+def expire(future):
+    """Cancel a request that ran out of time; its client counts it as a timeout, not an abandon."""
+    future.timed_out = True
+    future.cancel()
+
 class ProtocolHandler(ABC):
     @abstractmethod
     def connect(self, host, port):
         pass
 
     @abstractmethod
-    def send(self, payload):
+    def send(self, payload, timeout=None):
         pass
 
     @abstractmethod
     def ping(self):
         pass
 
+    def submit(self, payload):
+        # Handlers without native multiplexing complete the future inline
+        future = Future()
+        try:
+            future.set_result(self.send(payload))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+    def submit_many(self, payloads):
+        # Handlers without a batch wire format submit one request per payload
+        return [self.submit(payload) for payload in payloads]
+
+    def open_stream(self, payload, stream):
+        # Handlers without chunk framing deliver the whole result as the stream's only chunk
+        future = self.submit(payload)
+        stream.follow(future)
+        return future
+
+    def notify(self, payload):
+        self.send(payload)
+
+    def close(self):
+        pass
+
+class StdioChannel:
+    """Multiplexed JSON-RPC over a subprocess's stdin/stdout pipes.
+
+    Requests are tagged with an id and written as newline-delimited JSON; a single reader
+    thread resolves the matching future when the response arrives, so any number of
+    callers can have requests in flight on the same process. Non-JSON lines (server logs
+    printed to stdout) go to `on_output(line)` when given.
+
+    Messages are encoded with `codec` and may be at most `max_payload` bytes either way; an
+    oversized response fails its request without being buffered whole. Streamed requests
+    receive their chunks as `notifications/toolfabric/chunk` for their progress token.
+    """
+    def __init__(self, process, name="stdio", on_output=None, codec=None, max_payload=None):
+        self.process = process
+        self.name = name
+        self.on_output = on_output
+        self.codec = codec or get_codec()
+        self.max_payload = max_payload
+        self._ids = itertools.count(1)
+        self._pending = {}
+        self._streams = {}
+        self._pending_lock = Lock()
+        self._write_lock = Lock()
+        self._init_lock = Lock()
+        self._initialized = False
+        self._closed = False
+        self._reader = None
+
+    @property
+    def alive(self):
+        return (not self._closed and self._reader is not None and self._reader.is_alive()
+                and self.process.poll() is None)
+
+    def start(self):
+        if self._reader is None:
+            self._reader = threading.Thread(target=self._read_loop, name=f"mcp-stdio-{self.name}", daemon=True)
+            self._reader.start()
+
+    def initialize(self, timeout=10):
+        with self._init_lock:
+            if self._initialized:
+                return
+            wait_result(self.request("initialize", {
+                "protocolVersion": MCP_PROTOCOL_VERSION,
+                "capabilities": {},
+                "clientInfo": {"name": "toolfabric", "version": "1.0"},
+            }), timeout)
+            self.notify("notifications/initialized")
+            self._initialized = True
+
+    def request(self, method, params=None):
+        with tracing.span("stdio.request", channel=self.name, method=method):
+            return self._request(method, params)
+
+    def request_stream(self, method, params, stream):
+        """Start a request whose result the server may send in chunks to `stream` (a ChunkStream)."""
+        with tracing.span("stdio.request", channel=self.name, method=method, stream=True):
+            return self._request(method, params, stream)
+
+    def _request(self, method, params, stream=None):
+        req_id = next(self._ids)
+        future = Future()
+        future.request_id = req_id
+        if stream is not None:
+            # The request id doubles as the progress token chunks and credits refer to
+            meta = dict((params or {}).get("_meta") or {}, progressToken=req_id)
+            meta[STREAM_META] = {"window": stream.window}
+            params = dict(params or {}, _meta=meta)
+            stream.bind(grant=lambda n: self.notify(CREDIT_METHOD, {"progressToken": req_id, "credit": n}),
+                        cancel=future.cancel)
+            stream.follow(future)
+        with self._pending_lock:
+            if self._closed:
+                raise ConnectionError(f"Stdio channel {self.name} is closed")
+            self._pending[req_id] = future
+            if stream is not None:
+                self._streams[req_id] = stream
+        future.add_done_callback(self._on_done)
+        message = {"jsonrpc": "2.0", "id": req_id, "method": method}
+        if params is not None:
+            message["params"] = params
+        try:
+            self._write(message)
+        except Exception as e:
+            with self._pending_lock:
+                self._pending.pop(req_id, None)
+                self._streams.pop(req_id, None)
+            if stream is not None:
+                stream.fail(e)
+            raise
+        return future
+
+    def request_many(self, calls):
+        """Send (method, params) calls as one JSON-RPC batch array; returns their futures in order."""
+        futures, messages = [], []
+        with self._pending_lock:
+            if self._closed:
+                raise ConnectionError(f"Stdio channel {self.name} is closed")
+            for method, params in calls:
+                req_id = next(self._ids)
+                future = Future()
+                future.request_id = req_id
+                self._pending[req_id] = future
+                message = {"jsonrpc": "2.0", "id": req_id, "method": method}
+                if params is not None:
+                    message["params"] = params
+                futures.append(future)
+                messages.append(message)
+        for future in futures:
+            future.add_done_callback(self._on_done)
+        try:
+            self._write(messages)
+        except Exception:
+            with self._pending_lock:
+                for future in futures:
+                    self._pending.pop(future.request_id, None)
+            raise
+        return futures
+
+    def notify(self, method, params=None):
+        message = {"jsonrpc": "2.0", "method": method}
+        if params is not None:
+            message["params"] = params
+        self._write(message)
+
+    def close(self):
+        with self._pending_lock:
+            self._closed = True
+        try:
+            if self.process.stdin:
+                self.process.stdin.close()
+        except Exception:
+            pass
+        self._fail_pending(ConnectionError(f"Stdio channel {self.name} closed"))
+
+    def _write(self, message):
+        data = self.codec.dumps(message) + b"\n"
+        check_size("request", len(data) - 1, self.max_payload)
+        if tracing.active():
+            # Writers serialize on the pipe; show contention as its own span
+            started, t0 = time.time(), time.perf_counter()
+            self._write_lock.acquire()
+            tracing.record("stdio.lock_wait", started, time.perf_counter() - t0, channel=self.name)
+        else:
+            self._write_lock.acquire()
+        try:
+            self.process.stdin.write(data)
+            self.process.stdin.flush()
+        finally:
+            self._write_lock.release()
+
+    def _on_done(self, future):
+        if self._streams:
+            with self._pending_lock:
+                self._streams.pop(future.request_id, None)
+        if not future.cancelled():
+            return
+        with self._pending_lock:
+            self._pending.pop(future.request_id, None)
+        self._notify_cancelled(future.request_id, "cancelled by client")
+
+    def _read_loop(self):
+        stdout = self.process.stdout
+        limit = self.max_payload + 1 if self.max_payload else -1
+        try:
+            while True:
+                raw = stdout.readline(limit)
+                if not raw:
+                    break
+                if len(raw) == limit and not raw.endswith(b"\n"):
+                    self._skip_oversized(raw, stdout)
+                    continue
+                if raw.isspace():
+                    continue
+                try:
+                    # Decoded straight from the line's bytes: no stripped or str copy of big results
+                    message = self.codec.loads(raw)
+                except ValueError:
+                    line = raw.strip()
+                    if self.on_output is not None:
+                        self.on_output(line)
+                    else:
+                        logger.debug(f"[StdioChannel:{self.name}] non-JSON output: {line[:200]!r}")
+                    continue
+                for item in (message if isinstance(message, list) else [message]):
+                    self._dispatch(item)
+        except Exception as e:
+            logger.error(f"[StdioChannel:{self.name}] Reader error: {e}")
+        finally:
+            with self._pending_lock:
+                self._closed = True
+            self._fail_pending(ConnectionError(f"Stdio channel {self.name} reached EOF"))
+
+    def _skip_oversized(self, head, stdout):
+        """Discard the rest of a line over max_payload and fail the request it answers, if known."""
+        size = len(head)
+        while True:
+            rest = stdout.readline(1 << 16)
+            size += len(rest)
+            if not rest or rest.endswith(b"\n"):
+                break
+        error = PayloadTooLarge("response", size, self.max_payload)
+        logger.error(f"[StdioChannel:{self.name}] Dropped message: {error}")
+        match = _JSONRPC_ID.search(head, 0, _HEAD_BYTES)
+        if match is None:
+            return
+        req_id = int(match.group(2))
+        with self._pending_lock:
+            future = self._pending.pop(req_id, None)
+            stream = self._streams.pop(req_id, None)
+        if stream is not None:
+            stream.fail(error)
+        if future is not None:
+            try:
+                future.set_exception(error)
+            except InvalidStateError:
+                pass
+            if stream is not None:
+                self._notify_cancelled(req_id, "response too large")
+
+    def _notify_cancelled(self, req_id, reason):
+        try:
+            self.notify("notifications/cancelled", {"requestId": req_id, "reason": reason})
+        except Exception:
+            pass
+
+    def _dispatch(self, message):
+        if not isinstance(message, dict):
+            return
+        if "id" in message and ("result" in message or "error" in message):
+            with self._pending_lock:
+                future = self._pending.pop(message["id"], None)
+            if future is None:
+                return  # Cancelled or timed out already
+            try:
+                if "error" in message:
+                    err = message["error"] or {}
+                    future.set_exception(MCPError(err.get("code"), err.get("message"), err.get("data"),
+                                                  response={"error": message["error"]}))
+                else:
+                    future.set_result(message["result"])
+            except InvalidStateError:
+                pass
+        elif message.get("method") and "id" in message:
+            # Server-initiated request: answer pings, reject everything else
+            if message["method"] == "ping":
+                reply = {"jsonrpc": "2.0", "id": message["id"], "result": {}}
+            else:
+                reply = {"jsonrpc": "2.0", "id": message["id"],
+                         "error": {"code": -32601, "message": f"Method not found: {message['method']}"}}
+            try:
+                self._write(reply)
+            except Exception as e:
+                logger.debug(f"[StdioChannel:{self.name}] Could not reply to server request: {e}")
+        elif message.get("method") == CHUNK_METHOD:
+            params = message.get("params") or {}
+            stream = self._streams.get(params.get("progressToken"))
+            if stream is not None:
+                stream.feed(params.get("seq"), params.get("data"))
+        else:
+            logger.debug(f"[StdioChannel:{self.name}] Notification: {message.get('method')}")
+
+    def _fail_pending(self, error):
+        with self._pending_lock:
+            pending, self._pending = self._pending, {}
+        for future in pending.values():
+            try:
+                future.set_exception(error)
+            except InvalidStateError:
+                pass
+
 class StdioHandler(ProtocolHandler):
-    def __init__(self):
-        self.proc = None  # Placeholder for actual subprocess
+    def __init__(self, channel=None, options=None):
+        self.channel = channel
+        self.options = options or {}
 
     def connect(self, host, port):
-        # Stub: In real impl, launch or connect to stdio process
+        if self.channel is None:
+            logger.error("Stdio handler has no process channel to connect to")
+            return False
+        self.channel.start()
+        if self.options.get("initialize", True):
+            self.channel.initialize(timeout=self.options.get("connect_timeout", 10))
         logger.info("Stdio connected")
-        return True
+        return self.channel.alive
 
-    def send(self, payload):
-        # Stub: Write to stdin
+    def submit(self, payload):
+        method, params = to_jsonrpc(payload)
+        return self.channel.request(method, params)
+
+    def submit_many(self, payloads):
+        return self.channel.request_many([to_jsonrpc(payload) for payload in payloads])
+
+    def open_stream(self, payload, stream):
+        method, params = to_jsonrpc(payload)
+        return self.channel.request_stream(method, params, stream)
+
+    def send(self, payload, timeout=None):
         logger.debug(f"Stdio send: {payload}")
-        return {"status": "sent"}
+        return wait_result(self.submit(payload), timeout)
+
+    def notify(self, payload):
+        method, params = to_jsonrpc(payload)
+        self.channel.notify(method, params)
 
     def ping(self):
-        # Stub: Send ping, assume success
-        response = self.send({"type": "ping"})
-        return response.get("pong", False)  # Simulate check
+        self.send({"type": "ping"}, timeout=self.options.get("ping_timeout", 5))
+        return True
+
+class HTTPConnectionPool:
+    """Bounded pool of keep-alive HTTP connections to one host.
+
+    Response bodies over `max_response` bytes are refused without being read whole.
+    """
+    def __init__(self, host, port, size=4, max_idle=60, timeout=30, max_response=None):
+        self.host = host
+        self.port = port
+        self.size = size
+        self.max_idle = max_idle
+        self.timeout = timeout
+        self.max_response = max_response
+        self._idle = []  # (conn, released_at), most recently used last
+        self._created = 0
+        self._closed = False
+        self._cond = threading.Condition()
+
+    def acquire(self):
+        """Return (conn, reused). Blocks up to `timeout` when all connections are busy."""
+        deadline = time.monotonic() + self.timeout
+        waited_since = None
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise ConnectionError(f"Connection pool for {self.host}:{self.port} is closed")
+                now = time.monotonic()
+                while self._idle:
+                    conn, released_at = self._idle.pop()
+                    if now - released_at <= self.max_idle:
+                        if waited_since is not None:
+                            self._record_wait(waited_since)
+                        return conn, True
+                    conn.close()
+                    self._created -= 1
+                if self._created < self.size:
+                    self._created += 1
+                    break
+                remaining = deadline - now
+                if remaining <= 0:
+                    raise TimeoutError(f"No free connection to {self.host}:{self.port} within {self.timeout}s")
+                if waited_since is None:
+                    waited_since = (time.time(), time.perf_counter())
+                self._cond.wait(remaining)
+        if waited_since is not None:
+            self._record_wait(waited_since)
+        return http.client.HTTPConnection(self.host, self.port, timeout=self.timeout), False
+
+    def _record_wait(self, waited_since):
+        # Time spent blocked on a full pool, as a span of the request that waited
+        started, t0 = waited_since
+        tracing.record("http.pool_wait", started, time.perf_counter() - t0, host=f"{self.host}:{self.port}")
+
+    def release(self, conn, reusable=True):
+        with self._cond:
+            if reusable and not self._closed:
+                self._idle.append((conn, time.monotonic()))
+            else:
+                conn.close()
+                self._created -= 1
+            self._cond.notify()
+
+    def request(self, method, path, body=None, headers=None):
+        """Send a request on a pooled connection; returns (status, body bytes)."""
+        for attempt in range(2):
+            conn, reused = self.acquire()
+            try:
+                conn.request(method, path, body=body, headers=headers or {})
+                response = conn.getresponse()
+                data = self._read_body(response)
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                self.release(conn, reusable=False)
+                if reused and attempt == 0:
+                    continue  # Server closed an idle keep-alive connection; retry on a fresh one
+                raise
+            except Exception:
+                self.release(conn, reusable=False)
+                raise
+            self.release(conn, reusable=not response.will_close)
+            return response.status, data
+
+    def _read_body(self, response):
+        limit = self.max_response
+        if not limit:
+            return response.read()
+        check_size("response", response.length or 0, limit)
+        data = response.read(limit + 1)  # Chunked bodies have no length up front
+        check_size("response", len(data), limit)
+        return data
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._cond.notify_all()
+        for conn, _ in idle:
+            conn.close()
 
 class SSEHandler(ProtocolHandler):
+    """HTTP POST for requests, one long-lived SSE stream per client for responses.
+
+    POSTs go through a keep-alive connection pool. Every request carries a correlation
+    `id`; responses arriving on `/mcp/sse/{client_id}` (or inline in the POST reply) are
+    matched back to the waiting caller by that id.
+
+    A streamed request carries `stream: {window}`; the server then sends
+    `{"type": "chunk", "id", "seq", "data"}` events before the final response, and the client
+    POSTs `{"type": "credit", "id", "credit"}` as it consumes them.
+    """
+    def __init__(self, client_id, options=None, token=None):
+        self.client_id = client_id
+        self.options = options or {}
+        self.token = token
+        self.action_path = self.options.get("action_path", "/mcp/action")
+        self.sse_path = self.options.get("sse_path", "/mcp/sse/{client_id}").format(client_id=client_id)
+        self.codec = get_codec(self.options.get("codec"))
+        self.max_payload = kb_limit(self.options, "max_payload_kb", DEFAULT_MAX_PAYLOAD_KB)
+        self.pool = None
+        self._pending = {}
+        self._streams = {}
+        self._pending_lock = Lock()
+        self._stream_sock = None
+        self._stream_thread = None
+        self._stream_ready = Event()
+        self._closed = Event()
+
     def connect(self, host, port):
-        # Stub: In real impl, use requests or websockets for SSE
+        self.close()
+        self._closed = Event()  # Fresh per connection so a stale stream thread stays stopped
+        self.pool = HTTPConnectionPool(
+            host, port,
+            size=self.options.get("pool_size", 4),
+            max_idle=self.options.get("max_idle", 60),
+            timeout=self.options.get("timeout", 30),
+            max_response=self.max_payload,
+        )
+        self._stream_ready.clear()
+        self._stream_thread = threading.Thread(target=self._stream_loop, args=(host, port, self._closed),
+                                               name=f"mcp-sse-{self.client_id}", daemon=True)
+        self._stream_thread.start()
+        if not self._stream_ready.wait(self.options.get("connect_timeout", 10)):
+            logger.error(f"SSE stream to {host}:{port}{self.sse_path} not established")
+            self.close()
+            return False
         logger.info(f"SSE connected to {host}:{port}")
         return True
 
-    def send(self, payload):
-        # Stub: POST or SSE event
+    def open_request(self, payload):
+        """Register a pending request; returns (future, body to POST)."""
+        corr_id = uuid.uuid4().hex
+        future = Future()
+        future.request_id = corr_id
+        with self._pending_lock:
+            self._pending[corr_id] = future
+        future.add_done_callback(self._on_done)
+        return future, dict(payload, id=corr_id, client_id=self.client_id)
+
+    def handle_reply(self, reply):
+        # Servers may answer inline as well as on the stream; first answer wins
+        if not isinstance(reply, dict):
+            return
+        for inline in reply.get("responses") or [reply.get("response")]:
+            if isinstance(inline, dict) and inline.get("id") is not None:
+                self._resolve(inline["id"], inline)
+
+    def submit(self, payload):
+        future, body = self.open_request(payload)
+        try:
+            reply = self._post(body)
+        except Exception as e:
+            self._resolve(future.request_id, error=e)
+            return future
+        self.handle_reply(reply)
+        return future
+
+    def submit_many(self, payloads):
+        """POST all payloads as one JSON array; responses are matched per item by correlation id."""
+        requests = [self.open_request(payload) for payload in payloads]
+        futures = [future for future, _ in requests]
+        try:
+            reply = self._post([body for _, body in requests])
+        except Exception as e:
+            for future in futures:
+                self._resolve(future.request_id, error=e)
+            return futures
+        self.handle_reply(reply)
+        return futures
+
+    def open_stream(self, payload, stream):
+        future, body = self.open_stream_request(payload, stream)
+        try:
+            reply = self._post(body)
+        except Exception as e:
+            self._resolve(future.request_id, error=e)
+            return future
+        self.handle_reply(reply)
+        return future
+
+    def open_stream_request(self, payload, stream):
+        """Register a streamed request; returns (future, body to POST)."""
+        future, body = self.open_request(payload)
+        corr_id = future.request_id
+        body["stream"] = {"window": stream.window}
+        with self._pending_lock:
+            self._streams[corr_id] = stream
+        stream.bind(grant=lambda n: self.notify({"type": "credit", "id": corr_id, "credit": n}),
+                    cancel=lambda: self._cancel_stream(future))
+        stream.follow(future)
+        return future, body
+
+    def _cancel_stream(self, future):
+        future.cancel()
+        self._notify_cancel(future.request_id)
+
+    def _notify_cancel(self, corr_id):
+        try:
+            self.notify({"type": "cancel", "id": corr_id})
+        except Exception as e:
+            logger.debug(f"[SSEHandler:{self.client_id}] Could not cancel stream {corr_id}: {e}")
+
+    def send(self, payload, timeout=None):
         logger.debug(f"SSE send: {payload}")
-        return {"status": "sent"}
+        return wait_result(self.submit(payload), timeout)
+
+    def notify(self, payload):
+        self._post(dict(payload, client_id=self.client_id))
 
     def ping(self):
-        # Stub: Send ping via SSE
-        response = self.send({"type": "ping"})
-        return response.get("pong", False)
+        self.send({"type": "ping", "action": "ping"}, timeout=self.options.get("ping_timeout", 5))
+        return self._stream_thread is not None and self._stream_thread.is_alive()
+
+    def close(self):
+        self._closed.set()
+        sock = self._stream_sock
+        if sock is not None:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        if self.pool is not None:
+            self.pool.close()
+        with self._pending_lock:
+            pending, self._pending = self._pending, {}
+        for future in pending.values():
+            try:
+                future.set_exception(ConnectionError(f"SSE client {self.client_id} closed"))
+            except InvalidStateError:
+                pass
+
+    def headers(self):
+        headers = {"Content-Type": "application/json", "Connection": "keep-alive"}
+        if self.token:
+            headers["Authorization"] = f"Bearer {self.token}"
+        return headers
+
+    def _post(self, body):
+        with tracing.span("sse.post", client=self.client_id, items=len(body) if isinstance(body, list) else 1):
+            status, data = self.pool.request("POST", self.action_path, self.encode(body), self.headers())
+            return self.decode_reply(status, data)
+
+    def encode(self, body):
+        data = self.codec.dumps(body)
+        check_size("request", len(data), self.max_payload)
+        return data
+
+    def decode_reply(self, status, data):
+        if status >= 400:
+            raise ConnectionError(f"POST {self.action_path} returned HTTP {status}")
+        try:
+            return self.codec.loads(data) if data else {}
+        except ValueError:
+            return {}
+
+    def _on_done(self, future):
+        if self._streams:
+            with self._pending_lock:
+                self._streams.pop(future.request_id, None)
+        if future.cancelled():
+            with self._pending_lock:
+                self._pending.pop(future.request_id, None)
+
+    def _resolve(self, corr_id, result=None, error=None):
+        with self._pending_lock:
+            future = self._pending.pop(corr_id, None)
+        if future is None:
+            return
+        try:
+            if error is not None:
+                future.set_exception(error)
+            elif result.get("status") == "error":
+                future.set_exception(MCPError(result.get("code"), result.get("message") or result.get("result"),
+                                              response=result))
+            else:
+                future.set_result(result)
+        except InvalidStateError:
+            pass
+
+    def _stream_loop(self, host, port, closed):
+        while not closed.is_set():
+            conn = http.client.HTTPConnection(host, port, timeout=self.options.get("connect_timeout", 10))
+            try:
+                headers = self.headers()
+                headers["Accept"] = "text/event-stream"
+                conn.request("GET", self.sse_path, headers=headers)
+                sock = self._stream_sock = conn.sock  # getresponse() may detach it from conn
+                response = conn.getresponse()
+                if response.status != 200:
+                    raise ConnectionError(f"SSE stream returned HTTP {response.status}")
+                sock.settimeout(None)  # Stream stays open; close() unblocks the read
+                self._stream_ready.set()
+                self._read_events(response)
+            except Exception as e:
+                if not closed.is_set():
+                    logger.warning(f"[SSEHandler:{self.client_id}] Stream error: {e}")
+            finally:
+                conn.close()
+                self._stream_sock = None
+            closed.wait(self.options.get("reconnect_delay", 1))
+
+    def _read_events(self, response):
+        limit = self.max_payload + 1 if self.max_payload else -1
+        data_lines, size, oversized = [], 0, None
+        while True:
+            raw = response.readline(limit)
+            if not raw:
+                break
+            if raw not in (b"\n", b"\r\n"):
+                if raw.startswith(b"data:"):
+                    # Kept as bytes, newline included (JSON ignores it): one copy of a big event, not four
+                    size += len(raw)
+                    if oversized is None and (size >= limit > 0):
+                        oversized = raw[:_HEAD_BYTES]
+                    if oversized is None:
+                        data_lines.append(raw[5:])
+                continue
+            if oversized is not None:
+                self._drop_oversized(oversized, size)
+            elif data_lines:
+                data = data_lines[0] if len(data_lines) == 1 else b"".join(data_lines)
+                try:
+                    event = self.codec.loads(data)
+                except ValueError:
+                    event = None
+                if isinstance(event, dict) and event.get("id") is not None:
+                    if event.get("type") == "chunk":
+                        stream = self._streams.get(event["id"])
+                        if stream is not None:
+                            stream.feed(event.get("seq"), event.get("data"))
+                    else:
+                        self._resolve(event["id"], event)
+            data_lines, size, oversized = [], 0, None
+
+    def _drop_oversized(self, head, size):
+        error = PayloadTooLarge("event", size, self.max_payload)
+        logger.error(f"[SSEHandler:{self.client_id}] Dropped event: {error}")
+        match = _CORRELATION_ID.search(head)
+        if match is not None:
+            corr_id = match.group(1).decode("ascii")
+            stream = self._streams.get(corr_id)
+            if stream is not None:
+                stream.fail(error)
+                self._notify_cancel(corr_id)
+            self._resolve(corr_id, error=error)
 
 class MCPClient:
-    def __init__(self, name, host, port, protocol="stdio", token=None):
+    def __init__(self, name, host, port, protocol="stdio", token=None, channel=None, options=None):
         self.name = name
         self.host = host
         self.port = port
         self.token = token
         self.protocol = protocol
-        self.connected = False
-        self.handler = self._get_handler(protocol)
-        self._health_thread = None
-        self._stop_health = Event()
-        self._lock = Lock()
+        self.options = options or {}
+        self.timeout = self.options.get("timeout", 30)
+        self.stream_window = self.options.get("stream_window", 16)
+        self.breaker = CircuitBreaker.from_config(name, self.options.get("circuit_breaker", {}))
+        self.latency = LatencyTracker()
+        adaptive_cfg = self.options.get("adaptive_timeout")
+        self.adaptive_timeout = AdaptiveTimeout.from_config(self.latency, self.timeout, adaptive_cfg) if adaptive_cfg else None
+        self._latency_metric = MCP_LATENCY.labels(name)
+        self._connected_metric = MCP_CONNECTED.labels(name)
+        self._connected = False
+        self.handler = self._get_handler(protocol, channel)
+        self.last_activity = 0.0
+        self._health_job = None
+        self._health_scheduler = None
+        # Guards connection state only; requests are multiplexed by the handler
+        self._lock = RLock()
 
-    def _get_handler(self, protocol):
+    def _get_handler(self, protocol, channel=None):
         if protocol == "stdio":
-            return StdioHandler()
+            return StdioHandler(channel, self.options)
         elif protocol == "sse":
-            return SSEHandler()
+            return SSEHandler(self.name, self.options, self.token)
         else:
             raise ValueError(f"Unsupported protocol: {protocol}")
 
+    @property
+    def connected(self):
+        return self._connected
+
+    @connected.setter
+    def connected(self, value):
+        if value != self._connected:
+            MCP_STATE_CHANGES.labels(self.name, "connected" if value else "disconnected").inc()
+            self._connected_metric.set(1 if value else 0)
+        self._connected = value
+
     def connect(self):
-        with self._lock:
+        with self._lock, tracing.span("mcp.connect", client=self.name, protocol=self.protocol) as span:
+            started = time.monotonic()
             try:
                 success = self.handler.connect(self.host, self.port)
                 self.connected = success
@@ -88,46 +841,176 @@ class MCPClient:
             except Exception as e:
                 logger.error(f"[MCPClient:{self.name}] ERROR connecting: {e}")
                 self.connected = False
+            span.set("connected", self.connected)
+            MCP_CONNECTS.labels(self.name, "ok" if self.connected else "failed").inc()
+            MCP_CONNECT_LATENCY.labels(self.name).observe(time.monotonic() - started)
 
-    def send(self, payload):
-        with self._lock:
+    @property
+    def healthy(self):
+        return self.connected and self.breaker.state != OPEN
+
+    def request_timeout(self):
+        return self.adaptive_timeout.current() if self.adaptive_timeout else self.timeout
+
+    def record_success(self, latency, outcome="ok"):
+        self.latency.record(latency)
+        self._latency_metric.observe(latency)
+        MCP_REQUESTS.labels(self.name, outcome).inc()
+        self.breaker.record_success()
+        self.last_activity = time.monotonic()
+
+    def record_failure(self, error):
+        self.breaker.record_failure()
+        if isinstance(error, TimeoutError):
+            MCP_REQUESTS.labels(self.name, "timeout").inc()
+        else:
+            MCP_REQUESTS.labels(self.name, "failed").inc()
+            self.connected = False
+
+    def submit(self, payload):
+        """Start a request and return a Future for its result; cancel it to abandon the request."""
+        if not self.connected:
+            raise ConnectionError(f"MCP client {self.name} is not connected")
+        if not self.breaker.allow():
+            raise CircuitOpenError(f"Circuit breaker for {self.name} is open")
+        started = time.monotonic()
+        try:
+            future = self.handler.submit(tracing.inject(payload))
+        except Exception as e:
+            self._settle(e, started)
+            raise
+        future.add_done_callback(lambda f: self._on_complete(f, started))
+        return future
+
+    def submit_many(self, payloads):
+        """Start several requests in one round trip (a JSON-RPC batch); returns their futures in order."""
+        if not self.connected:
+            raise ConnectionError(f"MCP client {self.name} is not connected")
+        if not self.breaker.allow():
+            raise CircuitOpenError(f"Circuit breaker for {self.name} is open")
+        started = time.monotonic()
+        try:
+            futures = self.handler.submit_many([tracing.inject(payload) for payload in payloads])
+        except Exception as e:
+            self._settle(e, started)
+            raise
+        for future in futures:
+            future.add_done_callback(lambda f: self._on_complete(f, started))
+        return futures
+
+    def stream(self, payload, window=None):
+        """Start a request whose result comes back in chunks; iterate the returned ChunkStream.
+
+        Each chunk must arrive within the request timeout. Raises ConnectionError (or
+        CircuitOpenError) when the request cannot be sent.
+        """
+        if not self.connected:
+            raise ConnectionError(f"MCP client {self.name} is not connected")
+        if not self.breaker.allow():
+            raise CircuitOpenError(f"Circuit breaker for {self.name} is open")
+        stream = ChunkStream(self.name, window or self.stream_window, self.request_timeout())
+        started = time.monotonic()
+        stream.add_done_callback(lambda error: self._on_stream_done(error, started))
+        try:
+            self.handler.open_stream(tracing.inject(payload), stream)
+        except Exception as e:
+            stream.fail(e)
+            raise
+        return stream
+
+    def _on_stream_done(self, error, started):
+        self._settle(error, started)
+
+    def _on_complete(self, future, started):
+        if future.cancelled():
+            if getattr(future, "timed_out", False):
+                self.record_failure(TimeoutError("MCP request timed out"))
+            else:
+                self.breaker.release()  # Abandoned by a hedge or a closed stream
+            return
+        self._settle(future.exception(), started)
+
+    def _settle(self, error, started):
+        """Record how a request the breaker admitted ended; called exactly once per request."""
+        interrupted = error is not None and not isinstance(error, Exception)  # e.g. asyncio.CancelledError
+        if interrupted or isinstance(error, StreamCancelled) or (isinstance(error, PayloadTooLarge) and error.what == "request"):
+            # Cancelled, or refused before it was sent: says nothing about the server
+            self.breaker.release()
+        elif error is None or isinstance(error, (MCPError, PayloadTooLarge)):
+            # An error response still proves the server is up
+            self.record_success(time.monotonic() - started, "ok" if error is None else "error")
+        else:
+            self.record_failure(error)
+
+    def send(self, payload, timeout=None):
+        with tracing.span("mcp.send", client=self.name, protocol=self.protocol) as span:
             if not self.connected:
+                MCP_REQUESTS.labels(self.name, "not_connected").inc()
+                span.set("error", "not connected")
                 logger.warning(f"[MCPClient:{self.name}] WARNING: not connected")
                 return None
             try:
-                result = self.handler.send(payload)
+                future = self.submit(payload)
+            except CircuitOpenError as e:
+                MCP_REQUESTS.labels(self.name, "rejected").inc()
+                span.fail(e)
+                logger.warning(f"[MCPClient:{self.name}] {e}")
+                return None
+            except PayloadTooLarge as e:
+                MCP_REQUESTS.labels(self.name, "too_large").inc()
+                span.fail(e)
+                logger.error(f"[MCPClient:{self.name}] Not sent: {e}")
+                return None
+            except Exception as e:
+                span.fail(e)  # Recorded by submit()
+                logger.error(f"[MCPClient:{self.name}] Send error: {e}")
+                return None
+            try:
+                with tracing.span("mcp.wait", client=self.name):
+                    result = wait_result(future, timeout or self.request_timeout())
                 logger.debug(f"[MCPClient:{self.name}:{self.protocol}] SEND → {payload}")
                 return result
+            except TimeoutError as e:
+                span.fail(e)  # Recorded by _on_complete, whether the transport or the wait timed out
+                logger.warning(f"[MCPClient:{self.name}] Send timed out: {e}")
+                return None
+            except (MCPError, PayloadTooLarge) as e:
+                span.fail(e)
+                if not server_answered(e):
+                    logger.error(f"[MCPClient:{self.name}] Not sent: {e}")
+                    return None
+                logger.error(f"[MCPClient:{self.name}] Server returned error: {e}")
+                return error_result(e)  # Not None: the server answered, so callers must not retry
             except Exception as e:
+                # Already recorded when the future completed
+                span.fail(e)
                 logger.error(f"[MCPClient:{self.name}] Send error: {e}")
-                self.connected = False
                 return None
 
+    def notify(self, payload):
+        if not self.connected:
+            logger.warning(f"[MCPClient:{self.name}] WARNING: not connected")
+            return
+        try:
+            self.handler.notify(payload)
+            self.last_activity = time.monotonic()
+        except Exception as e:
+            logger.error(f"[MCPClient:{self.name}] Notify error: {e}")
+            self.connected = False
+
     def disconnect(self):
         with self._lock:
             self.connected = False
-            self._stop_health.set()
-            if self._health_thread and self._health_thread.is_alive():
-                self._health_thread.join(timeout=1)
+            if self._health_job is not None:
+                self._health_scheduler.cancel(self._health_job)
+                self._health_job = None
+            self.handler.close()
             logger.info(f"[MCPClient:{self.name}] Disconnected")
 
-    def start_health_check(self, interval=5, check_type="ping"):
-        def health_loop():
-            while not self._stop_health.is_set():
-                try:
-                    with self._lock:
-                        if not self.connected:
-                            logger.warning(f"[MCPClient:{self.name}] Health check failed, reconnecting...")
-                            self.connect()
-                        elif check_type == "ping":
-                            pong = self.handler.ping()
-                            if not pong:
-                                logger.warning(f"[MCPClient:{self.name}] Ping failed, reconnecting...")
-                                self.connected = False
-                                self.connect()
-                except Exception as e:
-                    logger.error(f"[MCPClient:{self.name}] Health error: {e}")
-                self._stop_health.wait(timeout=interval)
-        self._stop_health.clear()
-        self._health_thread = threading.Thread(target=health_loop, daemon=True)
-        self._health_thread.start()
+    def start_health_check(self, interval=5, check_type="ping", scheduler=None, **options):
+        """Register this client's probe with a (shared) health scheduler."""
+        if self._health_job is not None:
+            self._health_job.cancelled = True
+        self._health_scheduler = scheduler or get_default_scheduler()
+        self._health_job = ClientHealthJob(self, interval, check_type, **options)
+        self._health_scheduler.schedule(self._health_job)
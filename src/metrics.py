@@ -0,0 +1,205 @@
+import bisect
+import math
+import threading
+import logging
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Lock
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+class _Value:
+    __slots__ = ("value", "_lock")
+
+    def __init__(self):
+        self.value = 0.0
+        self._lock = Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount=1):
+        with self._lock:
+            self.value -= amount
+
+    def set(self, value):
+        self.value = value
+
+    def sample(self):
+        return {"value": self.value}
+
+class _Histogram:
+    __slots__ = ("buckets", "counts", "sum", "count", "_lock")
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # Last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+        self._lock = Lock()
+
+    def observe(self, value):
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += value
+            self.count += 1
+
+    def sample(self):
+        with self._lock:
+            counts, total, count = list(self.counts), self.sum, self.count
+        cumulative, buckets = 0, {}
+        for bound, n in zip(list(self.buckets) + [math.inf], counts):
+            cumulative += n
+            buckets["+Inf" if bound == math.inf else repr(float(bound))] = cumulative
+        return {"buckets": buckets, "sum": total, "count": count}
+
+class Metric:
+    """A metric family. Use labels(...) to get the child for one label combination."""
+    def __init__(self, kind, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.kind = kind
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._children = {}
+        self._lock = Lock()
+
+    def labels(self, *values):
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}, got {values}")
+            with self._lock:
+                child = self._children.get(values)
+                if child is None:
+                    child = _Histogram(self.buckets) if self.kind == "histogram" else _Value()
+                    self._children[values] = child
+        return child
+
+    def samples(self):
+        with self._lock:
+            children = list(self._children.items())
+        return [dict(labels=dict(zip(self.labelnames, values)), **child.sample()) for values, child in children]
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = Lock()
+
+    def _register(self, kind, name, help, labelnames, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = Metric(kind, name, help, labelnames, **kwargs)
+            return metric
+
+    def counter(self, name, help, labelnames=()):
+        return self._register("counter", name, help, labelnames)
+
+    def gauge(self, name, help, labelnames=()):
+        return self._register("gauge", name, help, labelnames)
+
+    def histogram(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self._register("histogram", name, help, labelnames, buckets=buckets)
+
+    def snapshot(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return {m.name: {"type": m.kind, "help": m.help, "samples": m.samples()} for m in metrics}
+
+    def render_prometheus(self):
+        lines = []
+        for name, family in self.snapshot().items():
+            lines.append(f"# HELP {name} {family['help']}")
+            lines.append(f"# TYPE {name} {family['type']}")
+            for sample in family["samples"]:
+                labels = sample["labels"]
+                if family["type"] == "histogram":
+                    for le, count in sample["buckets"].items():
+                        lines.append(f"{name}_bucket{_format_labels(dict(labels, le=le))} {count}")
+                    lines.append(f"{name}_sum{_format_labels(labels)} {sample['sum']}")
+                    lines.append(f"{name}_count{_format_labels(labels)} {sample['count']}")
+                else:
+                    lines.append(f"{name}{_format_labels(labels)} {sample['value']}")
+        return "\n".join(lines) + "\n"
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items()) + "}"
+
+REGISTRY = MetricsRegistry()
+
+TOOL_CALLS = REGISTRY.counter("toolfabric_tool_calls_total", "Tool invocations", ("tool",))
+TOOL_ERRORS = REGISTRY.counter("toolfabric_tool_errors_total", "Tool invocations that returned an error", ("tool",))
+TOOL_IN_FLIGHT = REGISTRY.gauge("toolfabric_tool_in_flight", "Tool invocations currently running", ("tool",))
+TOOL_LATENCY = REGISTRY.histogram("toolfabric_tool_latency_seconds", "Tool invocation latency", ("tool",))
+TOOL_RUNNING = REGISTRY.gauge("toolfabric_tool_running", "1 while the tool's process/clients are started", ("tool",))
+TOOL_REPLICAS = REGISTRY.gauge("toolfabric_tool_replicas", "Running replicas of an MCP tool's server process", ("tool",))
+TOOL_ADMISSIONS = REGISTRY.counter("toolfabric_tool_admissions_total", "Admission decisions for tool calls by outcome", ("tool", "outcome"))
+TOOL_QUEUED = REGISTRY.gauge("toolfabric_tool_queued", "Tool calls waiting for a concurrency slot", ("tool",))
+TOOL_STARTS = REGISTRY.counter("toolfabric_tool_starts_total", "Tool starts and stops by reason", ("tool", "event"))
+MCP_REQUESTS = REGISTRY.counter("toolfabric_mcp_requests_total", "MCP requests by outcome", ("client", "outcome"))
+MCP_LATENCY = REGISTRY.histogram("toolfabric_mcp_request_latency_seconds", "MCP request latency", ("client",))
+MCP_CONNECTS = REGISTRY.counter("toolfabric_mcp_connects_total", "MCP connect attempts by outcome", ("client", "outcome"))
+MCP_CONNECT_LATENCY = REGISTRY.histogram("toolfabric_mcp_connect_seconds", "MCP connect duration", ("client",))
+MCP_CONNECTED = REGISTRY.gauge("toolfabric_mcp_connected", "1 while the MCP client is connected", ("client",))
+MCP_STATE_CHANGES = REGISTRY.counter("toolfabric_mcp_state_transitions_total", "MCP connection and breaker state changes", ("client", "state"))
+PROCESS_OUTPUT_LINES = REGISTRY.counter("toolfabric_process_output_lines_total", "Subprocess output lines drained", ("tool", "stream"))
+PROCESS_OUTPUT_SUPPRESSED = REGISTRY.counter("toolfabric_process_output_suppressed_total", "Subprocess output lines not logged due to the rate limit", ("tool",))
+HEALTH_PROBES = REGISTRY.counter("toolfabric_health_probes_total", "Health probes by outcome", ("target", "outcome"))
+HEALTH_PROBE_LATENCY = REGISTRY.histogram("toolfabric_health_probe_seconds", "Health probe duration", ("target",))
+SIDECAR_REQUESTS = REGISTRY.counter("toolfabric_sidecar_requests_total", "Worker requests served by the sidecar by outcome", ("op", "outcome"))
+SIDECAR_CONNECTIONS = REGISTRY.gauge("toolfabric_sidecar_connections", "Worker connections open to the sidecar")
+
+class ToolMetrics:
+    """Per-tool handles so the call path does one dict lookup per metric at most."""
+    __slots__ = ("calls", "errors", "in_flight", "latency")
+
+    def __init__(self, tool):
+        self.calls = TOOL_CALLS.labels(tool)
+        self.errors = TOOL_ERRORS.labels(tool)
+        self.in_flight = TOOL_IN_FLIGHT.labels(tool)
+        self.latency = TOOL_LATENCY.labels(tool)
+
+    def begin(self):
+        self.calls.inc()
+        self.in_flight.inc()
+
+    def end(self, elapsed, ok=True):
+        self.in_flight.dec()
+        self.latency.observe(elapsed)
+        if not ok:
+            self.errors.inc()
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    registry = REGISTRY
+
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/metrics", "/"):
+            self.send_error(404)
+            return
+        body = self.registry.render_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logger.debug(f"[Metrics] {format % args}")
+
+def start_http_server(port, host="127.0.0.1", registry=REGISTRY):
+    """Serve the Prometheus text format on http://host:port/metrics from a daemon thread."""
+    handler = type("MetricsHandler", (_MetricsHandler,), {"registry": registry})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    logger.info(f"[Metrics] Serving Prometheus metrics on http://{host}:{server.server_address[1]}/metrics")
+    return server
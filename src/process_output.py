@@ -0,0 +1,136 @@
+import threading
+import time
+import logging
+from collections import deque
+from threading import Lock
+from .metrics import PROCESS_OUTPUT_LINES, PROCESS_OUTPUT_SUPPRESSED
+
+logger = logging.getLogger(__name__)
+
+MAX_LINE = 8192  # Longer lines are split so a runaway write cannot grow memory
+
+class OutputPump:
+    """Drains a subprocess's stdout/stderr on background threads so its pipes never fill up.
+
+    The most recent `buffer_bytes` of output are kept in a ring buffer for diagnostics and
+    lines are forwarded to logging, at most `log_rate` per second (extra lines are counted
+    and summarized). When a StdioChannel owns stdout, start with read_stdout=False and let
+    the channel hand its non-protocol lines to feed().
+    """
+    def __init__(self, name, process, read_stdout=True, buffer_bytes=64 * 1024, log_rate=20,
+                 log_level=logging.INFO):
+        self.name = name
+        self.process = process
+        self.read_stdout = read_stdout
+        self.buffer_bytes = buffer_bytes
+        self.log_rate = log_rate
+        self.log_level = log_level
+        self._buffer = deque()  # (stream, line)
+        self._buffered = 0
+        self._lock = Lock()
+        self._threads = []
+        self._tokens = log_rate
+        self._refilled = time.monotonic()
+        self.lines = 0
+        self.suppressed = 0
+        self.truncated = 0
+
+    @classmethod
+    def from_config(cls, name, process, cfg, read_stdout=True):
+        level = cfg.get("log_level", "info")
+        return cls(
+            name, process,
+            read_stdout=read_stdout,
+            buffer_bytes=int(cfg.get("buffer_kb", 64) * 1024),
+            log_rate=cfg.get("log_lines_per_sec", 20) if cfg.get("log", True) else 0,
+            log_level=logging.getLevelName(level.upper()) if isinstance(level, str) else level,
+        )
+
+    def start(self):
+        streams = [("stderr", self.process.stderr)]
+        if self.read_stdout:
+            streams.insert(0, ("stdout", self.process.stdout))
+        for stream, pipe in streams:
+            if pipe is None:
+                continue
+            thread = threading.Thread(target=self._drain, args=(stream, pipe),
+                                      name=f"output-{self.name}-{stream}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def join(self, timeout=1):
+        """Wait for the readers to hit EOF (call after the process has exited)."""
+        deadline = time.monotonic() + timeout
+        for thread in self._threads:
+            thread.join(max(0, deadline - time.monotonic()))
+        self._flush_suppressed()
+
+    def _drain(self, stream, pipe):
+        try:
+            for raw in iter(lambda: pipe.readline(MAX_LINE), b""):
+                self.feed(stream, raw)
+        except (OSError, ValueError):
+            pass  # Pipe closed under us during stop
+        except Exception as e:
+            logger.error(f"[OutputPump:{self.name}] {stream} reader error: {e}")
+
+    def feed(self, stream, raw):
+        """Record one line of output from `stream` ("stdout" or "stderr")."""
+        line = raw.decode("utf-8", errors="replace").rstrip("\r\n") if isinstance(raw, bytes) else raw.rstrip("\r\n")
+        if not line:
+            return
+        size = len(line)
+        with self._lock:
+            self.lines += 1
+            self._buffer.append((stream, line))
+            self._buffered += size
+            while self._buffered > self.buffer_bytes and len(self._buffer) > 1:
+                self._buffered -= len(self._buffer.popleft()[1])
+                self.truncated += 1
+            allowed, resumed = self._take_token()
+        PROCESS_OUTPUT_LINES.labels(self.name, stream).inc()
+        if resumed:
+            logger.warning(f"[OutputPump:{self.name}] {resumed} output line(s) not logged (rate limit)")
+        if allowed:
+            logger.log(self.log_level, f"[{self.name}:{stream}] {line}")
+        else:
+            PROCESS_OUTPUT_SUPPRESSED.labels(self.name).inc()
+
+    def _take_token(self):
+        # Token bucket refilled at log_rate per second; called with the lock held.
+        # Returns (log this line, lines suppressed since the last logged one).
+        if self.log_rate <= 0:
+            return False, 0
+        now = time.monotonic()
+        self._tokens = min(self.log_rate, self._tokens + (now - self._refilled) * self.log_rate)
+        self._refilled = now
+        if self._tokens >= 1:
+            self._tokens -= 1
+            suppressed, self.suppressed = self.suppressed, 0
+            return True, suppressed
+        self.suppressed += 1
+        return False, 0
+
+    def _flush_suppressed(self):
+        with self._lock:
+            suppressed, self.suppressed = self.suppressed, 0
+        if suppressed:
+            logger.warning(f"[OutputPump:{self.name}] {suppressed} output line(s) not logged (rate limit)")
+
+    def tail(self, lines=None, stream=None):
+        """The most recent buffered lines, oldest first, formatted as "stream: line"."""
+        with self._lock:
+            entries = [e for e in self._buffer if stream is None or e[0] == stream]
+        if lines is not None:
+            entries = entries[-lines:] if lines > 0 else []
+        return [f"{s}: {line}" for s, line in entries]
+
+    def stats(self):
+        with self._lock:
+            return {
+                "lines": self.lines,
+                "buffered_lines": len(self._buffer),
+                "buffered_bytes": self._buffered,
+                "truncated": self.truncated,
+                "suppressed": self.suppressed,
+            }
@@ -0,0 +1,116 @@
+import threading
+import time
+import logging
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+OVERFLOW_POLICIES = ("block", "drop_oldest", "drop_newest")
+
+class BatchPublisher:
+    """Publishes tool results to observer MCP clients from a background thread.
+
+    Records are queued (bounded by `max_queue`) and sent to every client as one
+    `{"tool": ..., "results": [...]}` notification per batch. When the queue is full the
+    `overflow` policy decides whether publish() blocks or a record is dropped.
+    stop() flushes whatever is still queued before returning.
+    """
+    def __init__(self, name, clients, max_queue=1000, batch_size=50, flush_interval=0.05,
+                 overflow="block", flush_timeout=5):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy '{overflow}', expected one of {', '.join(OVERFLOW_POLICIES)}")
+        self.name = name
+        self.clients = clients
+        self.max_queue = max_queue
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.overflow = overflow
+        self.flush_timeout = flush_timeout
+        self.published = 0
+        self.dropped = 0
+        self.batches = 0
+        self._queue = deque()
+        self._cond = threading.Condition()
+        self._closing = False
+        self._thread = threading.Thread(target=self._run, name=f"publisher-{name}", daemon=True)
+        self._thread.start()
+
+    @classmethod
+    def from_config(cls, name, clients, cfg):
+        return cls(
+            name, clients,
+            max_queue=cfg.get("max_queue", 1000),
+            batch_size=cfg.get("batch_size", 50),
+            flush_interval=cfg.get("flush_interval", 0.05),
+            overflow=cfg.get("overflow", "block"),
+            flush_timeout=cfg.get("flush_timeout", 5),
+        )
+
+    def publish(self, record):
+        with self._cond:
+            if self._closing:
+                self.dropped += 1
+                return False
+            if len(self._queue) >= self.max_queue:
+                if self.overflow == "drop_newest":
+                    self.dropped += 1
+                    return False
+                if self.overflow == "drop_oldest":
+                    self._queue.popleft()
+                    self.dropped += 1
+                else:
+                    while len(self._queue) >= self.max_queue and not self._closing:
+                        self._cond.wait()
+                    if self._closing:
+                        self.dropped += 1
+                        return False
+            self._queue.append(record)
+            if len(self._queue) == 1 or len(self._queue) >= self.batch_size:
+                self._cond.notify_all()  # Start the flush timer, or flush a full batch now
+        return True
+
+    def stop(self):
+        with self._cond:
+            self._closing = True
+            self._cond.notify_all()
+        self._thread.join(timeout=self.flush_timeout)
+        if self._thread.is_alive():
+            logger.warning(f"[BatchPublisher:{self.name}] Flush did not finish within {self.flush_timeout}s")
+
+    def stats(self):
+        with self._cond:
+            return {"queued": len(self._queue), "published": self.published,
+                    "dropped": self.dropped, "batches": self.batches}
+
+    def _next_batch(self):
+        with self._cond:
+            deadline = None
+            while len(self._queue) < self.batch_size and not self._closing:
+                if self._queue and deadline is None:
+                    deadline = time.monotonic() + self.flush_interval
+                timeout = None if deadline is None else deadline - time.monotonic()
+                if timeout is not None and timeout <= 0:
+                    break
+                self._cond.wait(timeout)
+            batch = [self._queue.popleft() for _ in range(min(self.batch_size, len(self._queue)))]
+            self._cond.notify_all()  # Wake publishers blocked on a full queue
+            return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if batch:
+                self._send(batch)
+            elif self._closing:
+                return
+
+    def _send(self, batch):
+        payload = {"tool": self.name, "results": batch}
+        for client in self.clients:
+            try:
+                client.notify(payload)
+            except Exception as e:
+                logger.error(f"[BatchPublisher:{self.name}] Publish to {client.name} failed: {e}")
+        with self._cond:
+            self.published += len(batch)
+            self.batches += 1
@@ -0,0 +1,144 @@
+import subprocess
+import time
+import logging
+from threading import Lock
+from .async_mcp_client import AsyncMCPClient
+from .health import HealthJob
+
+logger = logging.getLogger(__name__)
+
+class ReplicaPolicy:
+    """How many copies of an MCP tool's command to run.
+
+    `replicas: N` runs exactly N. A mapping `{min, max, target_outstanding, ...}` starts `min`
+    and adds a replica when the peak number of in-flight calls per replica reaches
+    `target_outstanding`. It removes one after load has stayed under half that
+    for `scale_down_after` seconds.
+    """
+    def __init__(self, min=1, max=1, target_outstanding=4, scale_down_after=60, check_interval=2,
+                 restart_backoff_max=30, port_step=1):
+        if min < 1 or max < min:
+            raise ValueError(f"replicas: need 1 <= min <= max, got min={min} max={max}")
+        self.min = min
+        self.max = max
+        self.target_outstanding = target_outstanding
+        self.scale_down_after = scale_down_after
+        self.check_interval = check_interval
+        self.restart_backoff_max = restart_backoff_max
+        self.port_step = port_step
+
+    @classmethod
+    def from_config(cls, cfg):
+        if cfg is None:
+            return None
+        if isinstance(cfg, int):
+            return cls(min=cfg, max=cfg)
+        return cls(
+            min=cfg.get("min", 1),
+            max=cfg.get("max", cfg.get("min", 1)),
+            target_outstanding=cfg.get("target_outstanding", 4),
+            scale_down_after=cfg.get("scale_down_after", 60),
+            check_interval=cfg.get("check_interval", 2),
+            restart_backoff_max=cfg.get("restart_backoff_max", 30),
+            port_step=cfg.get("port_step", 1),
+        )
+
+    @property
+    def autoscale(self):
+        return self.max > self.min
+
+class Replica:
+    """One running copy of an MCP tool's command, with its own pipes and clients.
+
+    `outstanding` counts calls routed to this replica that have not finished; `peak` is
+    its high-water mark since the autoscaler last looked.
+    """
+    def __init__(self, index, name, process=None, channel=None, output=None):
+        self.index = index
+        self.name = name
+        self.process = process
+        self.channel = channel
+        self.output = output
+        self.clients = []
+        self._async_clients = None
+        self.outstanding = 0
+        self.peak = 0
+        self.draining = False
+        self.started_at = time.monotonic()
+        self.restart_at = None  # Set once the process is found dead
+        self._lock = Lock()
+
+    @property
+    def alive(self):
+        return self.process is None or self.process.poll() is None
+
+    @property
+    def async_clients(self):
+        if self._async_clients is None:
+            async_clients = []
+            for client in self.clients:
+                async_client = AsyncMCPClient(client)
+                async_client.replica = self
+                async_clients.append(async_client)
+            self._async_clients = async_clients
+        return self._async_clients
+
+    def begin(self, n=1):
+        with self._lock:
+            self.outstanding += n
+            if self.outstanding > self.peak:
+                self.peak = self.outstanding
+
+    def end(self, n=1):
+        with self._lock:
+            self.outstanding -= n
+
+    def take_peak(self):
+        with self._lock:
+            peak, self.peak = self.peak, self.outstanding
+            return peak
+
+    def exit_message(self):
+        message = f"Process for {self.name} exited with code {self.process.returncode}"
+        tail = self.output.tail(5) if self.output else []
+        return message + (": " + " | ".join(tail) if tail else "")
+
+    def stop(self, disconnect=True):
+        if disconnect:
+            for client in self.clients:
+                client.disconnect()
+        if self.channel:
+            self.channel.close()
+        process = self.process
+        if process and process.poll() is None:
+            if not self.channel and process.stdin:
+                process.stdin.close()
+            process.terminate()
+            try:
+                process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                process.kill()
+                process.wait()
+        if self.output:
+            self.output.join()  # Keep the buffer afterwards: it explains why a process died
+
+    def stats(self):
+        return {
+            "pid": self.process.pid if self.process else None,
+            "alive": self.alive,
+            "draining": self.draining,
+            "outstanding": self.outstanding,
+            "clients": {client.name: client.healthy for client in self.clients},
+            "uptime": round(time.monotonic() - self.started_at, 1),
+        }
+
+class ReplicaJob(HealthJob):
+    """Restarts crashed replicas of a tool and applies its autoscaling policy."""
+    def __init__(self, tool, interval):
+        super().__init__(f"{tool.name}:replicas", interval)
+        self.tool = tool
+
+    def run(self):
+        if self.cancelled:
+            return None
+        return self.tool._maintain_replicas()
@@ -0,0 +1,151 @@
+import time
+import logging
+from collections import deque
+from threading import Lock
+from .metrics import MCP_STATE_CHANGES
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+class CircuitOpenError(ConnectionError):
+    """Raised when a request is rejected because the client's circuit breaker is open."""
+
+class CircuitBreaker:
+    """Closed/open/half-open breaker.
+
+    Opens after `failure_threshold` consecutive failures, rejects calls for
+    `reset_timeout` seconds, then lets up to `half_open_max_calls` trial calls through.
+    `success_threshold` trial successes close it again; any trial failure re-opens it.
+    Every call allow() admits must end in record_success(), record_failure() or release().
+    """
+    def __init__(self, name, failure_threshold=5, reset_timeout=30, half_open_max_calls=1, success_threshold=1):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.half_open_max_calls = half_open_max_calls
+        self.success_threshold = success_threshold
+        self._state = CLOSED
+        self._failures = 0
+        self._successes = 0
+        self._trials = 0
+        self._opened_at = 0.0
+        self._lock = Lock()
+
+    @classmethod
+    def from_config(cls, name, cfg):
+        return cls(
+            name,
+            failure_threshold=cfg.get("failure_threshold", 5),
+            reset_timeout=cfg.get("reset_timeout", 30),
+            half_open_max_calls=cfg.get("half_open_max_calls", 1),
+            success_threshold=cfg.get("success_threshold", 1),
+        )
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._current_state()
+
+    def allow(self):
+        with self._lock:
+            state = self._current_state()
+            if state == CLOSED:
+                return True
+            if state == HALF_OPEN and self._trials < self.half_open_max_calls:
+                self._trials += 1
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            if self._current_state() == HALF_OPEN:
+                self._successes += 1
+                if self._successes >= self.success_threshold:
+                    self._transition(CLOSED)
+            self._failures = 0
+
+    def release(self):
+        """An admitted call ended without saying anything about the server (cancelled, never sent)."""
+        with self._lock:
+            if self._current_state() == HALF_OPEN and self._trials > 0:
+                self._trials -= 1
+
+    def record_failure(self):
+        with self._lock:
+            state = self._current_state()
+            self._failures += 1
+            if state == HALF_OPEN or (state == CLOSED and self._failures >= self.failure_threshold):
+                self._transition(OPEN)
+
+    def _current_state(self):
+        if self._state == OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+            self._transition(HALF_OPEN)
+        return self._state
+
+    def _transition(self, state):
+        logger.warning(f"[CircuitBreaker:{self.name}] {self._state} -> {state}")
+        MCP_STATE_CHANGES.labels(self.name, f"breaker_{state}").inc()
+        self._state = state
+        self._successes = 0
+        self._trials = 0
+        if state == OPEN:
+            self._opened_at = time.monotonic()
+        elif state == CLOSED:
+            self._failures = 0
+
+class LatencyTracker:
+    """Sliding window of recent request latencies with percentile lookup."""
+    def __init__(self, window=256):
+        self._samples = deque(maxlen=window)
+        self._sorted = None
+        self._lock = Lock()
+
+    def record(self, seconds):
+        with self._lock:
+            self._samples.append(seconds)
+            self._sorted = None
+
+    def __len__(self):
+        return len(self._samples)
+
+    def percentile(self, p):
+        """Returns the p-th percentile in seconds, or None when there are no samples."""
+        with self._lock:
+            if not self._samples:
+                return None
+            if self._sorted is None:
+                self._sorted = sorted(self._samples)
+            ordered = self._sorted
+        index = min(len(ordered) - 1, max(0, int(round(p / 100.0 * len(ordered))) - 1))
+        return ordered[index]
+
+class AdaptiveTimeout:
+    """Request timeout derived from observed latency: percentile x multiplier, clamped."""
+    def __init__(self, tracker, default, percentile=99, multiplier=2.0, min_timeout=0.5, max_timeout=None, min_samples=20):
+        self.tracker = tracker
+        self.default = default
+        self.percentile = percentile
+        self.multiplier = multiplier
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout if max_timeout is not None else default
+        self.min_samples = min_samples
+
+    @classmethod
+    def from_config(cls, tracker, default, cfg):
+        return cls(
+            tracker, default,
+            percentile=cfg.get("percentile", 99),
+            multiplier=cfg.get("multiplier", 2.0),
+            min_timeout=cfg.get("min", 0.5),
+            max_timeout=cfg.get("max"),
+            min_samples=cfg.get("min_samples", 20),
+        )
+
+    def current(self):
+        if len(self.tracker) < self.min_samples:
+            return self.default
+        observed = self.tracker.percentile(self.percentile) * self.multiplier
+        return min(self.max_timeout, max(self.min_timeout, observed))
@@ -0,0 +1,208 @@
+import asyncio
+import inspect
+import json
+import sys
+import time
+import logging
+from collections import OrderedDict
+from concurrent.futures import Future
+from threading import Lock
+
+logger = logging.getLogger(__name__)
+
+def _estimate_size(value):
+    try:
+        return len(json.dumps(value, default=str))
+    except (TypeError, ValueError):
+        return sys.getsizeof(value)
+
+class ResultCache:
+    """TTL + LRU result cache with single-flight deduplication.
+
+    Entries are evicted least-recently-used first once either `max_entries` or the
+    estimated `max_bytes` is exceeded. Concurrent calls for the same key share one
+    in-flight execution; failures are never cached.
+    """
+    def __init__(self, max_entries=1024, ttl=300, max_bytes=16 * 1024 * 1024, key_args=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.key_args = list(key_args) if key_args else None
+        self._entries = OrderedDict()  # key -> (value, expires_at, size)
+        self._inflight = {}
+        self._bytes = 0
+        self._generation = 0
+        self._signatures = {}
+        self._lock = Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expired = 0
+        self.coalesced = 0
+
+    @classmethod
+    def from_config(cls, cfg):
+        return cls(
+            max_entries=cfg.get("max_entries", 1024),
+            ttl=cfg.get("ttl", 300),
+            max_bytes=cfg.get("max_bytes", 16 * 1024 * 1024),
+            key_args=cfg.get("key"),
+        )
+
+    def make_key(self, arguments):
+        """Build a cache key from a {param: value} mapping, restricted to `key_args` if set."""
+        if self.key_args is not None:
+            arguments = {k: arguments.get(k) for k in self.key_args}
+        return json.dumps(arguments, sort_keys=True, default=repr)
+
+    def key_for_call(self, func, args, kwargs):
+        sig = self._signatures.get(func)
+        if sig is None:
+            sig = self._signatures[func] = inspect.signature(func)
+        try:
+            bound = sig.bind(*args, **kwargs)
+        except TypeError:
+            return self.make_key({"args": list(args), "kwargs": kwargs})
+        bound.apply_defaults()
+        return self.make_key(dict(bound.arguments))
+
+    def get_or_call(self, key, fn):
+        hit, value, flight, owner = self._lookup(key)
+        if hit:
+            return value
+        if not owner:
+            return flight.result()
+        return self._run(key, flight, fn)
+
+    async def get_or_call_async(self, key, coro_fn):
+        hit, value, flight, owner = self._lookup(key)
+        if hit:
+            return value
+        if not owner:
+            return await asyncio.wrap_future(flight)
+        generation = self._generation
+        try:
+            value = await coro_fn()
+        except BaseException as e:
+            self._finish(key, flight, error=e)
+            raise
+        self._finish(key, flight, value=value, generation=generation)
+        return value
+
+    def get_or_call_many(self, keys, fn):
+        """Batch variant of get_or_call.
+
+        `fn(indexes)` computes the misses this caller owns in one call and returns one value
+        per index, or an exception instance for items that failed. Keys already in flight
+        (including duplicates within the batch) wait on that flight. Returns values and
+        exception instances in key order.
+        """
+        results = [None] * len(keys)
+        owned, waiting = [], []
+        for i, key in enumerate(keys):
+            hit, value, flight, owner = self._lookup(key)
+            if hit:
+                results[i] = value
+            elif owner:
+                owned.append((i, key, flight))
+            else:
+                waiting.append((i, flight))
+        if owned:
+            generation = self._generation
+            try:
+                values = list(fn([i for i, _, _ in owned]))
+                if len(values) != len(owned):
+                    raise ValueError(f"batch returned {len(values)} results for {len(owned)} items")
+            except Exception as e:
+                values = [e] * len(owned)
+            for (i, key, flight), value in zip(owned, values):
+                if isinstance(value, BaseException):
+                    self._finish(key, flight, error=value)
+                else:
+                    self._finish(key, flight, value=value, generation=generation)
+                results[i] = value
+        for i, flight in waiting:
+            try:
+                results[i] = flight.result()
+            except Exception as e:
+                results[i] = e
+        return results
+
+    def invalidate(self, key=None):
+        """Drop one key, or everything when `key` is None. In-flight results are not stored."""
+        with self._lock:
+            self._generation += 1
+            if key is None:
+                self._entries.clear()
+                self._bytes = 0
+            else:
+                entry = self._entries.pop(key, None)
+                if entry is not None:
+                    self._bytes -= entry[2]
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expired": self.expired,
+                "coalesced": self.coalesced,
+            }
+
+    def _lookup(self, key):
+        """Returns (hit, value, flight future, whether this caller owns the flight)."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, expires_at, size = entry
+                if expires_at >= time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return True, value, None, False
+                del self._entries[key]
+                self._bytes -= size
+                self.expired += 1
+            flight = self._inflight.get(key)
+            if flight is not None:
+                self.coalesced += 1
+                return False, None, flight, False
+            self.misses += 1
+            flight = self._inflight[key] = Future()
+            return False, None, flight, True
+
+    def _run(self, key, flight, fn):
+        generation = self._generation
+        try:
+            value = fn()
+        except BaseException as e:
+            self._finish(key, flight, error=e)
+            raise
+        self._finish(key, flight, value=value, generation=generation)
+        return value
+
+    def _finish(self, key, flight, value=None, error=None, generation=None):
+        with self._lock:
+            self._inflight.pop(key, None)
+            if error is None and generation == self._generation:
+                self._store(key, value)
+        if error is not None:
+            flight.set_exception(error)
+        else:
+            flight.set_result(value)
+
+    def _store(self, key, value):
+        size = _estimate_size(value)
+        if size > self.max_bytes:
+            return
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self._bytes -= old[2]
+        self._entries[key] = (value, time.monotonic() + self.ttl, size)
+        self._bytes += size
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            _, (_, _, evicted_size) = self._entries.popitem(last=False)
+            self._bytes -= evicted_size
+            self.evictions += 1
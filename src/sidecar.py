@@ -0,0 +1,577 @@
+"""Share one ToolFabric between many agent worker processes on the same host.
+
+The sidecar runs the fabric (subprocesses, MCP clients, health checks) once and serves it
+on a Unix domain socket. Workers use a SidecarClient: a thin stand-in for ToolFabric whose
+tools are proxies that multiplex calls over a few pooled socket connections.
+
+Frames are codec-encoded JSON objects, one per line, matched to requests by `id`:
+
+    -> {"id", "op": "tools"}                          <- {"id", "result": [{name, declaration, tags, capabilities}]}
+    -> {"id", "op": "call", "tool", "args", "kwargs"}  <- {"id", "result"} or {"id", "error", "kind"}
+    -> {"id", "op": "call_many", "tool", "items"}
+    -> {"id", "op": "stream", "tool", "args", "kwargs", "window"}
+                                                       <- {"id", "seq", "chunk"}..., {"id", "end": true}
+    -> {"id", "op": "credit", "credit"} / {"id", "op": "cancel"}
+
+Calls may carry `caller: [name, priority]` (see admission.caller) and a W3C `traceparent`.
+"""
+import argparse
+import asyncio
+import errno
+import itertools
+import os
+import re
+import signal
+import socket
+import socketserver
+import sys
+import tempfile
+import threading
+import logging
+from contextlib import contextmanager
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from . import tracing
+from .admission import caller, current_caller
+from .catalog import CatalogEntry, ToolCatalog
+from .codec import DEFAULT_MAX_PAYLOAD_KB, PayloadTooLarge, check_size, get_codec, kb_limit
+from .metrics import SIDECAR_CONNECTIONS, SIDECAR_REQUESTS
+from .streaming import ChunkStream
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SOCKET = os.path.join(tempfile.gettempdir(), "toolfabric.sock")
+_FRAME_ID = re.compile(rb'"id":(\d+)')
+
+class SidecarError(RuntimeError):
+    """The sidecar could not run a call (the tool itself raised, or the request was invalid)."""
+
+def _read_frame(rfile, limit):
+    """Next frame's bytes, b"" at EOF, or None for a frame over `limit` (skipped). Returns (frame, head)."""
+    line = rfile.readline(limit + 1) if limit else rfile.readline()
+    if not line or line.endswith(b"\n"):
+        return line, None
+    head = line[:256]
+    while line and not line.endswith(b"\n"):
+        line = rfile.readline(65536)
+    return None, head
+
+class _Credits:
+    """Chunks a worker is ready to receive for one stream."""
+    def __init__(self, window):
+        self.available = window
+        self.cancelled = False
+        self.cond = threading.Condition()
+
+    def take(self, timeout):
+        with self.cond:
+            self.cond.wait_for(lambda: self.available > 0 or self.cancelled, timeout)
+            if self.cancelled or self.available <= 0:
+                return False
+            self.available -= 1
+            return True
+
+    def grant(self, n):
+        with self.cond:
+            self.available += n
+            self.cond.notify_all()
+
+    def cancel(self):
+        with self.cond:
+            self.cancelled = True
+            self.cond.notify_all()
+
+class _SidecarHandler(socketserver.StreamRequestHandler):
+    """One worker connection: frames are read here and run on the server's shared pool."""
+
+    def setup(self):
+        super().setup()
+        self.sidecar = self.server.sidecar
+        self.write_lock = threading.Lock()
+        self.streams = {}
+
+    def handle(self):
+        SIDECAR_CONNECTIONS.labels().inc()
+        self.sidecar.connections.add(self.request)
+        try:
+            while True:
+                frame, head = _read_frame(self.rfile, self.sidecar.max_payload)
+                if frame is None:
+                    match = _FRAME_ID.search(head)
+                    logger.warning(f"[Sidecar] Dropped request over the {self.sidecar.max_payload} byte limit")
+                    if match:
+                        self.reply({"id": int(match.group(1)), "kind": "too_large",
+                                    "error": f"request is over the {self.sidecar.max_payload} byte limit"})
+                    continue
+                if not frame:
+                    break
+                try:
+                    message = self.sidecar.codec.loads(frame)
+                except ValueError as e:
+                    logger.warning(f"[Sidecar] Dropped unparsable frame: {e}")
+                    continue
+                self.dispatch(message)
+        except OSError:
+            pass  # Worker went away
+        finally:
+            self.sidecar.connections.discard(self.request)
+            SIDECAR_CONNECTIONS.labels().dec()
+            for credits in list(self.streams.values()):
+                credits.cancel()
+
+    def dispatch(self, message):
+        op = message.get("op")
+        if op == "credit":
+            credits = self.streams.get(message.get("id"))
+            if credits is not None:
+                credits.grant(message.get("credit", 0))
+        elif op == "cancel":
+            credits = self.streams.get(message.get("id"))
+            if credits is not None:
+                credits.cancel()
+        elif op == "stream":
+            self.streams[message.get("id")] = _Credits(message.get("window", 16))
+            self.submit(self.run_stream, message)
+        else:
+            self.submit(self.run, message)
+
+    def submit(self, fn, message):
+        try:
+            self.sidecar.submit(fn, message)
+        except RuntimeError:  # Pool already shut down
+            self.fail(message.get("op"), message.get("id"), "error", "sidecar is shutting down")
+
+    def run(self, message):
+        req_id, op = message.get("id"), message.get("op")
+        try:
+            with self.context(message):
+                result = self.sidecar.execute(op, message)
+        except KeyError as e:
+            self.fail(op, req_id, "unknown_tool", e.args[0] if e.args else str(e))
+            return
+        except Exception as e:
+            logger.error(f"[Sidecar] {op} {message.get('tool')} failed: {e}")
+            self.fail(op, req_id, "error", f"{type(e).__name__}: {e}")
+            return
+        SIDECAR_REQUESTS.labels(op, "ok").inc()
+        self.reply({"id": req_id, "result": result})
+
+    def run_stream(self, message):
+        req_id = message.get("id")
+        credits = self.streams[req_id]
+        chunks = None
+        try:
+            with self.context(message):
+                chunks = self.sidecar.fabric.stream(message.get("tool"), *message.get("args", ()),
+                                                    **message.get("kwargs", {}))
+                for seq, chunk in enumerate(chunks):
+                    if not credits.take(self.sidecar.stream_timeout):
+                        outcome = "cancelled" if credits.cancelled else "timeout"
+                        SIDECAR_REQUESTS.labels("stream", outcome).inc()
+                        if not credits.cancelled:
+                            self.reply({"id": req_id, "kind": "timeout",
+                                        "error": f"worker granted no credit within {self.sidecar.stream_timeout}s"})
+                        return
+                    self.reply({"id": req_id, "seq": seq, "chunk": chunk})
+        except KeyError as e:
+            self.fail("stream", req_id, "unknown_tool", e.args[0] if e.args else str(e))
+            return
+        except Exception as e:
+            logger.error(f"[Sidecar] stream {message.get('tool')} failed: {e}")
+            self.fail("stream", req_id, "error", f"{type(e).__name__}: {e}")
+            return
+        finally:
+            if chunks is not None:
+                chunks.close()  # Cancels the tool's own stream when the worker stopped early
+            self.streams.pop(req_id, None)
+        SIDECAR_REQUESTS.labels("stream", "ok").inc()
+        self.reply({"id": req_id, "end": True})
+
+    @contextmanager
+    def context(self, message):
+        """The worker's caller identity and trace context, for admission limits and tracing."""
+        name, priority = message.get("caller") or (None, None)
+        with tracing.remote_parent(message.get("traceparent")), caller(name, priority):
+            yield
+
+    def fail(self, op, req_id, kind, error):
+        SIDECAR_REQUESTS.labels(op or "unknown", kind).inc()
+        self.reply({"id": req_id, "kind": kind, "error": error})
+
+    def reply(self, message):
+        try:
+            data = self.sidecar.codec.dumps(message)
+            check_size("response", len(data), self.sidecar.max_payload)
+        except PayloadTooLarge as e:
+            data = self.sidecar.codec.dumps({"id": message.get("id"), "kind": "too_large", "error": str(e)})
+        except (TypeError, ValueError) as e:
+            data = self.sidecar.codec.dumps({"id": message.get("id"), "kind": "error",
+                                             "error": f"result is not serializable: {e}"})
+        try:
+            with self.write_lock:
+                self.wfile.write(data + b"\n")
+                self.wfile.flush()
+        except OSError as e:
+            logger.debug(f"[Sidecar] Could not reply to a worker that went away: {e}")
+
+class _UnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+class SidecarServer:
+    """Serves a running ToolFabric on a Unix socket. Tool calls run on a bounded worker pool."""
+    def __init__(self, fabric, path=DEFAULT_SOCKET, workers=32, max_payload_kb=DEFAULT_MAX_PAYLOAD_KB,
+                 codec="json", mode=0o600, stream_timeout=60):
+        self.fabric = fabric
+        self.path = path
+        self.codec = get_codec(codec)
+        self.max_payload = kb_limit({"max_payload_kb": max_payload_kb}, "max_payload_kb")
+        self.mode = mode
+        self.stream_timeout = stream_timeout
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="toolfabric-sidecar")
+        self._server = None
+        self.connections = set()  # Worker sockets, closed by stop()
+
+    def start(self):
+        _remove_stale_socket(self.path)
+        old_umask = os.umask(0o177)  # No window in which the socket is reachable by others
+        try:
+            self._server = _UnixServer(self.path, _SidecarHandler)
+        finally:
+            os.umask(old_umask)
+        os.chmod(self.path, self.mode)
+        self._server.sidecar = self
+        threading.Thread(target=self._server.serve_forever, name="toolfabric-sidecar", daemon=True).start()
+        logger.info(f"[Sidecar] Serving {len(self.fabric.tools)} tools on {self.path}")
+        return self
+
+    def submit(self, fn, message):
+        self._pool.submit(tracing.in_context(fn, message))
+
+    def execute(self, op, message):
+        if op == "tools":
+            return [{"name": e.name, "declaration": e.declaration, "tags": sorted(e.tags),
+                     "capabilities": sorted(e.capabilities)} for e in self.fabric.catalog.entries()]
+        if op == "call":
+            tools = self.fabric.tools  # Snapshot: a concurrent reload() swaps the whole map
+            if message.get("tool") not in tools:
+                raise KeyError(f"Unknown tool: {message.get('tool')}")
+            return tools[message["tool"]](*message.get("args", ()), **message.get("kwargs", {}))
+        if op == "call_many":
+            return self.fabric.call_many(message.get("tool"), message.get("items", []))
+        raise ValueError(f"unknown op {op!r}")
+
+    def stop(self):
+        if self._server is None:
+            return
+        self._server.shutdown()
+        self._server.server_close()
+        self._server = None
+        self._pool.shutdown(wait=False)
+        for conn in list(self.connections):
+            try:
+                conn.shutdown(socket.SHUT_RDWR)  # Workers see the close now instead of waiting on calls
+            except OSError:
+                pass
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+        logger.info(f"[Sidecar] Stopped serving on {self.path}")
+
+def _remove_stale_socket(path):
+    """Unlink a socket file left behind by a sidecar that died; refuse to take over a live one."""
+    if not os.path.exists(path):
+        return
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        probe.connect(path)
+    except ConnectionRefusedError:
+        os.unlink(path)
+        return
+    except OSError as e:
+        if e.errno != errno.ENOENT:
+            raise
+        return
+    finally:
+        probe.close()
+    raise OSError(errno.EADDRINUSE, f"A sidecar is already serving on {path}")
+
+class _Connection:
+    """One pooled socket to the sidecar. Many requests are in flight at once, matched by id."""
+    def __init__(self, path, codec, max_payload, connect_timeout):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(connect_timeout)
+        self.sock.connect(path)
+        self.sock.settimeout(None)
+        self.codec = codec
+        self.max_payload = max_payload
+        self.rfile = self.sock.makefile("rb")
+        self.closed = False
+        self._ids = itertools.count(1)
+        self._pending = {}  # id -> Future or ChunkStream
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        threading.Thread(target=self._read_loop, name="toolfabric-sidecar-client", daemon=True).start()
+
+    @property
+    def in_flight(self):
+        return len(self._pending)
+
+    def request(self, message, stream=None):
+        """Send `message` with a fresh id; returns a Future for its result, or `stream` once bound."""
+        target = stream if stream is not None else Future()
+        with self._lock:
+            if self.closed:
+                raise ConnectionError("sidecar connection closed")
+            req_id = next(self._ids)
+            self._pending[req_id] = target
+        if stream is not None:
+            stream.bind(grant=lambda n: self._send({"id": req_id, "op": "credit", "credit": n}),
+                        cancel=lambda: self._cancel(req_id))
+        try:
+            self._send(dict(message, id=req_id))
+        except Exception:
+            with self._lock:
+                self._pending.pop(req_id, None)
+            raise
+        if stream is None:
+            target.add_done_callback(lambda f: f.cancelled() and self._forget(req_id))
+        return target
+
+    def _forget(self, req_id):
+        with self._lock:
+            self._pending.pop(req_id, None)
+
+    def _cancel(self, req_id):
+        self._forget(req_id)
+        self._send({"id": req_id, "op": "cancel"})
+
+    def _send(self, message):
+        data = self.codec.dumps(message)
+        check_size("request", len(data), self.max_payload)
+        with self._write_lock:
+            self.sock.sendall(data + b"\n")
+
+    def _read_loop(self):
+        error = ConnectionError("sidecar closed the connection")
+        try:
+            while True:
+                frame, head = _read_frame(self.rfile, self.max_payload)
+                if frame is None:
+                    match = _FRAME_ID.search(head)
+                    if match:
+                        self._complete({"id": int(match.group(1)), "kind": "too_large",
+                                        "error": f"response is over the {self.max_payload} byte limit"})
+                    continue
+                if not frame:
+                    break
+                self._complete(self.codec.loads(frame))
+        except (OSError, ValueError) as e:
+            error = ConnectionError(f"sidecar connection failed: {e}")
+        self.close(error)
+
+    def _complete(self, message):
+        req_id = message.get("id")
+        with self._lock:
+            target = self._pending.get(req_id)
+            if target is None:
+                return  # Cancelled or timed out meanwhile
+            if "seq" not in message:
+                del self._pending[req_id]
+        if "seq" in message:
+            target.feed(message["seq"], message.get("chunk"))
+            return
+        if "error" in message:
+            error = KeyError(message["error"]) if message.get("kind") == "unknown_tool" else SidecarError(message["error"])
+            if isinstance(target, ChunkStream):
+                target.fail(error)
+            elif not target.done():
+                target.set_exception(error)
+        elif isinstance(target, ChunkStream):
+            target.finish(None)
+        elif not target.done():
+            target.set_result(message.get("result"))
+
+    def close(self, error=None):
+        with self._lock:
+            self.closed = True
+            pending, self._pending = self._pending, {}
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.sock.close()
+        error = error or ConnectionError("sidecar connection closed")
+        for target in pending.values():
+            if isinstance(target, ChunkStream):
+                target.fail(error)
+            elif not target.done():
+                target.set_exception(error)
+
+class SidecarClient:
+    """ToolFabric stand-in for worker processes: the same tool maps, served by a sidecar.
+
+    `setup()` fetches the sidecar's catalog and returns proxy callables; `select`, `declarations`,
+    `attach_all_to_agent`, `call_many`, `stream` and `astream` work as on ToolFabric. Calls are multiplexed over up to
+    `pool_size` connections, least busy first; a broken connection is replaced on the next call.
+    """
+    def __init__(self, path=DEFAULT_SOCKET, pool_size=4, timeout=None, connect_timeout=5,
+                 max_payload_kb=DEFAULT_MAX_PAYLOAD_KB, codec="json", stream_window=16):
+        self.path = path
+        self.pool_size = max(1, pool_size)
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        self.codec = get_codec(codec)
+        self.max_payload = kb_limit({"max_payload_kb": max_payload_kb}, "max_payload_kb")
+        self.stream_window = stream_window
+        self.tools = {}
+        self.async_tools = {}
+        self.catalog = ToolCatalog()
+        self._connections = []
+        self._lock = threading.Lock()
+
+    def setup(self):
+        entries = []
+        for item in self._wait(self._request({"op": "tools"})):
+            name, declaration = item["name"], item["declaration"]
+            entries.append(CatalogEntry(name, self._proxy(name), self._async_proxy(name), lambda d=declaration: d,
+                                        item.get("tags", ()), item.get("capabilities", ())))
+        self.catalog = ToolCatalog(entries)
+        self.tools = {e.name: e.tool for e in entries}
+        self.async_tools = {e.name: e.async_tool for e in entries}
+        logger.info(f"[SidecarClient] {len(entries)} tools available from {self.path}")
+        return self.tools
+
+    async def setup_async(self):
+        await asyncio.get_running_loop().run_in_executor(None, self.setup)
+        return self.async_tools
+
+    def _proxy(self, name):
+        def tool(*args, **kwargs):
+            try:
+                return self.call(name, *args, **kwargs)
+            except (ConnectionError, OSError, SidecarError) as e:
+                logger.error(f"[SidecarClient] Call to {name} failed: {e}")
+                return {"error": f"Tool {name} unavailable: {e}"}
+        tool.__name__ = name
+        tool.batch = lambda items: self.call_many(name, items)
+        tool.stream = lambda *args, **kwargs: self.stream(name, *args, **kwargs)
+        return tool
+
+    def _async_proxy(self, name):
+        async def tool(*args, **kwargs):
+            try:
+                return await self.call_async(name, *args, **kwargs)
+            except (ConnectionError, OSError, SidecarError) as e:
+                logger.error(f"[SidecarClient] Call to {name} failed: {e}")
+                return {"error": f"Tool {name} unavailable: {e}"}
+        tool.__name__ = name
+        tool.batch = lambda items: self.call_many_async(name, items)
+        tool.stream = lambda *args, **kwargs: self.astream(name, *args, **kwargs)
+        return tool
+
+    def call(self, tool_name, *args, **kwargs):
+        """Run one call in the sidecar. Raises KeyError for unknown tools, ConnectionError if the sidecar is gone."""
+        return self._wait(self._request({"op": "call", "tool": tool_name, "args": args, "kwargs": kwargs}))
+
+    async def call_async(self, tool_name, *args, **kwargs):
+        future = self._request({"op": "call", "tool": tool_name, "args": args, "kwargs": kwargs})
+        return await asyncio.wait_for(asyncio.wrap_future(future), self.timeout)
+
+    def call_many(self, tool_name, items):
+        return self._wait(self._request({"op": "call_many", "tool": tool_name, "items": list(items)}))
+
+    async def call_many_async(self, tool_name, items):
+        future = self._request({"op": "call_many", "tool": tool_name, "items": list(items)})
+        return await asyncio.wait_for(asyncio.wrap_future(future), self.timeout)
+
+    def stream(self, tool_name, *args, **kwargs):
+        """Chunks of one call's result (iterate with `for` or `async for`); see ToolFabric.stream."""
+        stream = ChunkStream(tool_name, self.stream_window, idle_timeout=self.timeout)
+        self._request({"op": "stream", "tool": tool_name, "args": args, "kwargs": kwargs,
+                       "window": stream.window}, stream)
+        return stream
+
+    astream = stream
+
+    def _request(self, message, stream=None):
+        name, priority = current_caller()
+        if name is not None or priority is not None:
+            message["caller"] = [name, priority]
+        traceparent = tracing.current_traceparent()
+        if traceparent is not None:
+            message["traceparent"] = traceparent
+        return self._connection().request(message, stream)
+
+    def _wait(self, future):
+        try:
+            return future.result(self.timeout)
+        except FutureTimeoutError:  # Not the builtin TimeoutError before Python 3.11
+            future.cancel()
+            raise TimeoutError(f"Sidecar request timed out after {self.timeout}s")
+
+    def _connection(self):
+        with self._lock:
+            self._connections = [c for c in self._connections if not c.closed]
+            idle = min(self._connections, key=lambda c: c.in_flight, default=None)
+            if idle is not None and (idle.in_flight == 0 or len(self._connections) >= self.pool_size):
+                return idle
+            conn = _Connection(self.path, self.codec, self.max_payload, self.connect_timeout)
+            self._connections.append(conn)
+            return conn
+
+    def select(self, names=None, tags=None, capabilities=None):
+        return self.catalog.select(names, tags, capabilities)
+
+    def declarations(self, names=None, tags=None, capabilities=None):
+        return self.catalog.select(names, tags, capabilities).declarations
+
+    def attach_all_to_agent(self, agent, names=None, tags=None, capabilities=None):
+        from .tool_fabric import attach_tools  # tool_fabric imports this module
+        view = self.catalog.select(names, tags, capabilities)
+        attach_tools(agent, view.tools)
+        logger.info(f"[SidecarClient] Attached {len(view)} sidecar tools to agent")
+
+    def stop_all(self):
+        """Close the connections; the sidecar and its tools keep running for other workers."""
+        with self._lock:
+            connections, self._connections = self._connections, []
+        for conn in connections:
+            conn.close()
+        self.tools, self.async_tools = {}, {}
+        self.catalog = ToolCatalog()
+
+    async def stop_all_async(self):
+        self.stop_all()
+
+def main(argv=None):
+    from .tool_fabric import ToolFabric
+
+    parser = argparse.ArgumentParser(prog="python -m src.sidecar",
+                                     description="Run a ToolFabric config as a sidecar shared by local agent workers")
+    parser.add_argument("config", help="path to config.yml")
+    parser.add_argument("--socket", help=f"Unix socket path (default: the config's sidecar.socket, else {DEFAULT_SOCKET})")
+    parser.add_argument("--workers", type=int, help="concurrent tool calls (default 32)")
+    parser.add_argument("--log-level", default="INFO")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=args.log_level.upper())
+
+    fabric = ToolFabric(args.config)
+    options = dict(fabric.config.get("sidecar") or {})
+    path = args.socket or options.pop("socket", None)
+    options.pop("socket", None)
+    if args.workers:
+        options["workers"] = args.workers
+    stop = threading.Event()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signum, lambda *_: stop.set())
+    try:
+        fabric.setup()
+        if fabric.sidecar is None:
+            fabric.serve_sidecar(path, **options)
+        stop.wait()
+    finally:
+        fabric.stop_all()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
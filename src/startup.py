@@ -0,0 +1,112 @@
+"""Startup timeline for a ToolFabric, and a CLI that prints it for a config file.
+
+    python -m src.startup examples/config.yml [--json] [--no-cache]
+"""
+import argparse
+import json
+import sys
+import time
+import logging
+from contextlib import contextmanager
+from threading import Lock
+
+logger = logging.getLogger(__name__)
+
+class StartupTimeline:
+    """Records timed spans of fabric startup: config loading, tool creation, start, connect.
+
+    Spans may nest (a tool's `start` contains its `spawn`, `connect` and `ready` spans) and
+    overlap across tools, since tools start concurrently. Offsets are seconds since the
+    timeline was created.
+    """
+    def __init__(self):
+        self.origin = time.monotonic()
+        self.spans = []
+        self._lock = Lock()
+
+    @contextmanager
+    def span(self, phase, tool=None, detail=None):
+        """Time the body as one span; the yielded dict's keys are stored with it."""
+        fields = {}
+        started = time.monotonic()
+        error = None
+        try:
+            yield fields
+        except BaseException as e:
+            error = str(e) or type(e).__name__
+            raise
+        finally:
+            record = {
+                "phase": phase,
+                "tool": tool,
+                "detail": detail,
+                "offset": round(started - self.origin, 6),
+                "duration": round(time.monotonic() - started, 6),
+            }
+            record.update(fields)
+            if error is not None:
+                record["error"] = error
+            with self._lock:
+                self.spans.append(record)
+
+    def report(self):
+        """{"total", "phases": {phase: seconds}, "tools": {tool: {phase: seconds}}, "spans": [...]}."""
+        with self._lock:
+            spans = sorted(self.spans, key=lambda s: s["offset"])
+        phases, tools = {}, {}
+        for span in spans:
+            phases[span["phase"]] = round(phases.get(span["phase"], 0.0) + span["duration"], 6)
+            if span["tool"] is not None:
+                per_tool = tools.setdefault(span["tool"], {})
+                per_tool[span["phase"]] = round(per_tool.get(span["phase"], 0.0) + span["duration"], 6)
+        total = max((s["offset"] + s["duration"] for s in spans), default=0.0)
+        return {"total": round(total, 6), "phases": phases, "tools": tools, "spans": spans}
+
+    def format(self):
+        """Human-readable report: phase totals, then per-tool phases, slowest tool first."""
+        report = self.report()
+        lines = [f"Startup {report['total']:.3f}s", "", f"{'phase':<16}{'seconds':>10}"]
+        lines += [f"{phase:<16}{seconds:>10.3f}" for phase, seconds in report["phases"].items()]
+        tools = sorted(report["tools"].items(), key=lambda item: -max(item[1].values()))
+        if tools:
+            phases = sorted({phase for _, per_tool in tools for phase in per_tool})
+            lines += ["", f"{'tool':<24}" + "".join(f"{phase:>12}" for phase in phases)]
+            for name, per_tool in tools:
+                lines.append(f"{name:<24}" + "".join(
+                    f"{per_tool[phase]:>12.3f}" if phase in per_tool else f"{'-':>12}" for phase in phases))
+        errors = [s for s in report["spans"] if "error" in s]
+        if errors:
+            lines += ["", "errors:"]
+            lines += [f"  {s['tool'] or '-'} {s['phase']}: {s['error']}" for s in errors]
+        return "\n".join(lines)
+
+def main(argv=None):
+    from .tool_fabric import ToolFabric
+
+    parser = argparse.ArgumentParser(prog="python -m src.startup",
+                                     description="Start every tool in a ToolFabric config and report where startup time goes")
+    parser.add_argument("config", help="path to config.yml")
+    parser.add_argument("--json", action="store_true", help="print the full report as JSON")
+    parser.add_argument("--no-cache", action="store_true", help="parse and validate the config even if a compiled copy is cached")
+    parser.add_argument("--log-level", default="WARNING")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=args.log_level.upper())
+
+    fabric = ToolFabric(config_cache=False if args.no_cache else None)
+    try:
+        fabric.load_from_yaml(args.config)
+        fabric.setup()
+    finally:
+        # stop_all() clears start_report; keep what the report needs first
+        start_report = dict(fabric.start_report)
+        report = fabric.startup_report()
+        text = fabric.startup.format()
+        fabric.stop_all()
+    if args.json:
+        print(json.dumps(dict(report, start_report=start_report), indent=2))
+    else:
+        print(text)
+    return 0 if all(r["status"] in ("ready", "lazy") for r in start_report.values()) else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,250 @@
+import asyncio
+import threading
+import time
+import logging
+from collections import deque
+from concurrent.futures import Future, InvalidStateError
+from .codec import check_size
+
+logger = logging.getLogger(__name__)
+
+CHUNK_METHOD = "notifications/toolfabric/chunk"
+CREDIT_METHOD = "notifications/toolfabric/credit"
+STREAM_META = "toolfabric/stream"
+
+_END = object()
+_PENDING = object()
+
+class StreamCancelled(ConnectionError):
+    """The consumer abandoned a stream before it ended."""
+
+class ChunkStream:
+    """Chunks of one streamed result, fed by a transport thread and consumed by one reader.
+
+    Iterate it (`for` or `async for`) to receive chunks in order. Flow control is by credit:
+    the server may send `window` chunks up front, and `grant(n)` tells it n more were consumed
+    each time half the window has been read, so at most about one window is buffered here.
+    A server that never streams just answers; its result then arrives as the only chunk.
+    `result` holds the final response once the stream ends.
+    """
+    def __init__(self, name, window=16, idle_timeout=30):
+        self.name = name
+        self.window = max(1, window)
+        self.idle_timeout = idle_timeout
+        self.result = None
+        self.received = 0
+        self._grant = None
+        self._cancel = None
+        self._items = deque()
+        self._expected_seq = 0
+        self._consumed = 0  # Since the last grant
+        self._done = False
+        self._error = None
+        self._waiter = None  # Future for an async reader
+        self._callbacks = []
+        self._cond = threading.Condition()
+
+    def bind(self, grant=None, cancel=None):
+        """Transport hooks: grant(n) sends n credits, cancel() abandons the request."""
+        self._grant = grant
+        self._cancel = cancel
+
+    def follow(self, future):
+        """End the stream with the outcome of the request's response future."""
+        def done(f):
+            if f.cancelled():
+                self.fail(StreamCancelled(f"Stream {self.name} cancelled"))
+            elif f.exception() is not None:
+                self.fail(f.exception())
+            else:
+                self.finish(f.result())
+        future.add_done_callback(done)
+        if self._cancel is None:
+            self._cancel = future.cancel
+
+    def add_done_callback(self, fn):
+        """Call fn(error_or_None) once when the stream ends, however it ends."""
+        with self._cond:
+            if not self._done:
+                self._callbacks.append(fn)
+                return
+        fn(self._error)
+
+    # Producer side (transport threads)
+
+    def feed(self, seq, data):
+        with self._cond:
+            if self._done:
+                return
+            if seq is not None:
+                if seq < self._expected_seq:
+                    return  # Duplicate delivery
+                self._expected_seq = seq + 1
+            self._items.append(data)
+            self.received += 1
+            overrun = len(self._items) > 4 * self.window
+            self._wake()
+        if overrun:
+            self._abort(ConnectionError(f"Stream {self.name}: server sent more than {4 * self.window} unread chunks, "
+                                        f"ignoring flow control"))
+
+    def finish(self, result=None):
+        with self._cond:
+            if self._done:
+                return
+            self.result = result
+            if not self.received and result is not None:
+                self._items.append(result)  # Server did not stream: its answer is the one chunk
+            self._end(None)
+
+    def fail(self, error):
+        with self._cond:
+            if self._done:
+                return
+            self._end(error)
+
+    def _end(self, error):
+        self._done = True
+        self._error = error
+        self._wake()
+        callbacks, self._callbacks = self._callbacks, []
+        for fn in callbacks:
+            try:
+                fn(error)
+            except Exception as e:
+                logger.error(f"[ChunkStream:{self.name}] Done callback failed: {e}")
+
+    def _wake(self):
+        self._cond.notify_all()
+        waiter, self._waiter = self._waiter, None
+        if waiter is not None:
+            try:
+                waiter.set_result(None)
+            except InvalidStateError:
+                pass
+
+    # Consumer side
+
+    def _poll(self):
+        """Next chunk, _END, or _PENDING when nothing is available yet. Called with the lock held."""
+        if self._items:
+            self._consumed += 1
+            return self._items.popleft()
+        if self._done:
+            if self._error is not None:
+                raise self._error
+            return _END
+        return _PENDING
+
+    def _credit(self):
+        # Called without the lock; returns the credits to grant now, if any
+        with self._cond:
+            if self._done or self._grant is None or self._consumed < max(1, self.window // 2):
+                return 0
+            credit, self._consumed = self._consumed, 0
+            return credit
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        deadline = time.monotonic() + self.idle_timeout if self.idle_timeout else None
+        with self._cond:
+            while True:
+                item = self._poll()
+                if item is not _PENDING:
+                    break
+                remaining = deadline - time.monotonic() if deadline else None
+                if remaining is not None and remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+        if item is _PENDING:
+            self._timed_out()
+        if item is _END:
+            raise StopIteration
+        self._send_credit(self._credit())
+        return item
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        while True:
+            with self._cond:
+                item = self._poll()
+                if item is _PENDING:
+                    waiter = self._waiter = Future()
+            if item is not _PENDING:
+                break
+            try:
+                await asyncio.wait_for(asyncio.wrap_future(waiter), self.idle_timeout)
+            except asyncio.TimeoutError:
+                self._timed_out()
+        if item is _END:
+            raise StopAsyncIteration
+        credit = self._credit()
+        if credit:
+            # Granting may be a blocking write or POST; keep it off the event loop
+            asyncio.get_running_loop().run_in_executor(None, self._send_credit, credit)
+        return item
+
+    def _send_credit(self, credit):
+        if not credit:
+            return
+        try:
+            self._grant(credit)
+        except Exception as e:
+            logger.warning(f"[ChunkStream:{self.name}] Could not grant credit: {e}")
+
+    def _timed_out(self):
+        error = TimeoutError(f"Stream {self.name}: no chunk within {self.idle_timeout}s")
+        self._abort(error)
+        raise error
+
+    def cancel(self):
+        """Abandon the stream unless it already ended; the server is told to stop."""
+        self._abort(StreamCancelled(f"Stream {self.name} cancelled"))
+
+    def _abort(self, error):
+        with self._cond:
+            if self._done:
+                return
+            self._end(error)
+        cancel, self._cancel = self._cancel, None
+        if cancel is not None:
+            try:
+                cancel()
+            except Exception as e:
+                logger.debug(f"[ChunkStream:{self.name}] Cancel failed: {e}")
+
+    close = cancel
+
+def collect(chunks, max_bytes=None, what="result"):
+    """Assemble a chunk iterable into one value: str and bytes chunks are joined, lists
+    concatenated, anything else returned as a list of chunks. Raises PayloadTooLarge once
+    the str/bytes chunks exceed `max_bytes`."""
+    parts, size = [], 0
+    for chunk in chunks:
+        if isinstance(chunk, (str, bytes)):
+            size += len(chunk)
+            check_size(what, size, max_bytes)
+        parts.append(chunk)
+    return _join(parts)
+
+async def collect_async(chunks, max_bytes=None, what="result"):
+    parts, size = [], 0
+    async for chunk in chunks:
+        if isinstance(chunk, (str, bytes)):
+            size += len(chunk)
+            check_size(what, size, max_bytes)
+        parts.append(chunk)
+    return _join(parts)
+
+def _join(parts):
+    if parts and all(isinstance(p, str) for p in parts):
+        return "".join(parts)
+    if parts and all(isinstance(p, bytes) for p in parts):
+        return b"".join(parts)
+    if parts and all(isinstance(p, list) for p in parts):
+        return [item for part in parts for item in part]
+    return parts
@@ -1,57 +1,495 @@
-import yaml
+import os
+import copy
+import time
+import asyncio
 import logging
-from tool_factory import create_tool
-from threading import RLock
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from .catalog import CatalogEntry, ToolCatalog, selection_key
+from .config import FabricConfig, load_config, resolve_dependencies
+from .startup import StartupTimeline
+from .tool_factory import create_tool
+from .health import HealthScheduler
+from .metrics import REGISTRY, start_http_server
+from .sidecar import SidecarServer
+from . import tracing
+from threading import Event, Lock, RLock, Thread
 
 logger = logging.getLogger(__name__)
 
 class ToolFabric:
-    def __init__(self, config_path=None):
+    def __init__(self, config_path=None, config_cache=None):
+        # Copy-on-write snapshots: read without locking, replaced wholesale by setup()/reload()/stop_all()
         self.tool_instances = {}
         self.tools = {}
-        self._lock = RLock()
+        self.async_tools = {}
+        self.catalog = ToolCatalog()
+        self.start_report = {}
+        self._lock = RLock()  # Serializes lifecycle work only
+        self._report_lock = Lock()  # Start workers record status while _lock is held
+        self._tool_configs = {}  # name -> config the running instance was started from
+        self._agents = []  # (agent, selection) pairs kept in sync by reload()
+        self._watcher = None
         self.config_path = config_path
-        self.config = {}
+        self.config = FabricConfig.from_dict({})
+        # Where compiled configs are cached by file hash: None for the default directory, False for off
+        self.config_cache = config_cache
+        self.startup = StartupTimeline()
+        self.health_scheduler = HealthScheduler()
+        self._metrics_server = None
+        self.sidecar = None
+        self._tracing_cfg = None
         if config_path:
             self.load_from_yaml(config_path)
 
     def load_from_yaml(self, path):
-        with open(path, "r") as f:
-            self.config = yaml.safe_load(f)
+        with self.startup.span("load_config", detail=path):
+            self._apply_config(self._load(path))
         logger.info(f"Loaded config from {path}")
 
+    def _load(self, path):
+        return load_config(path, cache_dir=self.config_cache, timeline=self.startup)
+
+    def _apply_config(self, config):
+        self.config = FabricConfig.from_dict(config) if isinstance(config, dict) else config
+        health_cfg = self.config.get("health", {})
+        # Takes effect the next time the scheduler's pool starts
+        self.health_scheduler.workers = health_cfg.get("workers", self.health_scheduler.workers)
+        self.health_scheduler.jitter = health_cfg.get("jitter", self.health_scheduler.jitter)
+        tracing_cfg = self.config.get("tracing")
+        if tracing_cfg != self._tracing_cfg:
+            if tracing_cfg:
+                tracing.configure_from_config(tracing_cfg)
+            else:
+                tracing.configure(enabled=False)
+            self._tracing_cfg = tracing_cfg
+
     def setup(self):
+        """Start all configured tools concurrently, honoring `depends_on` ordering.
+
+        Tools whose dependencies are satisfied are started on a bounded worker pool. A tool that
+        fails to start is reported in `start_report` and its dependents are skipped; the rest
+        of the fabric keeps starting. Tools with `start: lazy` are only registered here and
+        count as started for `depends_on`. Calling it again while tools are running is a no-op;
+        use reload() to apply config changes or stop_all() first.
+        """
+        if self.tool_instances:
+            logger.warning("[ToolFabric] Already set up; use reload() to apply config changes")
+            return self.tools
+        cfgs = self._tool_cfgs(self.config)
+        deps = self._resolve_dependencies(cfgs)
+        t0 = time.monotonic()
+        metrics_cfg = self.config.get("metrics", {})
+        if metrics_cfg.get("prometheus_port") is not None and self._metrics_server is None:
+            self.serve_metrics(metrics_cfg["prometheus_port"], metrics_cfg.get("host", "127.0.0.1"))
+
         with self._lock:
-            for cfg in self.config.get("tools", []):
-                name = cfg["name"]
-                instance = create_tool(cfg)
-                instance.start()
-                self.tool_instances[name] = instance
-                self.tools[name] = instance.to_tool()
-                logger.info(f"[ToolFabric] Loaded tool: {name}")
+            if self.tool_instances:
+                return self.tools  # A concurrent setup() got here first
+            self._publish(cfgs, self._start_tools(cfgs, deps, list(cfgs)))
+        sidecar_cfg = dict(self.config.get("sidecar") or {})
+        if sidecar_cfg.get("socket") and self.sidecar is None:
+            self.serve_sidecar(sidecar_cfg.pop("socket"), **sidecar_cfg)
+        logger.info(f"[ToolFabric] Setup finished in {time.monotonic() - t0:.2f}s: "
+                    f"{sum(1 for r in self.start_report.values() if r['status'] in ('ready', 'degraded'))}/{len(cfgs)} tools started, "
+                    f"{sum(1 for r in self.start_report.values() if r['status'] == 'lazy')} lazy")
+        reload_cfg = self.config.get("reload", {})
+        if reload_cfg.get("watch") and self.config_path:
+            self.watch(reload_cfg.get("interval", 2.0))
         return self.tools
 
-    def attach_all_to_agent(self, agent):
+    def reload(self, path=None):
+        """Re-read the config file and apply only what changed.
+
+        Removed tools are stopped, new tools started and tools whose config changed restarted;
+        unchanged tools keep their processes and connections. The new tool maps are published
+        as one snapshot after all starts finished, so callers see either the old or the new
+        set, never a mix. Returns the names that were added, removed, restarted and failed.
+        """
+        path = path or self.config_path
+        config = self._load(path)  # Validated as a whole; a bad file raises before anything is touched
+        cfgs = self._tool_cfgs(config)
+        deps = self._resolve_dependencies(cfgs)  # Reject a bad config before touching anything
+
         with self._lock:
-            for name, func in list(self.tools.items()):
-                self._attach_single_to_agent(name, func, agent)
-        logger.info(f"[ToolFabric] Attached {len(self.tools)} tools to agent")
+            self.config_path = path
+            self._apply_config(config)
+            running = self._tool_configs
+            removed = [n for n in running if n not in cfgs]
+            restarted = [n for n in cfgs if n in running and cfgs[n] != running[n]]
+            added = [n for n in cfgs if n not in running]  # Includes tools that failed before
+            unchanged = {n: self.tool_instances[n] for n in cfgs if n in running and n not in restarted}
 
-    def _attach_single_to_agent(self, name, func, agent):
-        try:
-            if hasattr(agent, 'attach_tool'):
-                agent.attach_tool(name, func)
-            elif hasattr(agent, 'tools'):
-                agent.tools[name] = func
+            for name in removed + restarted:
+                # Stop before starting the replacement: it may need the same port
+                self._stop_tool(name, self.tool_instances[name])
+            started = self._start_tools(cfgs, deps, added + restarted, available=set(unchanged))
+            self._publish(cfgs, dict(unchanged, **started))
+            self.start_report = {n: r for n, r in self.start_report.items() if n in cfgs}
+
+            result = {
+                "added": [n for n in added if n in started],
+                "removed": removed,
+                "restarted": [n for n in restarted if n in started],
+                "failed": [n for n in added + restarted if n not in started],
+            }
+            for agent, selection in self._agents:
+                for name in removed + result["failed"]:
+                    self._detach_single_from_agent(name, agent)
+                for name in started:
+                    entry = self.catalog.get(name)
+                    if entry.matches(*selection):
+                        self._attach_single_to_agent(name, entry.tool, agent)
+                    else:
+                        self._detach_single_from_agent(name, agent)  # Its tags may have changed
+        changes = ", ".join(f"{k}={v}" for k, v in result.items() if v)
+        logger.info(f"[ToolFabric] Reloaded {path}: {changes or 'no changes'}")
+        return result
+
+    async def reload_async(self, path=None):
+        return await asyncio.get_running_loop().run_in_executor(None, self.reload, path)
+
+    def watch(self, interval=2.0):
+        """Poll the config file every `interval` seconds and reload() when it changes."""
+        if self._watcher is not None:
+            return
+        stop = Event()
+        thread = Thread(target=self._watch_loop, args=(self.config_path, interval, stop), name="toolfabric-watch", daemon=True)
+        self._watcher = (thread, stop)
+        thread.start()
+        logger.info(f"[ToolFabric] Watching {self.config_path} for changes")
+
+    def stop_watching(self):
+        watcher, self._watcher = self._watcher, None
+        if watcher is not None:
+            thread, stop = watcher
+            stop.set()
+            thread.join(timeout=5)
+
+    def _watch_loop(self, path, interval, stop):
+        last = _file_signature(path)
+        while not stop.wait(interval):
+            current = _file_signature(path)
+            if current == last or current is None:
+                continue
+            last = current
+            try:
+                self.reload(path)
+            except Exception as e:
+                # A half-written or invalid file: keep serving the running config
+                logger.error(f"[ToolFabric] Reload of {path} failed, keeping the running config: {e}")
+
+    def _tool_cfgs(self, config):
+        return {cfg.name: cfg for cfg in config.tools}
+
+    def _start_tools(self, cfgs, deps, names, available=()):
+        """Start `names` concurrently in `depends_on` order on a bounded pool.
+
+        Dependencies outside `names` must be in `available`. Returns {name: instance} for
+        the tools that started; failures and skips are recorded in `start_report`.
+        """
+        max_workers = self.config.get("setup", {}).get("max_workers", 8)
+        batch = set(names)
+        pending = {n: deps[n] & batch for n in names}
+        started = {}
+        running = {}
+        done = set()
+        with self.startup.span("start_tools", detail=f"{len(names)} tool(s)"), \
+                ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="toolfabric-setup") as pool:
+            while pending or running:
+                for name in [n for n, d in pending.items() if d <= done]:
+                    failed = [d for d in deps[name] if d not in started and d not in available]
+                    del pending[name]
+                    if failed:
+                        self._record_start(name, "skipped", 0.0, f"dependency not started: {', '.join(failed)}")
+                        done.add(name)
+                        continue
+                    running[pool.submit(self._start_tool, cfgs[name])] = name
+                if not running:
+                    break
+                finished, _ = wait(list(running), return_when=FIRST_COMPLETED)
+                for future in finished:
+                    name = running.pop(future)
+                    done.add(name)
+                    if future.result() is not None:
+                        started[name] = future.result()
+                        self._tool_configs[name] = copy.deepcopy(cfgs[name])
+        return started
+
+    def _publish(self, cfgs, instances):
+        """Swap in new tool maps and catalog in config order. Unchanged tools keep their functions and entries."""
+        tools, async_tools, entries = {}, {}, []
+        for name in cfgs:
+            instance = instances.get(name)
+            if instance is None:
+                continue
+            if self.tool_instances.get(name) is instance and name in self.tools:
+                tools[name], async_tools[name] = self.tools[name], self.async_tools[name]
             else:
-                logger.warning(f"Agent {agent} lacks attach_tool or tools dict")
+                if instance.managed:
+                    tools[name], async_tools[name] = instance.to_lazy_tool(), instance.to_lazy_async_tool()
+                else:
+                    tools[name], async_tools[name] = instance.to_tool(), instance.to_async_tool()
+                if instance.admission is not None:
+                    # Outermost, so refused calls never start a lazy tool
+                    tools[name] = instance.to_admitted_tool(tools[name])
+                    async_tools[name] = instance.to_admitted_async_tool(async_tools[name])
+            # Batch and streaming entry points: fabric.tools[name].batch([...]), .stream(...)
+            tools[name].batch = instance.call_many
+            async_tools[name].batch = instance.call_many_async
+            tools[name].stream = instance.stream
+            async_tools[name].stream = instance.astream
+            entries.append(self._catalog_entry(name, instance, tools[name], async_tools[name]))
+        self.tool_instances = {n: instances[n] for n in tools}
+        self.tools = tools
+        self.async_tools = async_tools
+        self.catalog = ToolCatalog(entries)
+
+    def _catalog_entry(self, name, instance, tool, async_tool):
+        entry = self.catalog.get(name)
+        if entry is not None and entry.tool is tool:
+            return entry
+        capabilities = list(instance.config.get("capabilities", []))
+        if instance.tool_type:
+            capabilities.append(instance.tool_type)
+        return CatalogEntry(name, tool, async_tool, instance.declaration, instance.config.get("tags", []), capabilities)
+
+    def _stop_tool(self, name, instance):
+        self._tool_configs.pop(name, None)
+        try:
+            instance.close()
         except Exception as e:
-            logger.error(f"Failed to attach {name} to agent: {e}")
+            logger.error(f"[ToolFabric] Error stopping tool {name}: {e}")
+
+    async def setup_async(self):
+        """Async counterpart of setup(); returns `async_tools`, a map of coroutine functions."""
+        # Startup already runs on setup()'s own pool; keep it off the event loop
+        await asyncio.get_running_loop().run_in_executor(None, self.setup)
+        return self.async_tools
+
+    def _resolve_dependencies(self, cfgs):
+        return resolve_dependencies(cfgs)
+
+    def _start_tool(self, cfg):
+        name = cfg["name"]
+        t0 = time.monotonic()
+        try:
+            # The instance may fill in defaults; keep the loaded config pristine for reload() diffs
+            with self.startup.span("create_tool", tool=name):
+                instance = create_tool(copy.deepcopy(cfg))
+            instance.scheduler = self.health_scheduler
+            instance.timeline = self.startup
+            # Lazy tools are registered now and started by their first call
+            ready = None if instance.start_mode == "lazy" else instance.ensure_started()
+        except Exception as e:
+            logger.error(f"[ToolFabric] Failed to start tool {name}: {e}")
+            self._record_start(name, "failed", time.monotonic() - t0, str(e))
+            return None
+
+        duration = time.monotonic() - t0
+        if ready is None:
+            self._record_start(name, "lazy", duration)
+            logger.info(f"[ToolFabric] Registered lazy tool: {name}")
+        elif ready:
+            self._record_start(name, "ready", duration)
+            logger.info(f"[ToolFabric] Loaded tool: {name} ({duration:.2f}s)")
+        else:
+            self._record_start(name, "degraded", duration, "readiness probe timed out")
+            logger.warning(f"[ToolFabric] Loaded tool: {name} ({duration:.2f}s) but it is not ready yet")
+        return instance
+
+    def _record_start(self, name, status, duration, error=None):
+        with self._report_lock:
+            self.start_report[name] = {"status": status, "duration": duration, "error": error}
+
+    def call_many(self, tool_name, items):
+        """Call one tool for many inputs in a single batch; results come back in item order.
+
+        Items are keyword-argument dicts, positional-argument lists/tuples, or a single
+        positional value. Internal tools with a `batch_function` make one vectorized call,
+        MCP tools send one JSON-RPC batch; errors are reported per item.
+        """
+        instance = self.tool_instances.get(tool_name)
+        if instance is None:
+            raise KeyError(f"Unknown tool: {tool_name}")
+        return instance.call_many(items)
+
+    async def call_many_async(self, tool_name, items):
+        instance = self.tool_instances.get(tool_name)
+        if instance is None:
+            raise KeyError(f"Unknown tool: {tool_name}")
+        return await instance.call_many_async(items)
+
+    def stream(self, tool_name, *args, **kwargs):
+        """Iterate over one call's result in chunks as the tool produces them (see BaseTool.stream)."""
+        instance = self.tool_instances.get(tool_name)
+        if instance is None:
+            raise KeyError(f"Unknown tool: {tool_name}")
+        return instance.stream(*args, **kwargs)
+
+    def astream(self, tool_name, *args, **kwargs):
+        """Async iterator over one call's result chunks: `async for chunk in fabric.astream(...)`."""
+        instance = self.tool_instances.get(tool_name)
+        if instance is None:
+            raise KeyError(f"Unknown tool: {tool_name}")
+        return instance.astream(*args, **kwargs)
+
+    def invalidate(self, tool_name=None, **key_args):
+        """Drop cached results for one tool (or all tools). With key arguments, only that entry."""
+        instances = self.tool_instances
+        names = [tool_name] if tool_name else list(instances)
+        for name in names:
+            cache = getattr(instances.get(name), "cache", None)
+            if cache is None:
+                if tool_name:
+                    logger.warning(f"[ToolFabric] Tool {name} has no result cache")
+                continue
+            cache.invalidate(cache.make_key(key_args) if key_args else None)
+
+    def cache_stats(self):
+        instances = self.tool_instances
+        return {name: inst.cache.stats() for name, inst in instances.items() if getattr(inst, "cache", None)}
+
+    def executor_stats(self):
+        instances = self.tool_instances
+        return {name: inst.executor.stats() for name, inst in instances.items() if getattr(inst, "executor", None)}
+
+    def admission_stats(self):
+        instances = self.tool_instances
+        return {name: inst.admission.stats() for name, inst in instances.items() if inst.admission}
+
+    def replica_stats(self):
+        instances = self.tool_instances
+        return {name: inst.replica_stats() for name, inst in instances.items() if getattr(inst, "replica_policy", None)}
+
+    def output_stats(self):
+        instances = self.tool_instances
+        return {name: inst.output.stats() for name, inst in instances.items() if getattr(inst, "output", None)}
+
+    def output_tail(self, tool_name, lines=50):
+        """Recent stdout/stderr lines of a tool's subprocess, for diagnosing crashes and hangs."""
+        instance = self.tool_instances.get(tool_name)
+        if instance is None:
+            raise KeyError(f"Unknown tool: {tool_name}")
+        return instance.output_tail(lines) if hasattr(instance, "output_tail") else []
+
+    def startup_report(self):
+        """Where startup time went: per-phase and per-tool durations plus every recorded span.
+
+        Phases: load_config (read, cache_load, parse, compile, cache_store), start_tools,
+        create_tool, start (containing import or spawn, connect and ready). Lazy tools
+        record their start when the first call triggers it.
+        """
+        return self.startup.report()
+
+    def metrics(self):
+        """In-process snapshot of call counts, errors, in-flight gauges, latency histograms and connection state."""
+        return REGISTRY.snapshot()
+
+    def serve_metrics(self, port, host="127.0.0.1"):
+        """Expose metrics in Prometheus text format on http://host:port/metrics."""
+        self._metrics_server = start_http_server(port, host)
+        return self._metrics_server
+
+    def serve_sidecar(self, path=None, **options):
+        """Serve this fabric's tools to other local processes on a Unix socket (see src.sidecar).
+
+        Options are SidecarServer's: workers, max_payload_kb, codec, mode, stream_timeout.
+        """
+        if path:
+            options["path"] = path
+        self.sidecar = SidecarServer(self, **options).start()
+        return self.sidecar
+
+    def select(self, names=None, tags=None, capabilities=None):
+        """Catalog view of the listed tools carrying any of `tags` and all of `capabilities`.
+
+        The view (`tools`, `async_tools`, `declarations`) is cached for the current catalog,
+        so per-session agents over the same filter share it.
+        """
+        return self.catalog.select(names, tags, capabilities)
+
+    def declarations(self, names=None, tags=None, capabilities=None):
+        """Function declarations ({name, description, parameters}) of the selected tools, built once per tool."""
+        return self.catalog.select(names, tags, capabilities).declarations
+
+    def attach_all_to_agent(self, agent, names=None, tags=None, capabilities=None):
+        """Attach the selected tools (all by default) to `agent`; reload() keeps it in sync."""
+        view = self.catalog.select(names, tags, capabilities)
+        selection = selection_key(names, tags, capabilities)
+        with self._lock:
+            attach_tools(agent, view.tools)
+            self._agents = [(a, s) for a, s in self._agents if a is not agent] + [(agent, selection)]
+        logger.info(f"[ToolFabric] Attached {len(view)} tools to agent")
+
+    def _attach_single_to_agent(self, name, func, agent):
+        attach_tool(agent, name, func)
+
+    def _detach_single_from_agent(self, name, agent):
+        detach_tool(agent, name)
 
     def stop_all(self):
+        self.stop_watching()
         with self._lock:
-            for instance in list(self.tool_instances.values()):
-                instance.stop()
-            self.tool_instances.clear()
-            self.tools.clear()
+            instances = self.tool_instances
+            self.tool_instances, self.tools, self.async_tools = {}, {}, {}
+            self.catalog = ToolCatalog()
+            self.start_report = {}
+            self._agents = []
+            if self.sidecar is not None:
+                self.sidecar.stop()  # Before the tools, so workers get errors rather than hangs
+                self.sidecar = None
+            for name, instance in instances.items():
+                self._stop_tool(name, instance)
+            self._tool_configs = {}
+            self.health_scheduler.shutdown()
+            if self._tracing_cfg:
+                tracing.configure(enabled=False)  # Flushes the exporter
+                self._tracing_cfg = None
+            if self._metrics_server is not None:
+                self._metrics_server.shutdown()
+                self._metrics_server.server_close()
+                self._metrics_server = None
             logger.info("[ToolFabric] All tools stopped")
+
+    async def stop_all_async(self):
+        await asyncio.get_running_loop().run_in_executor(None, self.stop_all)
+
+def attach_tools(agent, tools):
+    """Attach a {name: function} mapping, deciding once per agent how it takes tools."""
+    if hasattr(agent, 'attach_tool'):
+        for name, func in tools.items():
+            attach_tool(agent, name, func)
+    elif hasattr(agent, 'tools'):
+        try:
+            agent.tools.update(tools)
+        except Exception as e:
+            logger.error(f"Failed to attach {len(tools)} tools to agent: {e}")
+    else:
+        logger.warning(f"Agent {agent} lacks attach_tool or tools dict")
+
+def attach_tool(agent, name, func):
+    try:
+        if hasattr(agent, 'attach_tool'):
+            agent.attach_tool(name, func)
+        elif hasattr(agent, 'tools'):
+            agent.tools[name] = func
+        else:
+            logger.warning(f"Agent {agent} lacks attach_tool or tools dict")
+    except Exception as e:
+        logger.error(f"Failed to attach {name} to agent: {e}")
+
+def detach_tool(agent, name):
+    try:
+        if hasattr(agent, 'detach_tool'):
+            agent.detach_tool(name)
+        elif isinstance(getattr(agent, 'tools', None), dict):
+            agent.tools.pop(name, None)
+    except Exception as e:
+        logger.error(f"Failed to detach {name} from agent: {e}")
+
+def _file_signature(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
@@ -1,10 +1,36 @@
-from tools.mcp_based_tool import MCPBasedTool
-from tools.internal_function_tool import InternalFunctionTool
+from .tools.mcp_based_tool import MCPBasedTool
+from .tools.internal_function_tool import InternalFunctionTool
+
+_TOOL_TYPES = {}  # type name -> (tool class, matches(config) or None), in registration order
+
+def register_tool_type(name, cls, matches=None):
+    """Build tools with `type: name` as `cls(tool_name, config)`.
+
+    `matches(config)` lets configs without a `type` key select this type too; types are
+    tried in registration order, built-ins first. Re-registering a name replaces it.
+    """
+    _TOOL_TYPES[name] = (cls, matches)
+
+def tool_types():
+    return list(_TOOL_TYPES)
+
+def tool_type_for(tool_cfg):
+    """Type name for a tool config: its `type`, else the first registered type that matches."""
+    kind = tool_cfg.get("type")
+    if kind is not None:
+        if kind not in _TOOL_TYPES:
+            raise ValueError(f"Tool '{tool_cfg['name']}': unknown type {kind!r}; registered: {', '.join(_TOOL_TYPES)}")
+        return kind
+    for kind, (_, matches) in _TOOL_TYPES.items():
+        if matches is not None and matches(tool_cfg):
+            return kind
+    raise ValueError(f"Tool '{tool_cfg['name']}': needs a 'type', or either 'command' or 'module' and 'function'")
 
 def create_tool(tool_cfg):
-    if "command" in tool_cfg:
-        return MCPBasedTool(tool_cfg["name"], tool_cfg)
-    elif "module" in tool_cfg and "function" in tool_cfg:
-        return InternalFunctionTool(tool_cfg["name"], tool_cfg)
-    else:
-        raise ValueError(f"Unknown tool type for {tool_cfg['name']}")
+    kind = tool_type_for(tool_cfg)
+    tool = _TOOL_TYPES[kind][0](tool_cfg["name"], tool_cfg)
+    tool.tool_type = kind
+    return tool
+
+register_tool_type("mcp", MCPBasedTool, lambda cfg: "command" in cfg)
+register_tool_type("internal", InternalFunctionTool, lambda cfg: "module" in cfg and "function" in cfg)
@@ -1,32 +1,275 @@
+import asyncio
+import functools
 import importlib
-from ..base_tool import BaseTool
+import inspect
+import time
+from threading import Thread
+from ..base_tool import BaseTool, split_call
+from ..result_cache import ResultCache
+from ..publisher import BatchPublisher
+from ..executors import create_executor
+from ..streaming import collect, collect_async
+from .. import tracing
 import logging
 
 logger = logging.getLogger(__name__)
 
+_END = object()
+_JSON_TYPES = {str: "string", int: "integer", float: "number", bool: "boolean", list: "array", dict: "object"}
+
 class InternalFunctionTool(BaseTool):
     def start(self):
         try:
-            module = importlib.import_module(self.config["module"])
+            with self._span("import", detail=self.config["module"]):
+                module = importlib.import_module(self.config["module"])
             self.function = getattr(module, self.config["function"])
+            # Optional vectorized variant: takes a list of call items, returns a list of results
+            batch_name = self.config.get("batch_function")
+            self.batch_function = getattr(module, batch_name) if batch_name else None
         except (ImportError, AttributeError) as e:
             raise ValueError(f"Failed to load module/function {self.config['module']}.{self.config['function']}: {e}")
+        self.executor = create_executor(self.name, self.config, self.function, self.batch_function)
+        if self.executor is not None:
+            if inspect.iscoroutinefunction(self.function):
+                raise ValueError(f"Tool {self.name}: coroutine functions only support the inline executor")
+            self.executor.start()
+        cache_cfg = self.config.get("cache")
+        self.cache = ResultCache.from_config(cache_cfg) if cache_cfg and cache_cfg.get("enabled", True) else None
+        self.publisher = None
         super().start()
+        if self.mcp_clients:
+            self.publisher = BatchPublisher.from_config(self.name, self.mcp_clients, self.config.get("publish", {}))
         logger.info(f"[InternalFunctionTool:{self.name}] Ready")
 
     def stop(self):
+        # Flush queued results before the clients disconnect
+        if getattr(self, "publisher", None):
+            self.publisher.stop()
         super().stop()
+        if getattr(self, "executor", None):
+            self.executor.shutdown()
+
+    def _target(self):
+        # Lazy tools have not imported their function yet; importing is cheap next to starting them
+        function = getattr(self, "function", None)
+        if function is None:
+            function = getattr(importlib.import_module(self.config["module"]), self.config["function"])
+        return function
+
+    def _describe(self):
+        doc = inspect.getdoc(self._target())
+        return doc.split("\n\n")[0] if doc else super()._describe()
+
+    def _parameters(self):
+        properties, required = {}, []
+        for param in inspect.signature(self._target()).parameters.values():
+            if param.kind in (param.VAR_POSITIONAL, param.VAR_KEYWORD):
+                continue
+            schema = {}
+            if param.annotation in _JSON_TYPES:
+                schema["type"] = _JSON_TYPES[param.annotation]
+            if param.default is param.empty:
+                required.append(param.name)
+            elif isinstance(param.default, (str, int, float, bool)):
+                schema["default"] = param.default
+            properties[param.name] = schema
+        parameters = {"type": "object", "properties": properties}
+        if required:
+            parameters["required"] = required
+        return parameters
+
+    def _attach_mcp_clients(self, connect=True):
+        # Observers connect in the background so an unreachable one cannot hold up startup
+        super()._attach_mcp_clients(connect=False)
+        if self.mcp_clients:
+            Thread(target=self._connect_observers, args=(list(self.mcp_clients),),
+                   name=f"{self.name}-observers", daemon=True).start()
+
+    def _connect_observers(self, clients):
+        for client in clients:
+            if self._stop_event.is_set():
+                return
+            if not client.connected:
+                client.connect()
+
+    def _readiness_clients(self):
+        # Clients here only observe published results; the function works without them, and the
+        # health checks keep reconnecting them
+        return []
+
+    def _call(self, *args, **kwargs):
+        with tracing.span("function", tool=self.name, executor=self.executor.kind if self.executor else "inline"):
+            if self.executor is None:
+                result = self.function(*args, **kwargs)
+            else:
+                result = self.executor.submit(*args, **kwargs).result()
+            # A plain call of a streaming function gets the assembled result
+            if inspect.isgenerator(result):
+                return collect(result, self.max_result)
+            if inspect.isasyncgen(result):
+                raise TypeError(f"{self.config['function']} is an async generator; call the tool's async function")
+            return result
+
+    def _stream(self, *args, **kwargs):
+        # The call goes through the executor as in _call; a generator it returns is driven by
+        # whoever iterates it, on the consumer's thread
+        started = time.monotonic()
+        self.metrics.begin()
+        ok = False
+        try:
+            with tracing.span("function", tool=self.name, executor=self.executor.kind if self.executor else "inline"):
+                if self.executor is None:
+                    result = self.function(*args, **kwargs)
+                else:
+                    result = self.executor.submit(*args, **kwargs).result()
+            if inspect.isasyncgen(result):
+                raise TypeError(f"{self.config['function']} is an async generator; use astream()")
+            if inspect.isgenerator(result):
+                yield from result
+            else:
+                yield result
+            ok = True
+        except GeneratorExit:
+            ok = True  # Consumer stopped early
+            raise
+        finally:
+            self.metrics.end(time.monotonic() - started, ok=ok)
+
+    async def _astream(self, *args, **kwargs):
+        started = time.monotonic()
+        self.metrics.begin()
+        ok = False
+        loop = asyncio.get_running_loop()
+        try:
+            if inspect.iscoroutinefunction(self.function):
+                result = await self.function(*args, **kwargs)
+            elif self.executor is not None:
+                result = await asyncio.wrap_future(self.executor.submit(*args, **kwargs))
+            elif inspect.isgeneratorfunction(self.function) or inspect.isasyncgenfunction(self.function):
+                result = self.function(*args, **kwargs)  # Only creates the generator
+            else:
+                result = await loop.run_in_executor(None, functools.partial(self.function, *args, **kwargs))
+            if inspect.isasyncgen(result):
+                async for chunk in result:
+                    yield chunk
+            elif inspect.isgenerator(result):
+                # Each step may block; take them on the executor, not the event loop
+                while True:
+                    chunk = await loop.run_in_executor(None, next, result, _END)
+                    if chunk is _END:
+                        break
+                    yield chunk
+            else:
+                yield result
+            ok = True
+        except GeneratorExit:
+            ok = True
+            raise
+        finally:
+            self.metrics.end(time.monotonic() - started, ok=ok)
+
+    def _run_batch(self, items):
+        with tracing.span("batch_function", tool=self.name, items=len(items)):
+            if self.executor is None:
+                return self.batch_function(items)
+            return self.executor.submit_batch(items).result()
+
+    def _call_many(self, items):
+        if self.batch_function is None:
+            return super()._call_many(items)
+        with tracing.span("tool.call_many", tool=self.name, items=len(items)):
+            return self._call_batch(items)
+
+    def _call_batch(self, items):
+        started = time.monotonic()
+        self.metrics.begin()
+        if self.cache is None:
+            try:
+                results = list(self._run_batch(items))
+                if len(results) != len(items):
+                    raise ValueError(f"batch returned {len(results)} results for {len(items)} items")
+            except Exception as e:
+                results = [e] * len(items)
+        else:
+            keys = [self.cache.key_for_call(self.function, *split_call(item)) for item in items]
+            results = self.cache.get_or_call_many(keys, lambda indexes: self._run_batch([items[i] for i in indexes]))
+
+        errors = 0
+        for i, result in enumerate(results):
+            if isinstance(result, Exception):
+                errors += 1
+                results[i] = {"error": str(result)}
+            elif self.publisher:
+                self.publisher.publish(result)
+        if errors:
+            logger.error(f"[InternalFunctionTool:{self.name}] Batch of {len(items)}: {errors} item(s) failed")
+        self.metrics.end(time.monotonic() - started, ok=not errors)
+        return results
+
+    async def _call_many_async(self, items):
+        if self.batch_function is None:
+            return await super()._call_many_async(items)
+        return await asyncio.get_running_loop().run_in_executor(None, tracing.in_context(self._call_many, items))
 
     def to_tool(self):
         def tool(*args, **kwargs):
-            try:
-                result = self.function(*args, **kwargs)
-                for client in self.mcp_clients:
-                    client.send({"result": result})
+            started = time.monotonic()
+            self.metrics.begin()
+            with tracing.span("tool.call", tool=self.name) as span:
+                try:
+                    if self.cache is None:
+                        result = self._call(*args, **kwargs)
+                    else:
+                        key = self.cache.key_for_call(self.function, args, kwargs)
+                        result = self.cache.get_or_call(key, functools.partial(self._call, *args, **kwargs))
+                    if self.publisher:
+                        self.publisher.publish(result)
+                    self.metrics.end(time.monotonic() - started)
+                    return result
+                except Exception as e:
+                    span.fail(e)
+                    self.metrics.end(time.monotonic() - started, ok=False)
+                    logger.error(f"[InternalFunctionTool:{self.name}] Execution error: {e}")
+                    return {"error": str(e)}
+        return tool
+
+    def to_async_tool(self):
+        is_coroutine = inspect.iscoroutinefunction(self.function)
+        executor_kind = self.executor.kind if self.executor else "inline"
+        async def call(*args, **kwargs):
+            with tracing.span("function", tool=self.name, executor=executor_kind):
+                loop = asyncio.get_running_loop()
+                if is_coroutine:
+                    result = await self.function(*args, **kwargs)
+                elif self.executor is not None:
+                    result = await asyncio.wrap_future(self.executor.submit(*args, **kwargs))
+                else:
+                    result = await loop.run_in_executor(None, functools.partial(self.function, *args, **kwargs))
+                if inspect.isasyncgen(result):
+                    return await collect_async(result, self.max_result)
+                if inspect.isgenerator(result):
+                    return await loop.run_in_executor(None, collect, result, self.max_result)
                 return result
-            except Exception as e:
-                logger.error(f"[InternalFunctionTool:{self.name}] Execution error: {e}")
-                return {"error": str(e)}
+
+        async def tool(*args, **kwargs):
+            started = time.monotonic()
+            self.metrics.begin()
+            with tracing.span("tool.call", tool=self.name) as span:
+                try:
+                    if self.cache is None:
+                        result = await call(*args, **kwargs)
+                    else:
+                        key = self.cache.key_for_call(self.function, args, kwargs)
+                        result = await self.cache.get_or_call_async(key, functools.partial(call, *args, **kwargs))
+                    if self.publisher:
+                        self.publisher.publish(result)
+                    self.metrics.end(time.monotonic() - started)
+                    return result
+                except Exception as e:
+                    span.fail(e)
+                    self.metrics.end(time.monotonic() - started, ok=False)
+                    logger.error(f"[InternalFunctionTool:{self.name}] Execution error: {e}")
+                    return {"error": str(e)}
         return tool
 
     def _health_check_internal(self):
@@ -1,45 +1,584 @@
+import asyncio
+import itertools
+import os
 import subprocess
-from ..base_tool import BaseTool
+import time
+from concurrent.futures import FIRST_COMPLETED, wait
+from threading import Lock
+from ..base_tool import BaseTool, split_call
+from ..codec import DEFAULT_MAX_PAYLOAD_KB, PayloadTooLarge, get_codec, kb_limit
+from ..health import get_default_scheduler
+from ..mcp_client import StdioChannel, error_result, expire, server_answered, wait_result
+from ..metrics import TOOL_REPLICAS, TOOL_STARTS
+from ..process_output import OutputPump
+from ..replicas import Replica, ReplicaJob, ReplicaPolicy
+from .. import tracing
 import logging
 
 logger = logging.getLogger(__name__)
 
 class MCPBasedTool(BaseTool):
+    def __init__(self, name, config):
+        super().__init__(name, config)
+        self.replica_policy = ReplicaPolicy.from_config(config.get("replicas"))
+        # JSON-RPC batches are not part of MCP 2024-11-05; only servers known to accept them get arrays
+        self.batch = bool(config.get("batch", False))
+        self.replicas = []  # Replaced, never mutated in place: call paths read it without a lock
+        self._replica_lock = Lock()
+        self._replica_failures = {}
+        self._low_load_since = None
+        self._rotation = itertools.count()
+
+    @property
+    def process(self):
+        return self.replicas[0].process if self.replicas else None
+
+    @property
+    def processes(self):
+        return [r.process for r in self.replicas if r.process]
+
+    @property
+    def output(self):
+        return self.replicas[0].output if self.replicas else None
+
     def start(self):
-        cmd = self.config.get("command", [])
-        self.process = None
-        if cmd:
-            try:
-                logger.info(f"[MCPBasedTool:{self.name}] Starting process: {' '.join(cmd)}")
-                self.process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-            except Exception as e:
-                raise RuntimeError(f"Failed to start process for {self.name}: {e}")
+        self._replica_failures = {}
+        self._low_load_since = None
+        count = self.replica_policy.min if self.replica_policy else 1
+        self.replicas = []
+        for index in range(count):
+            self.replicas = self.replicas + [self._spawn_replica(index)]
         super().start()
+        if self.replica_policy:
+            TOOL_REPLICAS.labels(self.name).set(count)
+            job = ReplicaJob(self, self.replica_policy.check_interval)
+            (self.scheduler or get_default_scheduler()).schedule(job, delay=self.replica_policy.check_interval)
+            self._health_jobs.append(job)
         logger.info(f"[MCPBasedTool:{self.name}] Ready")
 
     def stop(self):
-        super().stop()
-        if getattr(self, "process", None) and self.process.poll() is None:
-            self.process.terminate()
-            try:
-                self.process.wait(timeout=5)
-            except subprocess.TimeoutExpired:
-                self.process.kill()
+        super().stop()  # Cancels the replica job and disconnects every client
+        # Stopped replicas stay listed until the next start so their output tail can be read
+        for replica in self.replicas:
+            replica.stop(disconnect=False)
+        if self.replica_policy:
+            TOOL_REPLICAS.labels(self.name).set(0)
         logger.info(f"[MCPBasedTool:{self.name}] Stopped")
 
+    def _replica_name(self, index, name=None):
+        name = name or self.name
+        return f"{name}/{index}" if self.replica_policy else name
+
+    def _replica_port(self, cfg, index):
+        return cfg["port"] + index * self.replica_policy.port_step if self.replica_policy else cfg["port"]
+
+    def _spawn_replica(self, index):
+        """Start one copy of the command (no clients yet)."""
+        replica = Replica(index, self._replica_name(index))
+        cmd = self.config.get("command", [])
+        if not cmd:
+            return replica
+        # {replica} and {port} in the command (and MCP_REPLICA / MCP_PORT in its environment)
+        # let each copy listen on its own port
+        ports = [self._replica_port(c, index) for c in self.config.get("mcp_clients", []) if "port" in c]
+        port = str(ports[0]) if ports else ""
+        cmd = [arg.replace("{replica}", str(index)).replace("{port}", port) for arg in cmd]
+        env = dict(os.environ, MCP_REPLICA=str(index), MCP_PORT=port)
+        try:
+            logger.info(f"[MCPBasedTool:{replica.name}] Starting process: {' '.join(cmd)}")
+            with self._span("spawn", detail=replica.name):
+                replica.process = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                                   stderr=subprocess.PIPE, env=env)
+        except Exception as e:
+            raise RuntimeError(f"Failed to start process for {replica.name}: {e}")
+        # Something must always read both pipes or a chatty server blocks on a full buffer:
+        # the stdio channel owns stdout when a stdio client uses it, the pump drains the rest.
+        stdio_cfg = self._stdio_client_cfg()
+        try:
+            replica.output = OutputPump.from_config(replica.name, replica.process, self.config.get("output", {}),
+                                                    read_stdout=stdio_cfg is None)
+            replica.output.start()
+            if stdio_cfg is not None:
+                output = replica.output
+                replica.channel = StdioChannel(replica.process, name=replica.name,
+                                               on_output=lambda line: output.feed("stdout", line),
+                                               codec=get_codec(stdio_cfg.get("codec")),
+                                               max_payload=kb_limit(stdio_cfg, "max_payload_kb", DEFAULT_MAX_PAYLOAD_KB))
+        except Exception:
+            replica.stop()  # Nothing else holds the process yet; don't leave it running
+            raise
+        return replica
+
+    def _attach_mcp_clients(self):
+        for replica in self.replicas:
+            self._attach_replica_clients(replica)
+
+    def _attach_replica_clients(self, replica):
+        for cfg in self.config.get("mcp_clients", []):
+            if not cfg.get("enabled", True):
+                continue
+            channel = replica.channel if cfg.get("protocol", "stdio") == "stdio" else None
+            client = self._create_client(cfg, channel=channel, name=self._replica_name(replica.index, cfg["name"]),
+                                         port=self._replica_port(cfg, replica.index))
+            client.replica = replica
+            replica.clients.append(client)
+            self.mcp_clients = self.mcp_clients + [client]
+
+    @property
+    def async_clients(self):
+        return [client for replica in self.replicas for client in replica.async_clients]
+
+    def _start_replica(self, index):
+        replica = self._spawn_replica(index)
+        try:
+            self._attach_replica_clients(replica)
+        except Exception:
+            replica.stop()
+            self.mcp_clients = [c for c in self.mcp_clients if c not in replica.clients]
+            raise
+        for client in replica.clients:
+            self._start_client_health_check(client)
+        return replica
+
+    def _retire_replica(self, replica):
+        self.mcp_clients = [c for c in self.mcp_clients if c not in replica.clients]
+        self.replicas = [r for r in self.replicas if r is not replica]
+        replica.stop()
+
+    def _maintain_replicas(self):
+        """Replica job: restart dead replicas with backoff, then autoscale. Returns the next delay."""
+        policy = self.replica_policy
+        delay = policy.check_interval
+        with self._replica_lock:
+            if self._stop_event.is_set():
+                return None
+            now = time.monotonic()
+            for replica in self.replicas:
+                if replica.draining:
+                    if not replica.outstanding or not replica.alive:
+                        logger.info(f"[MCPBasedTool:{replica.name}] Drained, stopping")
+                        self._retire_replica(replica)
+                    continue
+                if replica.alive:
+                    continue
+                if replica.restart_at is None:
+                    # Crashing soon after a start counts towards the backoff; a long run resets it
+                    failures = self._replica_failures.get(replica.index, 0)
+                    failures = failures + 1 if now - replica.started_at < policy.restart_backoff_max else 1
+                    self._replica_failures[replica.index] = failures
+                    replica.restart_at = now + min(policy.restart_backoff_max, 2 ** (failures - 1) - 1)
+                    logger.error(f"[MCPBasedTool:{replica.name}] {replica.exit_message()}; "
+                                 f"restarting in {replica.restart_at - now:.0f}s")
+                if now < replica.restart_at:
+                    delay = min(delay, replica.restart_at - now)
+                    continue
+                self._restart_replica(replica)
+            if policy.autoscale:
+                self._autoscale(now)
+            TOOL_REPLICAS.labels(self.name).set(sum(1 for r in self.replicas if not r.draining))
+        return delay
+
+    def _restart_replica(self, replica):
+        replica.stop()
+        try:
+            fresh = self._start_replica(replica.index)
+        except Exception as e:
+            logger.error(f"[MCPBasedTool:{replica.name}] Restart failed: {e}")
+            replica.restart_at = None  # Retried with a longer backoff
+            replica.started_at = time.monotonic()
+            return
+        self.mcp_clients = [c for c in self.mcp_clients if c not in replica.clients]
+        self.replicas = [fresh if r is replica else r for r in self.replicas]
+        TOOL_STARTS.labels(self.name, "replica_restart").inc()
+        logger.info(f"[MCPBasedTool:{replica.name}] Restarted")
+
+    def _autoscale(self, now):
+        policy = self.replica_policy
+        live = [r for r in self.replicas if not r.draining]
+        load = sum(r.take_peak() for r in live) / max(1, len(live))
+        if load >= policy.target_outstanding and len(live) < policy.max:
+            used = {r.index for r in self.replicas}
+            index = next(i for i in itertools.count() if i not in used)
+            try:
+                replica = self._start_replica(index)
+            except Exception as e:
+                logger.error(f"[MCPBasedTool:{self.name}] Scale up failed: {e}")
+                return
+            self.replicas = self.replicas + [replica]
+            self._low_load_since = None
+            TOOL_STARTS.labels(self.name, "scale_up").inc()
+            logger.info(f"[MCPBasedTool:{self.name}] Load {load:.1f}/replica, scaled up to {len(live) + 1}")
+        elif load < policy.target_outstanding / 2 and len(live) > policy.min:
+            if self._low_load_since is None:
+                self._low_load_since = now
+            elif now - self._low_load_since >= policy.scale_down_after:
+                victim = max(live, key=lambda r: r.index)
+                victim.draining = True  # Stops taking calls; stopped once its in-flight calls finish
+                self._low_load_since = now
+                TOOL_STARTS.labels(self.name, "scale_down").inc()
+                logger.info(f"[MCPBasedTool:{self.name}] Load {load:.1f}/replica, draining {victim.name}")
+        else:
+            self._low_load_since = None
+
+    def replica_stats(self):
+        return [replica.stats() for replica in self.replicas]
+
+    def _start_failed_result(self, error):
+        return f"[{self.name}] Error starting tool: {error}"
+
+    def _stdio_client_cfg(self):
+        """Config of the first enabled stdio client: it owns the process's pipes."""
+        return next((cfg for cfg in self.config.get("mcp_clients", [])
+                     if cfg.get("enabled", True) and cfg.get("protocol", "stdio") == "stdio"), None)
+
+    def output_tail(self, lines=50):
+        """Last lines the subprocess(es) wrote to stdout/stderr (excluding protocol messages)."""
+        replicas = [r for r in self.replicas if r.output]
+        if len(replicas) == 1:
+            return replicas[0].output.tail(lines)
+        return [f"{r.name} {line}" for r in replicas for line in r.output.tail(lines)]
+
+    def _probe_ready(self):
+        for replica in self.replicas:
+            if not replica.alive:
+                raise RuntimeError(replica.exit_message())
+        return super()._probe_ready()
+
+    def _route(self, clients):
+        """Healthy clients, those of the replica with the fewest calls in flight first.
+
+        Ties rotate so idle replicas share the load; clients of one replica keep their
+        configured order, as redundant routes to the same server.
+        """
+        healthy = [c for c in clients if c.healthy and not c.replica.draining]
+        if len(self.replicas) > 1 and healthy:
+            shift = next(self._rotation) % len(self.replicas)
+            healthy.sort(key=lambda c: (c.replica.outstanding, (c.replica.index - shift) % len(self.replicas)))
+        return healthy
+
+    def _hedge_delay(self, client):
+        hedge_cfg = self.config.get("hedge", {})
+        observed = client.latency.percentile(hedge_cfg.get("percentile", 95))
+        if observed is None or len(client.latency) < hedge_cfg.get("min_samples", 20):
+            return hedge_cfg.get("default_delay", 0.1)
+        return max(hedge_cfg.get("min_delay", 0.005), observed)
+
+    def _hedging(self, clients):
+        return len(clients) > 1 and self.config.get("hedge", {}).get("enabled", False)
+
+    def _send(self, payload):
+        clients = self._route(self.mcp_clients)
+        if self._hedging(clients):
+            return self._send_hedged(clients[0], clients[1], payload)
+        # Clients are redundant routes (to the same server, or to equivalent replicas): use the
+        # first one that answers. An error reply is an answer; only unsent or lost requests move on
+        for client in clients:
+            client.replica.begin()
+            try:
+                result = client.send(payload)
+            finally:
+                client.replica.end()
+            if result is not None:
+                return result
+        return None
+
+    def _send_hedged(self, primary, backup, payload):
+        """Send to `primary`; if it has not answered after its p95 latency, also send to
+        `backup` and return whichever answers first."""
+        deadline = time.monotonic() + primary.request_timeout()
+        futures = {}
+        self._submit(primary, payload, futures)
+        if futures:
+            done, _ = wait(list(futures), timeout=self._hedge_delay(primary))
+            result = self._first_result(done, futures)
+            if result is not None:
+                return result
+        # Primary is slow (hedge) or already failed (plain retry)
+        self._submit(backup, payload, futures)
+
+        while futures:
+            done, _ = wait(list(futures), timeout=max(0, deadline - time.monotonic()), return_when=FIRST_COMPLETED)
+            if not done:
+                for future in futures:
+                    expire(future)
+                return None
+            result = self._first_result(done, futures)
+            if result is not None:
+                return result
+        return None
+
+    def _submit(self, client, payload, futures):
+        try:
+            future = client.submit(payload)
+        except (ConnectionError, PayloadTooLarge) as e:
+            logger.warning(f"[MCPBasedTool:{self.name}] {client.name} unavailable: {e}")
+            return
+        replica = client.replica
+        replica.begin()
+        future.add_done_callback(lambda _: replica.end())
+        futures[future] = client
+
+    def _first_result(self, done, futures):
+        for future in done:
+            client = futures.pop(future)
+            error = future.exception()
+            if error is None or server_answered(error):
+                # A server error is the answer too: the server may have acted on the request
+                for other in futures:
+                    other.cancel()
+                futures.clear()
+                return future.result() if error is None else error_result(error)
+            logger.warning(f"[MCPBasedTool:{self.name}] {client.name} failed: {error}")
+        return None
+
+    async def _send_async(self, payload):
+        clients = self._route(self.async_clients)
+        if self._hedging(clients):
+            return await self._send_hedged_async(clients[0], clients[1], payload)
+        for client in clients:
+            client.replica.begin()
+            try:
+                result = await client.send(payload)
+            finally:
+                client.replica.end()
+            if result is not None:
+                return result
+        return None
+
+    async def _send_hedged_async(self, primary, backup, payload):
+        timeout = primary.client.request_timeout()
+        first = asyncio.ensure_future(self._tracked(primary, primary.send(payload, timeout=timeout)))
+        done, _ = await asyncio.wait({first}, timeout=self._hedge_delay(primary.client))
+        if done and first.result() is not None:
+            return first.result()
+        tasks = {first} if not done else set()
+        tasks.add(asyncio.ensure_future(self._tracked(backup, backup.send(payload, timeout=timeout))))
+        try:
+            while tasks:
+                done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.result() is not None:
+                        return task.result()
+            return None
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    @staticmethod
+    async def _tracked(client, coro):
+        client.replica.begin()
+        try:
+            return await coro
+        finally:
+            client.replica.end()
+
+    def _send_many(self, payloads):
+        """Send all payloads as one batch per client; items a client fails are retried on the next.
+
+        Returns (results, errors), with None in `results` for items no client answered.
+        """
+        results = [None] * len(payloads)
+        errors = [None] * len(payloads)
+        pending = list(range(len(payloads)))
+        for client in self._route(self.mcp_clients):
+            if not pending:
+                break
+            try:
+                futures = self._submit_all(client, [payloads[i] for i in pending])
+            except PayloadTooLarge as e:
+                for i in pending:
+                    errors[i] = e  # Too large for every client
+                break
+            except ConnectionError as e:
+                logger.warning(f"[MCPBasedTool:{self.name}] {client.name} unavailable: {e}")
+                continue
+            replica = client.replica
+            replica.begin(len(futures))
+            for future in futures:
+                future.add_done_callback(lambda _: replica.end())
+            deadline = time.monotonic() + client.request_timeout()
+            failed = []
+            for i, future in zip(pending, futures):
+                try:
+                    results[i] = wait_result(future, max(0, deadline - time.monotonic()))
+                except Exception as e:
+                    if server_answered(e):
+                        results[i] = error_result(e)  # Not retried: the server may have acted on it
+                        continue
+                    errors[i] = e
+                    failed.append(i)
+            pending = failed
+        return results, errors
+
+    def _submit_all(self, client, payloads):
+        """One batch request with `batch: true`, else one pipelined request per payload."""
+        if self.batch:
+            return client.submit_many(payloads)
+        futures = []
+        try:
+            for payload in payloads:
+                futures.append(client.submit(payload))
+        except Exception:
+            for future in futures:
+                future.cancel()
+            raise
+        return futures
+
+    def _call_many(self, items):
+        with tracing.span("tool.call_many", tool=self.name, items=len(items)):
+            return self._call_batch(items)
+
+    def _call_batch(self, items):
+        started = time.monotonic()
+        self.metrics.begin()
+        results = [None] * len(items)
+        errors = [None] * len(items)
+        actions = [None] * len(items)
+        batch = []
+        for i, (args, kwargs) in enumerate(map(split_call, items)):
+            try:
+                actions[i], payload = _action_payload(*args, **kwargs)
+            except TypeError as e:
+                errors[i] = e  # Malformed item: report it, send the rest
+                continue
+            batch.append((i, {"action": actions[i], "payload": payload}))
+        sent, sent_errors = self._send_many([payload for _, payload in batch])
+        for (i, _), result, error in zip(batch, sent, sent_errors):
+            results[i], errors[i] = result, error
+
+        failed = 0
+        for i, result in enumerate(results):
+            if result is None:
+                failed += 1
+                results[i] = f"[{self.name}] Error executing {actions[i]}: {errors[i] or 'no MCP client answered'}"
+        if failed:
+            logger.error(f"[MCPBasedTool:{self.name}] Batch of {len(items)}: {failed} item(s) failed")
+        self.metrics.end(time.monotonic() - started, ok=not failed)
+        return results
+
+    async def _call_many_async(self, items):
+        # All items go out at once per client; the waits are blocking, so run them off the loop
+        return await asyncio.get_running_loop().run_in_executor(None, tracing.in_context(self._call_many, items))
+
+    def _describe(self):
+        return f"Send an action with its payload to the {self.name} MCP server"
+
+    def _parameters(self):
+        return {
+            "type": "object",
+            "properties": {"action": {"type": "string"}, "payload": {"type": "object"}},
+            "required": ["action"],
+        }
+
     def to_tool(self):
         def tool(action, payload=None):
             payload = payload or {}
-            try:
-                for client in self.mcp_clients:
-                    client.send({"action": action, "payload": payload})
-                return f"[{self.name}] {action} executed"
-            except Exception as e:
-                logger.error(f"[MCPBasedTool:{self.name}] Tool execution error: {e}")
-                return f"[{self.name}] Error executing {action}: {e}"
+            started = time.monotonic()
+            self.metrics.begin()
+            with tracing.span("tool.call", tool=self.name, action=action) as span:
+                result = self._send({"action": action, "payload": payload})
+                self.metrics.end(time.monotonic() - started, ok=result is not None)
+                if result is not None:
+                    return result
+                span.set("error", "no MCP client answered")
+            logger.error(f"[MCPBasedTool:{self.name}] Tool execution error: no client answered {action}")
+            return f"[{self.name}] Error executing {action}: no MCP client answered"
+        return tool
+
+    def to_async_tool(self):
+        async def tool(action, payload=None):
+            payload = payload or {}
+            started = time.monotonic()
+            self.metrics.begin()
+            with tracing.span("tool.call", tool=self.name, action=action) as span:
+                result = await self._send_async({"action": action, "payload": payload})
+                self.metrics.end(time.monotonic() - started, ok=result is not None)
+                if result is not None:
+                    return result
+                span.set("error", "no MCP client answered")
+            logger.error(f"[MCPBasedTool:{self.name}] Tool execution error: no client answered {action}")
+            return f"[{self.name}] Error executing {action}: no MCP client answered"
         return tool
 
+    def _stream(self, action, payload=None):
+        request = {"action": action, "payload": payload or {}}
+        stream = None
+        with tracing.span("tool.stream", tool=self.name, action=action) as span:
+            for client in self._route(self.mcp_clients):
+                try:
+                    stream = client.stream(request)
+                    break
+                except ConnectionError as e:
+                    logger.warning(f"[MCPBasedTool:{self.name}] {client.name} unavailable: {e}")
+                except PayloadTooLarge as e:
+                    span.fail(e)
+                    logger.error(f"[MCPBasedTool:{self.name}] Not sent: {e}")
+                    break
+            if stream is None:
+                span.set("error", "no MCP client answered")
+        if stream is None:
+            self.metrics.begin()
+            self.metrics.end(0.0, ok=False)
+            yield f"[{self.name}] Error executing {action}: no MCP client answered"
+            return
+        started = time.monotonic()
+        self.metrics.begin()
+        client.replica.begin()
+        ok = False
+        try:
+            yield from stream
+            ok = True
+        except GeneratorExit:
+            ok = True  # Consumer stopped early
+            raise
+        finally:
+            stream.close()  # Tells the server to stop unless the stream already ended
+            client.replica.end()
+            self.metrics.end(time.monotonic() - started, ok=ok)
+
+    async def _astream(self, action, payload=None):
+        request = {"action": action, "payload": payload or {}}
+        stream = None
+        with tracing.span("tool.stream", tool=self.name, action=action) as span:
+            for client in self._route(self.async_clients):
+                try:
+                    stream = await client.stream(request)
+                    break
+                except ConnectionError as e:
+                    logger.warning(f"[MCPBasedTool:{self.name}] {client.name} unavailable: {e}")
+                except PayloadTooLarge as e:
+                    span.fail(e)
+                    logger.error(f"[MCPBasedTool:{self.name}] Not sent: {e}")
+                    break
+            if stream is None:
+                span.set("error", "no MCP client answered")
+        if stream is None:
+            self.metrics.begin()
+            self.metrics.end(0.0, ok=False)
+            yield f"[{self.name}] Error executing {action}: no MCP client answered"
+            return
+        started = time.monotonic()
+        self.metrics.begin()
+        client.replica.begin()
+        ok = False
+        try:
+            async for chunk in stream:
+                yield chunk
+            ok = True
+        except GeneratorExit:
+            ok = True
+            raise
+        finally:
+            stream.close()
+            client.replica.end()
+            self.metrics.end(time.monotonic() - started, ok=ok)
+
     def _health_check_internal(self):
-        # Stub: Check if process is alive
-        if self.process and self.process.poll() is not None:
-            raise RuntimeError("Process died")
+        # Dead replicas are restarted by the replica job; without one a dead process is fatal
+        dead = [replica.exit_message() for replica in self.replicas if not replica.alive]
+        if dead:
+            raise RuntimeError("; ".join(dead))
+
+def _action_payload(action, payload=None):
+    # Mirrors the tool signature so call_many items bind like single calls
+    return action, payload or {}
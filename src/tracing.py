@@ -0,0 +1,278 @@
+import contextvars
+import json
+import re
+import random
+import threading
+import time
+import logging
+from collections import deque
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+_current = contextvars.ContextVar("toolfabric_span", default=None)
+_TRACEPARENT = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+
+class _NoopSpan:
+    """Stands in for a span when tracing is off or the trace was not sampled."""
+    __slots__ = ()
+    sampled = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set(self, key, value):
+        pass
+
+    def fail(self, error):
+        pass
+
+NOOP = _NoopSpan()
+_UNSAMPLED = NOOP  # Context marker: inside a trace that was not sampled, children are skipped too
+
+class _UnsampledRoot(_NoopSpan):
+    __slots__ = ("_token",)
+
+    def __enter__(self):
+        self._token = _current.set(_UNSAMPLED)
+        return self
+
+    def __exit__(self, *exc):
+        _current.reset(self._token)
+        return False
+
+class _RemoteParent:
+    """A span in another process, known only by its ids; spans opened under it join its trace."""
+    __slots__ = ("trace_id", "span_id")
+
+    def __init__(self, trace_id, span_id):
+        self.trace_id = trace_id
+        self.span_id = span_id
+
+class Span:
+    """One timed operation. Use as a context manager; it becomes the parent of spans opened inside."""
+    __slots__ = ("tracer", "name", "trace_id", "span_id", "parent_id", "attributes", "start", "duration",
+                 "error", "_t0", "_token")
+    sampled = True
+
+    def __init__(self, tracer, name, trace_id, parent_id, attributes):
+        self.tracer = tracer
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self.parent_id = parent_id
+        self.attributes = attributes
+        self.error = None
+
+    def __enter__(self):
+        self.start = time.time()
+        self._t0 = time.perf_counter()
+        self._token = _current.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.duration = time.perf_counter() - self._t0
+        _current.reset(self._token)
+        if exc is not None and self.error is None:
+            self.fail(exc)
+        self.tracer.export(self)
+        return False
+
+    def set(self, key, value):
+        self.attributes[key] = value
+
+    def fail(self, error):
+        self.error = f"{type(error).__name__}: {error}"
+
+    @property
+    def traceparent(self):
+        # W3C trace context: version-trace_id-parent_id-flags
+        return f"00-{self.trace_id}-{self.span_id}-01"
+
+    def to_dict(self):
+        record = {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start": round(self.start, 6),
+            "duration_ms": round(self.duration * 1000, 3),
+            "attributes": self.attributes,
+        }
+        if self.error is not None:
+            record["error"] = self.error
+        return record
+
+class JsonlExporter:
+    """Appends finished spans to a file as JSON lines from a background thread.
+
+    At most `max_queue` spans wait to be written; beyond that new spans are dropped (and
+    counted) rather than slowing down the calls being traced.
+    """
+    def __init__(self, path, max_queue=10000, flush_interval=0.5):
+        self.path = path
+        self.max_queue = max_queue
+        self.flush_interval = flush_interval
+        self.exported = 0
+        self.dropped = 0
+        self._queue = deque()
+        self._cond = threading.Condition()
+        self._closing = False
+        self._file = open(path, "a", encoding="utf-8")
+        self._thread = threading.Thread(target=self._run, name="tracing-exporter", daemon=True)
+        self._thread.start()
+
+    def export(self, record):
+        with self._cond:
+            if self._closing or len(self._queue) >= self.max_queue:
+                self.dropped += 1
+                return
+            self._queue.append(record)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if not self._queue and not self._closing:
+                    self._cond.wait(self.flush_interval)
+                records, self._queue = self._queue, deque()
+                closing = self._closing
+            if records:
+                try:
+                    self._file.write("".join(json.dumps(r, separators=(",", ":"), default=str) + "\n" for r in records))
+                    self._file.flush()
+                    self.exported += len(records)
+                except Exception as e:
+                    logger.error(f"[JsonlExporter:{self.path}] Write failed, {len(records)} span(s) lost: {e}")
+            if closing:
+                return
+
+    def close(self, timeout=5):
+        with self._cond:
+            self._closing = True
+            self._cond.notify()
+        self._thread.join(timeout)
+        self._file.close()
+
+    def stats(self):
+        return {"path": self.path, "exported": self.exported, "dropped": self.dropped, "queued": len(self._queue)}
+
+class Tracer:
+    """Creates spans, samples whole traces at `sample_rate` and hands finished spans to `exporter`."""
+    def __init__(self, enabled=False, sample_rate=1.0, exporter=None):
+        self.enabled = enabled and exporter is not None
+        self.sample_rate = sample_rate
+        self.exporter = exporter
+
+    def span(self, name, **attributes):
+        if not self.enabled:
+            return NOOP
+        parent = _current.get()
+        if parent is None:
+            # The sampling decision is made once per trace, at its root
+            if self.sample_rate < 1 and random.random() >= self.sample_rate:
+                return _UnsampledRoot()
+            return Span(self, name, f"{random.getrandbits(128):032x}", None, attributes)
+        if parent is _UNSAMPLED:
+            return NOOP
+        return Span(self, name, parent.trace_id, parent.span_id, attributes)
+
+    def record(self, name, started, duration, **attributes):
+        """Export an already-measured child of the current span (e.g. a lock wait)."""
+        parent = _current.get()
+        if not self.enabled or parent is None or parent is _UNSAMPLED:
+            return
+        span = Span(self, name, parent.trace_id, parent.span_id, attributes)
+        span.start, span.duration = started, duration
+        self.export(span)
+
+    def export(self, span):
+        self.exporter.export(span.to_dict())
+
+    def close(self):
+        self.enabled = False
+        close = getattr(self.exporter, "close", None)
+        if close is not None:
+            close()
+
+_tracer = Tracer()
+
+def configure(enabled=True, sample_rate=1.0, path="traces.jsonl", max_queue=10000, exporter=None):
+    """Replace the process-wide tracer.
+
+    Finished spans go to `exporter` (any object with export(record_dict) and optionally
+    close()), or to a JsonlExporter on `path`.
+    """
+    global _tracer
+    old = _tracer
+    if enabled and exporter is None:
+        exporter = JsonlExporter(path, max_queue=max_queue)
+    _tracer = Tracer(enabled, sample_rate, exporter)
+    old.close()
+    if enabled:
+        logger.info(f"Tracing enabled, sampling {sample_rate:.0%} of traces")
+    return _tracer
+
+def configure_from_config(cfg):
+    return configure(
+        enabled=cfg.get("enabled", True),
+        sample_rate=cfg.get("sample_rate", 1.0),
+        path=cfg.get("path", "traces.jsonl"),
+        max_queue=cfg.get("max_queue", 10000),
+    )
+
+def get_tracer():
+    return _tracer
+
+def span(name, **attributes):
+    """Open a span under the current one (or a new, sampled-or-not trace)."""
+    return _tracer.span(name, **attributes)
+
+def record(name, started, duration, **attributes):
+    _tracer.record(name, started, duration, **attributes)
+
+def active():
+    """True when the current context is inside a sampled trace (worth measuring extra detail)."""
+    current = _current.get()
+    return current is not None and current is not _UNSAMPLED
+
+def in_context(func, *args, **kwargs):
+    """`func` bound to its arguments and the current context, for run_in_executor (which does not copy it)."""
+    context = contextvars.copy_context()
+    return lambda: context.run(func, *args, **kwargs)
+
+def current_traceparent():
+    """W3C traceparent of the current span, or None outside a sampled trace."""
+    current = _current.get()
+    if current is None or current is _UNSAMPLED or isinstance(current, _RemoteParent):
+        return None
+    return current.traceparent
+
+def inject(payload):
+    """Copy of `payload` carrying the current trace context in `_meta.traceparent`, or `payload` itself."""
+    traceparent = current_traceparent()
+    if traceparent is None:
+        return payload
+    meta = dict(payload.get("_meta") or {}, traceparent=traceparent)
+    return dict(payload, _meta=meta)
+
+@contextmanager
+def remote_parent(traceparent):
+    """Open spans inside the block as children of `traceparent`, a span in the calling process.
+
+    A missing or malformed traceparent leaves the context alone; an unsampled one suppresses
+    tracing, so the caller's sampling decision holds on both sides.
+    """
+    match = _TRACEPARENT.match(traceparent or "")
+    if match is None:
+        yield
+        return
+    trace_id, span_id, flags = match.groups()
+    sampled = int(flags, 16) & 1
+    token = _current.set(_RemoteParent(trace_id, span_id) if sampled else _UNSAMPLED)
+    try:
+        yield
+    finally:
+        _current.reset(token)